@@ -0,0 +1,268 @@
+"""
+Conversie în masă CSV -> XLSX, fără interfața web (ex: rularea de noapte pentru
+mii de simboluri).
+
+Primește mai multe foldere cu CSV-uri (sau un manifest) și detectează tipul
+fiecăruia (vezi detect_pipelines din app/pipelines.py); tipul se poate da și
+explicit, cu --type sau în manifest. Toate folderele rulează pe același pool
+de procese preîncălzite (WorkerPool), deci fiecare template este parsat o
+singură dată per proces pe toată durata rulării.
+
+Fiecare simbol generat este adăugat imediat într-un fișier checkpoint (un rând
+JSON per simbol, cu cheia rezultatului din app/result_cache.py). O rulare
+întreruptă se reia cu aceeași comandă: simbolurile din checkpoint al căror
+fișier XLSX există deja nu mai sunt generate. Cheia depinde de conținutul
+CSV-urilor și al template-ului, deci un export actualizat este regenerat.
+
+Manifestul are un rând JSON per folder (căile relative sunt față de manifest):
+    {"input": "exports/ppi-2024-01", "type": "PPI", "output": "out/ppi"}
+'type' și 'output' sunt opționale; implicit, output-ul este <--output>/<numele folderului>.
+
+Exemplu:
+    python -m app.batch exports/PPI exports/MOMYOY --output out
+    python -m app.batch --manifest nightly.jsonl --output out --processes 4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app import progress
+from app.pipelines import PIPELINES, detect_pipelines
+from app.worker_pool import WorkerPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cât așteptăm ultimele evenimente de progres ale unui folder, după terminarea lui
+EVENTS_DRAIN_TIMEOUT = 5
+
+
+def read_manifest(path):
+    """
+    Intrările manifestului: [{"input", "type", "output"}], cu căile relative față de manifest.
+    Rândurile goale și cele care încep cu '#' sunt ignorate.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+                item = {"input": os.path.join(base, entry["input"]), "type": entry.get("type"),
+                        "output": entry.get("output")}
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{number}: intrare invalidă în manifest ({e})") from e
+            if item["output"]:
+                item["output"] = os.path.join(base, item["output"])
+            items.append(item)
+    return items
+
+
+def plan(items, output_root, default_type=None):
+    """
+    Completează tipul, folderul de output și log-ul fiecărei intrări.
+    Returnează (intrări valide, erori).
+    """
+    planned, errors = [], []
+    outputs = {}
+    for item in items:
+        folder = os.path.abspath(item["input"])
+        if not os.path.isdir(folder):
+            errors.append(f"Eroare: '{item['input']}' nu este un folder.")
+            continue
+        file_type = item.get("type") or default_type
+        if file_type is None:
+            candidates = detect_pipelines(folder)
+            if len(candidates) != 1:
+                found = " / ".join(candidates) or "niciun CSV"
+                errors.append(f"Eroare: tipul pentru '{item['input']}' nu poate fi detectat ({found}); "
+                              f"folosiți --type sau 'type' în manifest.")
+                continue
+            file_type = candidates[0]
+        if file_type not in PIPELINES:
+            errors.append(f"Eroare: tip necunoscut '{file_type}' pentru '{item['input']}'.")
+            continue
+        output = os.path.abspath(item.get("output") or os.path.join(output_root, os.path.basename(folder)))
+        if output in outputs:
+            errors.append(f"Eroare: '{item['input']}' și '{outputs[output]}' ar scrie în același folder "
+                          f"'{output}'; folosiți 'output' în manifest.")
+            continue
+        outputs[output] = item["input"]
+        planned.append({"input": folder, "type": file_type, "output": output, "log": f"{output}.log"})
+    return planned, errors
+
+
+class Checkpoint:
+    """
+    Simbolurile deja generate, într-un fișier JSON-lines scris pe măsură ce apar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = {}  # {(input, output): {cheie}}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # ultimul rând poate fi incomplet (rulare oprită brusc)
+                    self._done.setdefault((entry["input"], entry["output"]), set()).add(entry["key"])
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def completed(self, item):
+        with self._lock:
+            return set(self._done.get((item["input"], item["output"]), ()))
+
+    def record(self, item, symbol, key):
+        line = json.dumps({"input": item["input"], "output": item["output"], "type": item["type"],
+                           "symbol": symbol, "key": key, "time": time.time()}, ensure_ascii=False)
+        with self._lock:
+            self._done.setdefault((item["input"], item["output"]), set()).add(key)
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BatchRun:
+    """
+    Rulează intrările pe pool, actualizând checkpoint-ul și contoarele din evenimentele de progres.
+    """
+
+    def __init__(self, items, checkpoint, processes, parallel=False, engine=None, values_only=False):
+        self.items = items
+        self.checkpoint = checkpoint
+        self.parallel = parallel
+        self.engine = engine
+        self.values_only = values_only
+        # Fără reciclarea proceselor: cache-ul de template-uri rămâne pe toată rularea
+        self.pool = WorkerPool(size=max(processes, 1), max_jobs=0)
+        self.pool.event_handler = self._on_event
+        self._lock = threading.Lock()
+        self._counts = {}   # {index: {"written", "skipped", "errors"}}
+        self._drained = {}  # {index: threading.Event}, setat la END
+
+    def _on_event(self, event):
+        index = int(event["job_id"])
+        item = self.items[index]
+        if event["type"] == progress.END:
+            self._drained[index].set()
+            return
+        with self._lock:
+            counts = self._counts[index]
+            if event["type"] == progress.WRITTEN:
+                counts["written"] += 1
+            elif event["type"] == progress.SKIPPED:
+                counts["skipped"] += 1
+            elif event["type"] == progress.ERROR:
+                counts["errors"] += 1
+        if event["type"] == progress.WRITTEN or (event["type"] == progress.SKIPPED
+                                                 and event.get("reason") != "checkpoint"):
+            self.checkpoint.record(item, event["symbol"], event["key"])
+
+    def _run_item(self, index):
+        item = self.items[index]
+        pipeline = PIPELINES[item["type"]]
+        os.makedirs(item["output"], exist_ok=True)
+        kwargs = {
+            "csv_folder": item["input"],
+            "template_path": os.path.join(ROOT, pipeline["template"]),
+            "output_folder": item["output"],
+            "log_file": item["log"],
+            "parallel": self.parallel,
+            "engine": self.engine or pipeline["engine"],
+            "values_only": self.values_only,
+        }
+        start = time.time()
+        self.pool.run(pipeline["module"], kwargs, str(index), self.checkpoint.completed(item))
+        self._drained[index].wait(EVENTS_DRAIN_TIMEOUT)
+        return time.time() - start
+
+    def run(self):
+        """
+        Rulează toate intrările (câte una per proces din pool) și afișează un rând per folder.
+        Returnează totalurile: {"written", "skipped", "errors", "failed"}.
+        """
+        for index in range(len(self.items)):
+            self._counts[index] = {"written": 0, "skipped": 0, "errors": 0}
+            self._drained[index] = threading.Event()
+        totals = {"written": 0, "skipped": 0, "errors": 0, "failed": 0}
+        self.pool.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+                futures = {executor.submit(self._run_item, index): index for index in range(len(self.items))}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    item = self.items[index]
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        totals["failed"] += 1
+                        print(f"Eroare: {item['input']} ({item['type']}): {e}", flush=True)
+                        continue
+                    with self._lock:
+                        counts = dict(self._counts[index])
+                    for key in counts:
+                        totals[key] += counts[key]
+                    print(f"{item['type']:<13} {item['input']}: {counts['written']} generate, "
+                          f"{counts['skipped']} sărite, {counts['errors']} erori ({seconds:.1f}s)", flush=True)
+        finally:
+            self.pool.shutdown()
+        return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conversie în masă CSV -> XLSX, cu checkpoint.")
+    parser.add_argument("inputs", nargs="*", help="Folderele cu CSV-uri.")
+    parser.add_argument("--manifest", help="Fișier JSON-lines cu intrările (input, type, output).")
+    parser.add_argument("--output", default="batch-output", help="Folderul rădăcină pentru output.")
+    parser.add_argument("--type", choices=sorted(PIPELINES), default=None,
+                        help="Tipul tuturor folderelor (implicit: detectat per folder).")
+    parser.add_argument("--engine", choices=["openpyxl", "xml", "stream"], default=None,
+                        help="Motorul de generare (implicit: cel configurat per tip, ENGINE_<TIP>).")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Fișierul checkpoint (implicit: <output>/checkpoint.jsonl).")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Procesele din pool.")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Procesează și simbolurile unui folder în paralel (vezi app/parallel.py).")
+    parser.add_argument("--values-only", action="store_true",
+                        help="Scrie valorile calculate în locul formulelor (vezi app/derived_columns.py).")
+    args = parser.parse_args(argv)
+
+    items = [{"input": folder, "type": None, "output": None} for folder in args.inputs]
+    if args.manifest:
+        items += read_manifest(args.manifest)
+    if not items:
+        parser.error("niciun folder de procesat (dați foldere sau --manifest)")
+
+    planned, errors = plan(items, args.output, args.type)
+    for error in errors:
+        print(error, file=sys.stderr)
+    if not planned:
+        return 1
+
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.output, "checkpoint.jsonl"))
+    start = time.time()
+    try:
+        totals = BatchRun(planned, checkpoint, args.processes, args.parallel, args.engine,
+                          args.values_only).run()
+    finally:
+        checkpoint.close()
+    print(f"Total: {len(planned)} foldere, {totals['written']} generate, {totals['skipped']} sărite, "
+          f"{totals['errors']} erori, {totals['failed']} foldere eșuate ({time.time() - start:.1f}s)")
+    return 1 if errors or totals["errors"] or totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
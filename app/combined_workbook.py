@@ -0,0 +1,416 @@
+"""
+Combinarea fișierelor XLSX generate într-un singur workbook, cu o foaie per simbol.
+
+Fișierele unui job provin din același template: tema și sharedStrings sunt
+identice în toate, doar foaia diferă. Workbook-ul combinat păstrează o singură
+dată părțile comune și adaugă foaia fiecărui fișier (sheet1.xml, sheet2.xml, ...),
+copiată în bucăți, fără a fi încărcată în memorie sau parsată de openpyxl.
+Funcționează pentru toate motoarele, pentru că lucrează pe fișierele deja generate.
+
+Stilurile (xl/styles.xml) pot diferi: openpyxl adaugă formate noi pentru celulele
+scrise după ultimul rând al template-ului (ex: data unui istoric mai lung). Ele sunt
+unite după conținut (formate numerice, fonturi, umpleri, borduri, cellXfs), iar
+indicii de stil ai foilor (s="..." / style="...") sunt renumerotați la copiere.
+
+Câștigul de spațiu este mic (câteva procente): datele și formulele foilor ocupă
+aproape tot fișierul și rămân câte o dată pentru fiecare simbol; se economisesc
+doar părțile comune repetate. Avantajul principal este un singur fișier de descărcat.
+
+Numele fișierului combinat se termină cu COMBINED_SUFFIX (ex: "PPI (toate).xlsx"),
+ca să nu se confunde cu rezultatul unui simbol; la începutul fiecărei rulări,
+remove_combined_outputs șterge fișierul combinat rămas de la rularea anterioară.
+
+Utilizare (într-un script de procesare):
+    remove_combined_outputs(output_folder, workbook)   # la început
+    combine_outputs(output_files, os.path.join(output_folder, combined_name("PPI")), log)
+"""
+import os
+import re
+import shutil
+import uuid
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+from app.xml_engine import CALC_CHAIN_TYPE, CHUNK_SIZE, _active_sheet_part
+
+COMBINED_SUFFIX = " (toate).xlsx"
+
+WORKSHEET_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+WORKSHEET_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+
+STYLES_PART = "xl/styles.xml"
+
+# Părțile rescrise pentru workbook-ul combinat (nu trebuie să fie identice între fișiere)
+_WORKBOOK_PARTS = {"xl/workbook.xml", "xl/_rels/workbook.xml.rels", "[Content_Types].xml",
+                   "docProps/app.xml", "docProps/core.xml", "xl/calcChain.xml", STYLES_PART}
+
+_TAB_SELECTED_RE = re.compile(rb'\stabSelected="(?:1|true)"')
+_RELATIONSHIP_RE = re.compile(r"<Relationship\b[^>]*/>")
+_TARGET_RE = re.compile(r'\bTarget="([^"]+)"')
+
+# Secțiunile din styles.xml unite după conținut: secțiune -> element
+_STYLE_LISTS = {"fonts": "font", "fills": "fill", "borders": "border", "cellXfs": "xf"}
+# Secțiunile care trebuie să fie identice (stilurile denumite și cele condiționale vin din template)
+_STYLE_FIXED = ("cellStyleXfs", "cellStyles", "dxfs")
+_XF_REFS_RE = re.compile(r'\b(numFmtId|fontId|fillId|borderId)="(\d+)"')
+_NUM_FMT_RE = re.compile(r"<numFmt\b[^>]*/>")
+# Indicii de stil din XML-ul foii: celule și rânduri (s="..."), coloane (style="...")
+_STYLE_REF_RE = re.compile(rb'(<(?:c|row)\b[^>]*?\ss="|<col\b[^>]*?\sstyle=")(\d+)"')
+# Primul id pentru formatele numerice proprii (cele mai mici sunt predefinite)
+_FIRST_CUSTOM_NUM_FMT = 164
+
+
+def _rels_part(part):
+    folder, name = os.path.split(part)
+    return f"{folder}/_rels/{name}.rels"
+
+
+def _resolve(base_part, target):
+    """
+    Calea în arhivă a țintei unei relații, relativă la folderul părții 'base_part'.
+    """
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return os.path.normpath(os.path.join(os.path.dirname(base_part), target)).replace(os.sep, "/")
+
+
+def _renamed(part, index):
+    """
+    Numele părții pentru foaia 'index' (ex: printerSettings1.bin -> printerSettings3.bin).
+    """
+    folder, name = os.path.split(part)
+    stem, ext = os.path.splitext(name)
+    stem = re.sub(r"\d+$", "", stem)
+    return f"{folder}/{stem}{index}{ext}"
+
+
+def _sheet_rels(rels, sheet_part, index):
+    """
+    Relațiile foii 'index', cu țintele redenumite (vezi _renamed).
+    """
+    def rename(match):
+        relationship = match.group(0)
+        if 'TargetMode="External"' in relationship:
+            return relationship
+        part = _resolve(sheet_part, _TARGET_RE.search(relationship).group(1))
+        return _TARGET_RE.sub(f'Target="/{_renamed(part, index)}"', relationship)
+
+    return _RELATIONSHIP_RE.sub(rename, rels)
+
+
+def _section(xml, tag):
+    """
+    Elementul <tag ...>...</tag> (sau <tag .../>) din styles.xml; None dacă lipsește.
+    """
+    match = re.search(rf"<{tag}\b[^>]*/>|<{tag}\b[^>]*>.*?</{tag}>", xml, flags=re.S)
+    return match.group(0) if match else None
+
+
+def _children(section, tag):
+    return re.findall(rf"<{tag}\b[^>]*/>|<{tag}\b[^>]*>.*?</{tag}>", section or "", flags=re.S)
+
+
+def _attribute(element, name):
+    match = re.search(rf'\b{name}="([^"]*)"', element)
+    return match.group(1) if match else None
+
+
+class _Styles:
+    """
+    Stilurile workbook-ului combinat: cele ale primului fișier, la care se adaugă
+    (după conținut) stilurile celorlalte fișiere care lipsesc.
+    """
+
+    def __init__(self, xml):
+        self.xml = xml
+        self.items = {section: _children(_section(xml, section), tag) for section, tag in _STYLE_LISTS.items()}
+        self.index = {section: {} for section in _STYLE_LISTS}
+        for section, items in self.items.items():
+            for position, item in enumerate(items):
+                self.index[section].setdefault(item, position)
+        self.num_fmts = {int(_attribute(element, "numFmtId")): _attribute(element, "formatCode")
+                         for element in _NUM_FMT_RE.findall(_section(xml, "numFmts") or "")}
+        self.changed = False
+
+    def _add(self, section, item):
+        position = self.index[section].get(item)
+        if position is None:
+            position = self.index[section][item] = len(self.items[section])
+            self.items[section].append(item)
+            self.changed = True
+        return position
+
+    def _add_num_fmt(self, code):
+        for num_fmt_id, existing in self.num_fmts.items():
+            if existing == code:
+                return num_fmt_id
+        num_fmt_id = max([_FIRST_CUSTOM_NUM_FMT - 1, *self.num_fmts]) + 1
+        self.num_fmts[num_fmt_id] = code
+        self.changed = True
+        return num_fmt_id
+
+    def merge(self, xml, name):
+        """
+        Adaugă stilurile unui fișier; returnează lista {index cellXfs în fișier -> index
+        în workbook-ul combinat}, sau None dacă indicii rămân aceiași.
+        """
+        if xml == self.xml:
+            return None
+        for section in _STYLE_FIXED:
+            if _section(xml, section) != _section(self.xml, section):
+                raise ValueError(f"'{name}' nu provine din același template (stiluri diferite).")
+        other = _Styles(xml)
+        maps = {section: [self._add(section, item) for item in other.items[section]]
+                for section in ("fonts", "fills", "borders")}
+        maps["num_fmts"] = {num_fmt_id: self._add_num_fmt(code) for num_fmt_id, code in other.num_fmts.items()}
+
+        def remap(match):
+            attribute, value = match.group(1), int(match.group(2))
+            if attribute == "numFmtId":
+                value = maps["num_fmts"].get(value, value)  # formatele predefinite rămân
+            else:
+                value = maps[{"fontId": "fonts", "fillId": "fills", "borderId": "borders"}[attribute]][value]
+            return f'{attribute}="{value}"'
+
+        xf_map = [self._add("cellXfs", _XF_REFS_RE.sub(remap, xf)) for xf in other.items["cellXfs"]]
+        return None if xf_map == list(range(len(xf_map))) else xf_map
+
+    def to_xml(self):
+        if not self.changed:
+            return self.xml
+        xml = self.xml
+        num_fmts = "".join(f'<numFmt numFmtId="{num_fmt_id}" formatCode="{code}"/>'
+                           for num_fmt_id, code in sorted(self.num_fmts.items()))
+        sections = {"numFmts": f'<numFmts count="{len(self.num_fmts)}">{num_fmts}</numFmts>'}
+        for section in _STYLE_LISTS:
+            items = self.items[section]
+            sections[section] = f'<{section} count="{len(items)}">{"".join(items)}</{section}>'
+        for section, content in sections.items():
+            existing = _section(xml, section)
+            if existing is not None:
+                xml = xml.replace(existing, content, 1)
+            else:
+                # numFmts este primul element din styleSheet
+                xml = re.sub(r"(<styleSheet\b[^>]*>)", lambda match: match.group(1) + content, xml, count=1)
+        return xml
+
+
+class _Source:
+    """
+    Un fișier XLSX de combinat: foaia lui și părțile care țin doar de foaie.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with zipfile.ZipFile(path) as z:
+            self.sheet_part, self.title = _active_sheet_part(z)
+            self.entries = {info.filename: (info.CRC, info.file_size) for info in z.infolist()}
+            self.rels_part = _rels_part(self.sheet_part)
+            self.rels = z.read(self.rels_part).decode("utf-8") if self.rels_part in self.entries else None
+        # Părțile legate de foaie (ex: printerSettings), copiate separat pentru fiecare foaie
+        self.related = []
+        for relationship in _RELATIONSHIP_RE.findall(self.rels or ""):
+            if 'TargetMode="External"' not in relationship:
+                self.related.append(_resolve(self.sheet_part, _TARGET_RE.search(relationship).group(1)))
+
+    def own_parts(self):
+        return {self.sheet_part, self.rels_part, *self.related}
+
+    def shared_parts(self):
+        return {name: signature for name, signature in self.entries.items()
+                if name not in _WORKBOOK_PARTS and name not in self.own_parts()}
+
+
+def _remap_styles(data, xf_map):
+    return _STYLE_REF_RE.sub(lambda match: match.group(1) + str(xf_map[int(match.group(2))]).encode() + b'"',
+                             data)
+
+
+def _copy_sheet(source, target, selected, xf_map=None):
+    """
+    Copiază XML-ul foii în bucăți; doar prima foaie rămâne selectată
+    (mai multe foi selectate apar grupate în Excel). Cu 'xf_map', indicii
+    de stil sunt renumerotați (vezi _Styles.merge).
+    """
+    head = b""
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        head += chunk
+        start = head.find(b"<sheetData")
+        if start != -1 or not chunk:
+            start = len(head) if start == -1 else start
+            prefix = head[:start] if selected else _TAB_SELECTED_RE.sub(b"", head[:start])
+            pending = head[start:]
+            break
+    if xf_map is None:
+        target.write(prefix)
+        target.write(pending)
+        shutil.copyfileobj(source, target, CHUNK_SIZE)
+        return
+
+    target.write(_remap_styles(prefix, xf_map))
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        pending += chunk
+        # Doar până la ultimul '>': un element tăiat între bucăți este completat de următoarea
+        cut = pending.rfind(b">") + 1 if chunk else len(pending)
+        target.write(_remap_styles(pending[:cut], xf_map))
+        pending = pending[cut:]
+        if not chunk:
+            break
+
+
+def _workbook_xml(xml, sources):
+    sheets = "".join(
+        f'<sheet name="{source.title}" sheetId="{index}" r:id="rIdSheet{index}"/>'
+        for index, source in enumerate(sources, start=1)
+    )
+    return re.sub(r"<sheets>.*?</sheets>", lambda _: f"<sheets>{sheets}</sheets>", xml, count=1, flags=re.S)
+
+
+def _workbook_rels(xml, sources):
+    xml = _RELATIONSHIP_RE.sub(
+        lambda match: "" if f'Type="{WORKSHEET_TYPE}"' in match.group(0)
+        or f'Type="{CALC_CHAIN_TYPE}"' in match.group(0) else match.group(0), xml)
+    sheets = "".join(
+        f'<Relationship Id="rIdSheet{index}" Type="{WORKSHEET_TYPE}" Target="/xl/worksheets/sheet{index}.xml"/>'
+        for index in range(1, len(sources) + 1)
+    )
+    return xml.replace("</Relationships>", sheets + "</Relationships>", 1)
+
+
+def _content_types(xml, base, sources):
+    overrides = dict(re.findall(r'<Override\b[^>]*PartName="/([^"]+)"[^>]*ContentType="([^"]+)"[^>]*/>', xml))
+    removed = base.own_parts() | {"xl/calcChain.xml"}
+    xml = re.sub(r'<Override\b[^>]*PartName="/([^"]+)"[^>]*/>',
+                 lambda match: "" if match.group(1) in removed else match.group(0), xml)
+    added = []
+    for index, source in enumerate(sources, start=1):
+        added.append(f'<Override PartName="/xl/worksheets/sheet{index}.xml" ContentType="{WORKSHEET_CONTENT_TYPE}"/>')
+        for part in source.related:
+            if part in overrides:
+                added.append(f'<Override PartName="/{_renamed(part, index)}" ContentType="{overrides[part]}"/>')
+    return xml.replace("</Types>", "".join(added) + "</Types>", 1)
+
+
+def _app_xml(xml, sources):
+    """
+    Lista foilor din docProps/app.xml (dacă fișierul o conține).
+    """
+    if "<TitlesOfParts>" not in xml:
+        return xml
+    titles = "".join(f"<vt:lpstr>{escape(unescape(source.title))}</vt:lpstr>" for source in sources)
+    xml = re.sub(r"<TitlesOfParts>.*?</TitlesOfParts>",
+                 lambda _: f'<TitlesOfParts><vt:vector size="{len(sources)}" baseType="lpstr">{titles}'
+                           f"</vt:vector></TitlesOfParts>", xml, count=1, flags=re.S)
+    return re.sub(r"(<vt:lpstr>Worksheets</vt:lpstr></vt:variant><vt:variant><vt:i4>)\d+(</vt:i4>)",
+                  rf"\g<1>{len(sources)}\g<2>", xml, count=1)
+
+
+def combine_workbooks(files, output_file):
+    """
+    Scrie în 'output_file' un workbook cu foaia fiecărui fișier din 'files', în ordine.
+    Aruncă ValueError dacă fișierele nu provin din același template sau dacă
+    două foi ar avea același nume.
+    """
+    sources = [_Source(path) for path in files]
+    base = sources[0]
+    shared = base.shared_parts()
+    titles = set()
+    with zipfile.ZipFile(base.path) as z:
+        styles = _Styles(z.read(STYLES_PART).decode("utf-8"))
+    xf_maps = []
+    for source in sources:
+        if source.shared_parts() != shared:
+            raise ValueError(f"'{os.path.basename(source.path)}' nu provine din același template.")
+        with zipfile.ZipFile(source.path) as z:
+            xf_maps.append(styles.merge(z.read(STYLES_PART).decode("utf-8"), os.path.basename(source.path)))
+        title = unescape(source.title).lower()
+        if title in titles:
+            raise ValueError(f"Foaia '{unescape(source.title)}' apare de două ori.")
+        titles.add(title)
+
+    temp = f"{output_file}.{uuid.uuid4().hex}.tmp"
+    try:
+        with zipfile.ZipFile(base.path) as zbase, \
+                zipfile.ZipFile(temp, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in zbase.infolist():
+                name = info.filename
+                if name in base.own_parts() or name == "xl/calcChain.xml":
+                    continue
+                data = zbase.read(info)
+                if name == "xl/workbook.xml":
+                    data = _workbook_xml(data.decode("utf-8"), sources).encode("utf-8")
+                elif name == "xl/_rels/workbook.xml.rels":
+                    data = _workbook_rels(data.decode("utf-8"), sources).encode("utf-8")
+                elif name == "[Content_Types].xml":
+                    data = _content_types(data.decode("utf-8"), base, sources).encode("utf-8")
+                elif name == "docProps/app.xml":
+                    data = _app_xml(data.decode("utf-8"), sources).encode("utf-8")
+                elif name == STYLES_PART:
+                    data = styles.to_xml().encode("utf-8")
+                zout.writestr(name, data)
+
+            for index, (source, xf_map) in enumerate(zip(sources, xf_maps), start=1):
+                with zipfile.ZipFile(source.path) as zin:
+                    with zin.open(source.sheet_part) as sheet, \
+                            zout.open(f"xl/worksheets/sheet{index}.xml", "w", force_zip64=True) as target:
+                        _copy_sheet(sheet, target, selected=index == 1, xf_map=xf_map)
+                    if source.rels is None:
+                        continue
+                    for part in source.related:
+                        zout.writestr(_renamed(part, index), zin.read(part))
+                    zout.writestr(f"xl/worksheets/_rels/sheet{index}.xml.rels",
+                                  _sheet_rels(source.rels, source.sheet_part, index))
+        os.replace(temp, output_file)
+    finally:
+        if os.path.exists(temp):
+            os.unlink(temp)
+
+
+def combined_name(label):
+    """
+    Numele fișierului combinat pentru un tip de fișier (ex: "PPI (toate).xlsx").
+    """
+    return f"{label}{COMBINED_SUFFIX}"
+
+
+def remove_combined_outputs(output_folder, workbook=None):
+    """
+    Șterge fișierele combinate ale rulărilor anterioare din 'output_folder' (cele cu
+    COMBINED_SUFFIX și 'workbook', dacă este dat): altfel ar rămâne listate și
+    arhivate lângă rezultatele noi.
+    """
+    if not os.path.isdir(output_folder):
+        return
+    for name in os.listdir(output_folder):
+        if name.endswith(COMBINED_SUFFIX) or name == workbook:
+            os.unlink(os.path.join(output_folder, name))
+
+
+def combine_outputs(output_files, workbook_file, log):
+    """
+    Combină fișierele generate (cele care există, ordonate după nume) în
+    'workbook_file' și le șterge pe cele separate. La eroare, fișierele
+    separate rămân și eroarea este scrisă în log.
+    """
+    name = os.path.basename(workbook_file)
+    if any(os.path.abspath(path) == os.path.abspath(workbook_file) for path in output_files):
+        # Un simbol are exact numele fișierului combinat: l-am suprascrie
+        message = f"Eroare la combinarea fișierelor în '{name}': un simbol are același nume cu fișierul combinat."
+        print(message)
+        log.write(message)
+        return
+    files = sorted(path for path in output_files if os.path.exists(path))
+    if not files:
+        return
+    try:
+        combine_workbooks(files, workbook_file)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        message = f"Eroare la combinarea fișierelor în '{name}': {e}"
+    else:
+        for path in files:
+            os.unlink(path)
+        message = f"✔ Fișier completat: {name} ({len(files)} foi)"
+    print(message)
+    log.write(message)
@@ -0,0 +1,203 @@
+"""
+Citirea exporturilor CSV TradingView pentru toate pipeline-urile.
+
+Scripturile folosesc doar primele două coloane (time și valoarea), dar
+exporturile cu indicatori pot avea zeci de coloane. read_tv_csv citește doar
+aceste două coloane, cu tipuri fixe (fără inferență pe tot fișierul), cu cel
+mai rapid motor disponibil (pyarrow dacă este instalat, altfel cel în C),
+și convertește coloana 'time' o singură dată.
+
+La încărcare (/upload/), fiecare CSV este citit o dată și coloanele dată/valoare
+sunt salvate alături, într-un fișier NumPy ('<nume>.csv.npz'). read_tv_csv
+folosește acest fișier cât timp CSV-ul nu s-a schimbat, așa că reprocesarea
+aceleiași sesiuni nu mai parsează CSV-urile. Tot acolo se păstrează hash-ul
+SHA-256 al CSV-ului, calculat în timpul încărcării (vezi app/uploads.py), folosit
+de cheia cache-ului de rezultate (source_sha256) fără recitirea fișierului.
+
+Pentru istoricele foarte lungi (motorul "stream"), ChunkedTvCsv citește
+aceleași două coloane în bucăți, fără să țină tot fișierul în memorie.
+
+Configurare (variabile de mediu):
+ - CSV_ENGINE     : "pyarrow" / "c" (implicit: pyarrow dacă este instalat)
+ - CSV_CHUNK_ROWS : rândurile unei bucăți citite de ChunkedTvCsv (implicit 50000)
+"""
+import csv
+import importlib.util
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from app.xlsx_utils import parse_tv_times
+
+CSV_ENGINE = os.getenv(
+    "CSV_ENGINE", "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+)
+
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "50000"))
+
+SIDECAR_SUFFIX = ".npz"
+# Se incrementează când se schimbă conținutul sidecar-ului
+SIDECAR_FORMAT = 2
+
+
+def _header_and_first_row(csv_path):
+    """
+    Primul rând (antetul) și primul rând de date ale fișierului.
+    """
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        first_row = next(reader, [])
+    return header, first_row
+
+
+def _is_number(text):
+    try:
+        float(text)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _column_types(csv_path):
+    """
+    Tipurile fixe ale coloanelor time și valoare, pentru pd.read_csv(dtype=...).
+    """
+    header, first_row = _header_and_first_row(csv_path)
+    if len(header) < 2:
+        raise ValueError(f"Fișierul CSV are {len(header)} coloane; sunt necesare cel puțin 2.")
+
+    time_column, value_column = header[0], header[1]
+    # Exporturile TradingView au 'time' fie timestamp Unix, fie dată ISO
+    time_dtype = "float64" if first_row and _is_number(first_row[0]) else "object"
+    return {time_column: time_dtype, value_column: "float64"}
+
+
+def _parse_tv_csv(csv_path, engine=None):
+    """
+    Parsează CSV-ul: (dates, values), vezi read_tv_csv.
+    """
+    dtype = _column_types(csv_path)
+    try:
+        df = pd.read_csv(
+            csv_path,
+            usecols=[0, 1],
+            dtype=dtype,
+            engine=engine or CSV_ENGINE,
+        )
+    except ValueError:
+        # Coloane cu valori nenumerice: revenim la inferența de tipuri, ca înainte
+        df = pd.read_csv(csv_path, usecols=[0, 1])
+
+    dates = parse_tv_times(df.iloc[:, 0].to_numpy())
+    values = df.iloc[:, 1].to_numpy()
+    return dates, values
+
+
+def sidecar_path(csv_path):
+    return f"{csv_path}{SIDECAR_SUFFIX}"
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return np.array([SIDECAR_FORMAT, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def write_sidecar(csv_path, sha256=None):
+    """
+    Citește CSV-ul și salvează coloanele dată/valoare în '<csv>.npz', împreună
+    cu 'sha256' (hash-ul conținutului, dacă este cunoscut).
+    Returnează numărul de rânduri. Aruncă excepția parserului dacă fișierul
+    nu este un export valid. Dacă valorile nu sunt numerice/date, coloanele
+    nu se salvează (CSV-ul va fi citit normal la procesare).
+    """
+    dates, values = _parse_tv_csv(csv_path)
+    arrays = {}
+    if dates.dtype.kind == "M" and values.dtype.kind == "f":
+        arrays.update(dates=dates, values=values)
+    if sha256:
+        arrays["sha256"] = np.array(sha256)
+    if arrays:
+        target = sidecar_path(csv_path)
+        temp = f"{target}.{uuid.uuid4().hex}.tmp"
+        with open(temp, "wb") as f:
+            np.savez(f, source=_source_signature(csv_path), **arrays)
+        os.replace(temp, target)
+    return len(dates)
+
+
+def _read_sidecar(csv_path):
+    """
+    (dates, values) din sidecar, sau None dacă lipsește ori nu mai corespunde CSV-ului.
+    """
+    try:
+        with np.load(sidecar_path(csv_path), allow_pickle=False) as data:
+            if not np.array_equal(data["source"], _source_signature(csv_path)):
+                return None
+            return data["dates"], data["values"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def source_sha256(csv_path):
+    """
+    Hash-ul SHA-256 al CSV-ului, din sidecar (calculat la încărcare), sau None
+    dacă lipsește ori sidecar-ul nu mai corespunde CSV-ului.
+    """
+    try:
+        with np.load(sidecar_path(csv_path), allow_pickle=False) as data:
+            if not np.array_equal(data["source"], _source_signature(csv_path)):
+                return None
+            return str(data["sha256"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def read_tv_csv(csv_path, engine=None):
+    """
+    Citește un export TradingView și returnează (dates, values) ca array-uri NumPy:
+     - dates  : datetime64 (sau valorile brute, dacă nu sunt date)
+     - values : float64 (sau valorile brute, dacă coloana nu este numerică)
+    Folosește sidecar-ul '<csv>.npz' când există și este actual.
+    """
+    cached = _read_sidecar(csv_path)
+    if cached is not None:
+        return cached
+    return _parse_tv_csv(csv_path, engine)
+
+
+class ChunkedTvCsv:
+    """
+    Un export TradingView citit în bucăți de cel mult 'chunk_rows' rânduri, pentru
+    istoricele foarte lungi (motorul "stream"): memoria nu crește cu lungimea fișierului.
+    - len(...) : numărul de rânduri, aflat la construire dintr-o primă trecere prin fișier
+    - iter(...): bucățile (dates, values), cu aceleași valori pe care le-ar da read_tv_csv
+    Fișierul poate fi parcurs de mai multe ori; sidecar-ul '<csv>.npz' nu este folosit.
+    """
+
+    def __init__(self, csv_path, chunk_rows=None):
+        self.csv_path = csv_path
+        self.chunk_rows = chunk_rows or CSV_CHUNK_ROWS
+        self._dtype = _column_types(csv_path)
+        try:
+            self.rows = sum(len(chunk) for chunk in self._chunks())
+        except ValueError:
+            # Coloane cu valori nenumerice: inferența de tipuri, ca în read_tv_csv
+            self._dtype = None
+            self.rows = sum(len(chunk) for chunk in self._chunks())
+
+    def _chunks(self):
+        # pyarrow nu citește în bucăți; motorul C cu round_trip rotunjește numerele la fel ca el
+        with pd.read_csv(self.csv_path, usecols=[0, 1], dtype=self._dtype, engine="c",
+                         float_precision=None if CSV_ENGINE == "c" else "round_trip",
+                         chunksize=self.chunk_rows) as reader:
+            yield from reader
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        for chunk in self._chunks():
+            yield parse_tv_times(chunk.iloc[:, 0].to_numpy()), chunk.iloc[:, 1].to_numpy()
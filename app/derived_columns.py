@@ -0,0 +1,544 @@
+"""
+Calculul vectorizat (NumPy) al coloanelor cu formule din template-uri.
+
+Template-urile conțin, pe lângă datele din CSV, coloane derivate cu formule:
+variații procentuale (MoM / YoY / trimestriale), ASINH, z-score pe ferestre
+mobile și cumulative, deviații standard, corelații și medii. Fișierele generate
+nu au valori în cache pentru aceste formule, așa că pandas și orice alt
+cititor văd celule goale până la recalcularea în Excel.
+
+Fiecare script descrie coloanele template-ului său în DERIVED_COLUMNS, o listă
+de (coloană, primul rând, formulă), în ordinea calculului. Fiecare formulă de
+mai jos știe:
+ - textul formulei din template pentru un rând (formula(row)), folosit pentru
+   verificarea descrierii față de template (check_template);
+ - calculul ei pe toată coloana, cu NumPy (compute).
+
+Calculul urmează semantica Excel pentru celulele care nu sunt numere: ""
+(rezultatul IF-urilor din formule), celule goale și erori (#VALUE!, #DIV/0!),
+propagate ca în Excel. Celulele golite de scripturi (ultimul rând, rândurile
+trimestriale în plus) rămân goale și sunt văzute ca atare de formulele care
+le folosesc.
+
+Modul „doar valori” (values_only în scripturi) scrie aceste valori în locul
+formulelor: "" devine celulă goală, erorile rămân erori.
+
+Verificarea tuturor template-urilor:
+    python -m app.derived_columns
+"""
+import argparse
+import importlib
+import os
+import re
+import sys
+import threading
+import warnings
+
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+
+# Starea unei celule
+NUMBER, TEXT, BLANK = 0, 1, 2
+# Erorile Excel (stările >= VALUE_ERROR)
+VALUE_ERROR, DIV0_ERROR = 3, 4
+ERROR_CODES = {VALUE_ERROR: "#VALUE!", DIV0_ERROR: "#DIV/0!"}
+
+_SPACES_RE = re.compile(r"\s+")
+_PARENTHESIZED_REF_RE = re.compile(r"^=\((\$?[A-Z]+\$?\d+)\)$")
+
+
+class _Column:
+    """
+    O coloană a foii: valori (float64) și stări, indexate după numărul rândului.
+    """
+
+    def __init__(self, values, states):
+        self.values = values
+        self.states = states
+
+    @classmethod
+    def blank(cls, size):
+        return cls(np.zeros(size), np.full(size, BLANK, dtype=np.uint8))
+
+    def numbers(self):
+        return self.states == NUMBER
+
+    def shifted(self, offset):
+        """
+        Coloana citită cu 'offset' rânduri mai jos (offset < 0: mai sus); în afara foii, celule goale.
+        """
+        result = _Column.blank(len(self.values))
+        if offset >= 0:
+            result.values[:len(self.values) - offset] = self.values[offset:]
+            result.states[:len(self.values) - offset] = self.states[offset:]
+        else:
+            result.values[-offset:] = self.values[:offset]
+            result.states[-offset:] = self.states[:offset]
+        return result
+
+    def as_operand(self):
+        """
+        Valorile folosite într-o operație aritmetică: celula goală este 0, "" dă #VALUE!.
+        """
+        values = np.where(self.states == BLANK, 0.0, self.values)
+        states = np.where(self.states == TEXT, VALUE_ERROR,
+                          np.where(self.states == BLANK, NUMBER, self.states)).astype(np.uint8)
+        return values, states
+
+
+def _window_ref(source, row, length=None, anchor=None):
+    if anchor is not None:
+        return f"${source}${anchor}:{source}{row}"
+    return f"{source}{row - length + 1}:{source}{row}"
+
+
+class _WindowStats:
+    """
+    Statisticile ferestrelor care se termină pe fiecare rând (r + offset), ca în Excel:
+    COUNT, ROWS, prima eroare (STDEV.S / AVERAGE o returnează), AVERAGE, STDEV.S.
+    Ferestrele sunt mobile ('length' rânduri) sau cumulative (de la rândul 'anchor').
+    """
+
+    def __init__(self, column, length=None, anchor=None, offset=0):
+        size = len(column.values)
+        states = np.concatenate([column.states, np.full(offset, BLANK, dtype=np.uint8)])
+        values = np.concatenate([column.values, np.zeros(offset)])
+        numbers = states == NUMBER
+        ends = np.arange(size) + offset
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if anchor is None:
+                self._rolling(values, states, numbers, length, offset, size)
+            else:
+                self._cumulative(values, states, numbers, anchor, ends)
+
+    def _rolling(self, values, states, numbers, length, offset, size):
+        pad = length - 1
+        values = np.concatenate([np.zeros(pad), values])
+        states = np.concatenate([np.full(pad, BLANK, dtype=np.uint8), states])
+        numbers = np.concatenate([np.zeros(pad, dtype=bool), numbers])
+        window = np.lib.stride_tricks.sliding_window_view
+        w_values = window(values, length)[offset:offset + size]
+        w_states = window(states, length)[offset:offset + size]
+        w_numbers = window(numbers, length)[offset:offset + size]
+
+        self.rows = np.full(size, length)
+        self.count = w_numbers.sum(axis=1)
+        errors = w_states >= VALUE_ERROR
+        first = errors.argmax(axis=1)
+        self.error = np.where(errors.any(axis=1), w_states[np.arange(size), first], 0)
+
+        self.mean = np.where(w_numbers, w_values, 0.0).sum(axis=1) / self.count
+        deviations = np.where(w_numbers, w_values - self.mean[:, None], 0.0)
+        self.std = np.sqrt((deviations ** 2).sum(axis=1) / (self.count - 1))
+        low = np.where(w_numbers, w_values, np.inf).min(axis=1)
+        high = np.where(w_numbers, w_values, -np.inf).max(axis=1)
+        self.std[low == high] = 0.0
+
+    def _cumulative(self, values, states, numbers, anchor, ends):
+        size = len(ends)
+        if anchor >= len(values):
+            # Foaie mai scurtă decât începutul ferestrei: nicio fereastră validă
+            missing = anchor + 1 - len(values)
+            values = np.concatenate([values, np.zeros(missing)])
+            states = np.concatenate([states, np.full(missing, BLANK, dtype=np.uint8)])
+            numbers = np.concatenate([numbers, np.zeros(missing, dtype=bool)])
+        valid = ends >= anchor
+        index = np.clip(ends - anchor, 0, None)
+        tail_values, tail_states, tail_numbers = values[anchor:], states[anchor:], numbers[anchor:]
+
+        self.rows = np.where(valid, ends - anchor + 1, 0)
+        self.count = np.where(valid, np.cumsum(tail_numbers)[index], 0)
+        errors = np.flatnonzero(tail_states >= VALUE_ERROR)
+        self.error = np.zeros(size, dtype=np.uint8)
+        if len(errors):
+            self.error[valid & (index >= errors[0])] = tail_states[errors[0]]
+
+        # Sume cumulative pe valori deplasate (față de prima valoare), pentru precizie
+        reference = tail_values[tail_numbers][0] if tail_numbers.any() else 0.0
+        shifted = np.where(tail_numbers, tail_values - reference, 0.0)
+        sums = np.cumsum(shifted)[index]
+        squares = np.cumsum(shifted ** 2)[index]
+        self.mean = reference + sums / self.count
+        variance = (squares - sums ** 2 / self.count) / (self.count - 1)
+        self.std = np.sqrt(np.clip(variance, 0.0, None))
+        low = np.minimum.accumulate(np.where(tail_numbers, tail_values, np.inf))[index]
+        high = np.maximum.accumulate(np.where(tail_numbers, tail_values, -np.inf))[index]
+        self.std[low == high] = 0.0
+
+    def stdev_error(self):
+        """
+        Eroarea lui STDEV.S pe fereastră (0 = fără eroare).
+        """
+        return np.where(self.error > 0, self.error, np.where(self.count < 2, DIV0_ERROR, 0))
+
+
+def _result(size, error, text, values):
+    """
+    Coloana rezultat a unui IF(OR(...), "", valoare): eroare > "" > număr.
+    """
+    states = np.where(error > 0, error, np.where(text, TEXT, NUMBER)).astype(np.uint8)
+    return _Column(np.where(states == NUMBER, values, 0.0), states)
+
+
+class Difference:
+    """
+    =B3-B2 (diferența față de rândul de acum 'lag' rânduri).
+    """
+
+    def __init__(self, source, lag=1):
+        self.source = source
+        self.lag = lag
+
+    def formula(self, row):
+        return f"={self.source}{row}-{self.source}{row - self.lag}"
+
+    def compute(self, grid):
+        current_values, current_states = grid[self.source].as_operand()
+        previous_values, previous_states = grid[self.source].shifted(-self.lag).as_operand()
+        error = np.where(current_states > NUMBER, current_states, previous_states)
+        return _result(len(current_values), error, False, current_values - previous_values)
+
+
+class PctChange:
+    """
+    Variația procentuală față de acum 'lag' rânduri ("" dacă lipsește o valoare sau baza este 0).
+    """
+
+    def __init__(self, source, lag=1):
+        self.source = source
+        self.lag = lag
+
+    def formula(self, row):
+        current, previous = f"{self.source}{row}", f"{self.source}{row - self.lag}"
+        return (f'=IF(OR(NOT(ISNUMBER({current})), NOT(ISNUMBER({previous})), {previous}=0), "", '
+                f"({current}-{previous})/{previous})")
+
+    def compute(self, grid):
+        current = grid[self.source]
+        previous = current.shifted(-self.lag)
+        # Doar comparația B2=0 poate produce o eroare (ISNUMBER nu propagă erorile)
+        error = np.where(previous.states >= VALUE_ERROR, previous.states, 0)
+        text = ~current.numbers() | ~previous.numbers() | (previous.values == 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = (current.values - previous.values) / previous.values
+        return _result(len(values), error, text, values)
+
+
+class Asinh:
+    """
+    =ASINH(C3).
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    def formula(self, row):
+        return f"=ASINH({self.source}{row})"
+
+    def compute(self, grid):
+        values, states = grid[self.source].as_operand()
+        return _result(len(values), np.where(states > NUMBER, states, 0), False, np.arcsinh(values))
+
+
+class Lead:
+    """
+    =D4 pe rândul 3 (valoarea de pe rândul următor; o celulă goală este 0).
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    def formula(self, row):
+        return f"={self.source}{row + 1}"
+
+    def compute(self, grid):
+        following = grid[self.source].shifted(1)
+        blank = following.states == BLANK
+        return _Column(np.where(blank, 0.0, following.values),
+                       np.where(blank, NUMBER, following.states).astype(np.uint8))
+
+
+class ZScore:
+    """
+    Z-score-ul valorii pe fereastra mobilă de 'length' rânduri sau pe fereastra
+    cumulativă de la rândul 'anchor' ("" dacă fereastra nu e completă sau STDEV.S = 0).
+    'offset' deplasează valoarea și fereastra (ex: AM19 pe rândul 18).
+    """
+
+    def __init__(self, source, length=None, anchor=None, offset=0):
+        self.source = source
+        self.length = length
+        self.anchor = anchor
+        self.offset = offset
+
+    def formula(self, row):
+        current = f"{self.source}{row + self.offset}"
+        window = _window_ref(self.source, row + self.offset, self.length, self.anchor)
+        return (f"=IF(OR(NOT(ISNUMBER({current})), COUNT({window}) < ROWS({window}), "
+                f'_xlfn.STDEV.S({window}) = 0), "", ({current}-AVERAGE({window}))/_xlfn.STDEV.S({window}))')
+
+    def compute(self, grid):
+        column = grid[self.source]
+        stats = _WindowStats(column, self.length, self.anchor, self.offset)
+        current = column.shifted(self.offset)
+        text = ~current.numbers() | (stats.count < stats.rows) | (stats.std == 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = (current.values - stats.mean) / stats.std
+        return _result(len(values), stats.stdev_error(), text, values)
+
+
+class Stdev:
+    """
+    =STDEV.S pe fereastra mobilă de 'length' rânduri.
+    """
+
+    def __init__(self, source, length):
+        self.source = source
+        self.length = length
+
+    def formula(self, row):
+        return f"=_xlfn.STDEV.S({_window_ref(self.source, row, self.length)})"
+
+    def compute(self, grid):
+        stats = _WindowStats(grid[self.source], self.length)
+        return _result(len(stats.std), stats.stdev_error(), False, stats.std)
+
+
+class Correl:
+    """
+    CORREL între ferestrele mobile de 'length' rânduri a două coloane
+    ("" dacă una are mai puțin de două numere sau STDEV.S = 0).
+    """
+
+    def __init__(self, first, second, length):
+        self.first = first
+        self.second = second
+        self.length = length
+
+    def formula(self, row):
+        first = _window_ref(self.first, row, self.length)
+        second = _window_ref(self.second, row, self.length)
+        return (f"=IF(OR(COUNT({first}) < 2, COUNT({second}) < 2, _xlfn.STDEV.S({first}) = 0, "
+                f'_xlfn.STDEV.S({second}) = 0), "", CORREL({first}, {second}))')
+
+    def compute(self, grid):
+        first, second = grid[self.first], grid[self.second]
+        first_stats = _WindowStats(first, self.length)
+        second_stats = _WindowStats(second, self.length)
+        first_error, second_error = first_stats.stdev_error(), second_stats.stdev_error()
+        error = np.where(first_error > 0, first_error, second_error)
+        text = (first_stats.std == 0) | (second_stats.std == 0)
+
+        # CORREL folosește doar perechile în care ambele valori sunt numere
+        size, pad = len(first.values), self.length - 1
+        window = np.lib.stride_tricks.sliding_window_view
+
+        def windows(column):
+            values = np.concatenate([np.zeros(pad), column.values])
+            numbers = np.concatenate([np.zeros(pad, dtype=bool), column.numbers()])
+            return window(values, self.length)[:size], window(numbers, self.length)[:size]
+
+        x, x_numbers = windows(first)
+        y, y_numbers = windows(second)
+        pairs = x_numbers & y_numbers
+        count = pairs.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            dx = np.where(pairs, x - (np.where(pairs, x, 0.0).sum(axis=1) / count)[:, None], 0.0)
+            dy = np.where(pairs, y - (np.where(pairs, y, 0.0).sum(axis=1) / count)[:, None], 0.0)
+            sxx, syy = (dx ** 2).sum(axis=1), (dy ** 2).sum(axis=1)
+            values = (dx * dy).sum(axis=1) / np.sqrt(sxx * syy)
+        constant = (count < 2) | (sxx == 0) | (syy == 0)
+        error = np.where((error == 0) & ~text & constant, DIV0_ERROR, error)
+        return _result(size, error, text, values)
+
+
+class Mean:
+    """
+    Media coloanelor date ("" dacă una nu este număr).
+    """
+
+    def __init__(self, *sources):
+        self.sources = sources
+
+    def formula(self, row):
+        cells = [f"{source}{row}" for source in self.sources]
+        checks = ", ".join(f"NOT(ISNUMBER({cell}))" for cell in cells)
+        return f'=IF(OR({checks}), "", ({"+".join(cells)})/{len(cells)})'
+
+    def compute(self, grid):
+        columns = [grid[source] for source in self.sources]
+        text = np.logical_or.reduce([~column.numbers() for column in columns])
+        values = sum(column.values for column in columns) / len(columns)
+        return _result(len(values), 0, text, values)
+
+
+def _normalize(formula):
+    formula = _SPACES_RE.sub("", formula)
+    return _PARENTHESIZED_REF_RE.sub(r"=\1", formula)
+
+
+_template_lock = threading.Lock()
+_template_ranges = {}  # {(cale, mtime, dimensiune, id(columns)): {coloană: (primul rând, ultimul rând)}}
+
+
+def _template_formulas(template_path):
+    """
+    Formulele foii active: {coloană: {rând: formulă}}.
+    """
+    formulas = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        wb = load_workbook(template_path, read_only=True)
+    try:
+        for row in wb.active.iter_rows():
+            for cell in row:
+                if cell.data_type == "f":
+                    formulas.setdefault(cell.column_letter, {})[cell.row] = cell.value
+    finally:
+        wb.close()
+    return formulas
+
+
+def check_template(template_path, columns):
+    """
+    Verifică descrierea 'columns' (DERIVED_COLUMNS) față de formulele template-ului:
+    fiecare coloană cu formule trebuie descrisă, pe un interval continuu de rânduri
+    începând cu primul rând declarat, cu exact formula calculată.
+    Returnează {coloană: (primul rând, ultimul rând)}; aruncă ValueError la diferențe.
+    Rezultatul este memorat per proces cât timp template-ul nu se schimbă.
+    """
+    stat = os.stat(template_path)
+    key = (os.path.abspath(template_path), stat.st_mtime_ns, stat.st_size, id(columns))
+    with _template_lock:
+        ranges = _template_ranges.get(key)
+    if ranges is not None:
+        return ranges
+
+    formulas = _template_formulas(template_path)
+    described = {column: (first_row, derived) for column, first_row, derived in columns}
+    name = os.path.basename(template_path)
+    for column in formulas:
+        if column not in described:
+            raise ValueError(f"Coloana {column} din '{name}' are formule care nu sunt calculate (DERIVED_COLUMNS).")
+
+    ranges = {}
+    for column, (first_row, derived) in described.items():
+        cells = formulas.get(column, {})
+        rows = sorted(cells)
+        if not rows or rows[0] != first_row or rows[-1] - first_row + 1 != len(rows):
+            found = f"{rows[0]}-{rows[-1]}" if rows else "niciun rând"
+            raise ValueError(f"Coloana {column} din '{name}': formulele nu încep pe rândul {first_row} "
+                             f"sau au goluri ({found}).")
+        for row in rows:
+            if _normalize(cells[row]) != _normalize(derived.formula(row)):
+                raise ValueError(f"Celula {column}{row} din '{name}': formula {cells[row]} diferă de "
+                                 f"cea calculată {derived.formula(row)}.")
+        ranges[column] = (first_row, rows[-1])
+
+    with _template_lock:
+        _template_ranges[key] = ranges
+    return ranges
+
+
+def _data_column(values, size, start_row=2):
+    """
+    Coloană cu datele din CSV, ca în celulele scrise de write_series (NaN = celulă goală).
+    """
+    column = _Column.blank(size)
+    values = np.asarray(values)[:max(size - start_row, 0)]
+    if values.dtype.kind in "iuf":
+        numbers = ~np.isnan(values.astype(float))
+        rows = np.arange(len(values)) + start_row
+        column.values[rows[numbers]] = values[numbers]
+        column.states[rows[numbers]] = NUMBER
+        return column
+    for row, value in enumerate(values, start=start_row):
+        if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+            if not np.isnan(value):
+                column.values[row], column.states[row] = value, NUMBER
+        elif value is not None:
+            column.states[row] = TEXT
+    return column
+
+
+def compute_values(template_path, columns, data, last_row, is_cleared):
+    """
+    Valorile coloanelor derivate pentru o foaie generată.
+    - columns    : DERIVED_COLUMNS al scriptului
+    - data       : {coloană: valori din CSV, de la rândul 2} (ex: {"B": values, "Q": values_quarter})
+    - last_row   : ultimul rând al foii (după eliminarea rândurilor în plus)
+    - is_cleared : is_cleared(rând, index coloană) -> True pentru celulele golite de script
+    Returnează {index coloană: (primul rând, [valori])}, cu None pentru celulele
+    goale sau "" și codul erorii (ex: "#DIV/0!") pentru erori.
+    """
+    ranges = check_template(template_path, columns)
+    size = last_row + 2  # un rând în plus, gol, pentru formulele care citesc rândul următor
+    grid = {column: _data_column(values, size) for column, values in data.items()}
+    result = {}
+    for column, first_row, derived in columns:
+        index = column_index_from_string(column)
+        last = min(ranges[column][1], last_row)
+        computed = derived.compute(grid)
+        present = np.zeros(size, dtype=bool)
+        present[first_row:last + 1] = [not is_cleared(row, index) for row in range(first_row, last + 1)]
+        computed.states[~present] = BLANK
+        computed.values[~present] = 0.0
+        grid[column] = computed
+        if last < first_row:
+            continue
+
+        states = computed.states[first_row:last + 1]
+        values = computed.values[first_row:last + 1].astype(object)
+        values[states != NUMBER] = None
+        for code, text in ERROR_CODES.items():
+            values[states == code] = text
+        result[index] = (first_row, values.tolist())
+    return result
+
+
+def fill_patch(patch, template_path, columns, data):
+    """
+    Modul „doar valori” pentru motorul xml: valorile calculate înlocuiesc formulele din patch.
+    """
+    values = compute_values(template_path, columns, data, patch.last_row, patch.is_cleared)
+    for index, (first_row, column_values) in values.items():
+        patch.write_column(index, column_values, first_row)
+
+
+def fill_sheet(ws, template_path, columns, data, last_row):
+    """
+    Modul „doar valori” pentru openpyxl: valorile calculate înlocuiesc formulele din foaie.
+    """
+    values = compute_values(template_path, columns, data, last_row,
+                            lambda row, column: ws.cell(row=row, column=column).value is None)
+    for index, (first_row, column_values) in values.items():
+        for row, value in enumerate(column_values, start=first_row):
+            ws.cell(row=row, column=index).value = value
+
+
+def main(argv=None):
+    from app.pipelines import PIPELINES
+
+    parser = argparse.ArgumentParser(description="Verifică DERIVED_COLUMNS față de formulele template-urilor.")
+    parser.add_argument("types", nargs="*", help="Tipurile verificate (implicit: toate).")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for file_type in args.types or sorted(PIPELINES):
+        pipeline = PIPELINES[file_type]
+        module = importlib.import_module(f"app.{pipeline['module']}")
+        try:
+            ranges = check_template(pipeline["template"], module.DERIVED_COLUMNS)
+        except ValueError as e:
+            failed += 1
+            print(f"{file_type}: {e}")
+            continue
+        cells = sum(last - first + 1 for first, last in ranges.values())
+        print(f"{file_type}: OK ({len(ranges)} coloane, {cells} formule)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""
+Coadă durabilă de job-uri de procesare, într-un fișier SQLite (JOB_BACKEND=queue).
+
+În loc să ruleze job-urile pe pool-ul de procese al serverului web, /process/
+le scrie în coadă; job-urile sunt preluate de unul sau mai multe procese
+`python -m app.worker` (vezi app/worker.py), pe aceeași mașină sau pe alte
+mașini care văd același folder (sessions/ și fișierul cozii).
+
+Preluarea folosește „lease”-uri: worker-ul care ia un job îl deține până la
+lease_expires și își prelungește periodic lease-ul (heartbeat). Dacă worker-ul
+moare, lease-ul expiră și job-ul este preluat din nou de alt worker, de cel
+mult JOB_MAX_ATTEMPTS ori. Erorile pipeline-ului nu sunt reîncercate.
+
+Evenimentele job-ului (schimbările de stare și progresul pe simboluri, vezi
+app/progress.py) sunt scrise tot în coadă, deci /process/events funcționează
+și când worker-ul rulează pe altă mașină.
+
+Configurare (variabile de mediu):
+ - JOB_BACKEND       : "local" (implicit, pool-ul de procese al serverului) sau "queue"
+ - JOB_QUEUE_DB      : fișierul SQLite al cozii (implicit cache/jobs.db)
+ - JOB_LEASE_SECONDS : durata unui lease (implicit 60); heartbeat la o treime din ea
+ - JOB_MAX_ATTEMPTS  : de câte ori este preluat un job ale cărui worker-e au murit (implicit 3)
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.jobs import ACTIVE_STATES, DONE, ERROR, JOB_HISTORY, JOB_QUEUE_LIMIT, QUEUED, RUNNING, STATUS, QueueFull
+
+JOB_BACKEND = os.getenv("JOB_BACKEND", "local")
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "cache/jobs.db")
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Cât de des verifică /process/events coada pentru evenimente noi (secunde)
+EVENTS_POLL_INTERVAL = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    module TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    label TEXT,
+    status TEXT NOT NULL,
+    message TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session_id, created);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+# Coloanele unui job returnate de get() (aceleași chei ca în JobManager)
+_JOB_FIELDS = ("id", "session_id", "label", "status", "message", "error", "created", "started", "finished")
+
+
+class JobQueue:
+    """
+    Operațiile pe fișierul cozii. Fiecare thread are propria conexiune SQLite.
+    """
+
+    def __init__(self, path=JOB_QUEUE_DB, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._db().executescript(_SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    def _transaction(self):
+        """
+        Tranzacție cu lock de scriere luat de la început (BEGIN IMMEDIATE),
+        ca doi worker-i să nu poată prelua același job.
+        """
+        return _Transaction(self._db())
+
+    def _add_event(self, db, job_id, event):
+        event.setdefault("time", time.time())
+        db.execute(
+            "INSERT INTO job_events (job_id, seq, data) "
+            "SELECT ?, COALESCE(MAX(seq) + 1, 0), ? FROM job_events WHERE job_id = ?",
+            (job_id, json.dumps(event, ensure_ascii=False), job_id),
+        )
+
+    # -- server web ---------------------------------------------------------
+
+    def enqueue(self, session_id, module_name, kwargs, label, queue_limit=JOB_QUEUE_LIMIT):
+        """
+        Adaugă un job și îl returnează. Dacă sesiunea are deja un job activ, returnează
+        acel job. Aruncă QueueFull dacă există deja 'queue_limit' job-uri active.
+        """
+        with self._transaction() as db:
+            active = db.execute(
+                "SELECT id FROM jobs WHERE session_id = ? AND status IN (?, ?) ORDER BY created LIMIT 1",
+                (session_id, *ACTIVE_STATES),
+            ).fetchone()
+            if active is not None:
+                return self.get(active["id"], db)
+            count = db.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATES).fetchone()[0]
+            if count >= queue_limit:
+                raise QueueFull(f"Prea multe procesări în curs ({queue_limit}). Reîncercați în câteva momente.")
+            job_id = uuid.uuid4().hex
+            db.execute(
+                "INSERT INTO jobs (id, session_id, module, kwargs, label, status, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, session_id, module_name, json.dumps(kwargs), label, QUEUED, time.time()),
+            )
+            self._add_event(db, job_id, {"type": STATUS, "status": QUEUED})
+            return self.get(job_id, db)
+
+    def get(self, job_id, db=None):
+        row = (db or self._db()).execute(
+            f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def latest(self, session_id):
+        row = self._db().execute(
+            "SELECT id FROM jobs WHERE session_id = ? ORDER BY created DESC LIMIT 1", (session_id,)
+        ).fetchone()
+        return self.get(row["id"]) if row is not None else None
+
+    def is_active(self, session_id):
+        return self._db().execute(
+            "SELECT 1 FROM jobs WHERE session_id = ? AND status IN (?, ?) LIMIT 1", (session_id, *ACTIVE_STATES)
+        ).fetchone() is not None
+
+    def position(self, job):
+        """
+        Poziția job-ului în coada de așteptare (1 = următorul), sau 0 dacă nu așteaptă.
+        """
+        if job["status"] != QUEUED:
+            return 0
+        return self._db().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND created <= ?", (QUEUED, job["created"])
+        ).fetchone()[0]
+
+    def counts(self):
+        rows = self._db().execute(
+            "SELECT status, COUNT(*) AS n FROM jobs WHERE status IN (?, ?) GROUP BY status", ACTIVE_STATES
+        ).fetchall()
+        counts = {QUEUED: 0, RUNNING: 0}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def events_since(self, job_id, start=0):
+        rows = self._db().execute(
+            "SELECT seq, data FROM job_events WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, start)
+        ).fetchall()
+        return [dict(json.loads(row["data"]), id=row["seq"]) for row in rows]
+
+    def event_count(self, job_id):
+        return self._db().execute("SELECT COUNT(*) FROM job_events WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+    def trim_history(self, history=JOB_HISTORY):
+        """
+        Păstrează cel mult 'history' job-uri terminate (cu evenimentele lor).
+        """
+        with self._transaction() as db:
+            old = [row["id"] for row in db.execute(
+                "SELECT id FROM jobs WHERE status NOT IN (?, ?) ORDER BY finished DESC LIMIT -1 OFFSET ?",
+                (*ACTIVE_STATES, history),
+            ).fetchall()]
+            for job_id in old:
+                db.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    # -- worker -------------------------------------------------------------
+
+    def claim(self, worker_id):
+        """
+        Preia cel mai vechi job disponibil: în așteptare sau cu lease expirat (worker mort).
+        Job-urile cu lease expirat care au atins JOB_MAX_ATTEMPTS sunt marcate ca eșuate.
+        Returnează {"id", "session_id", "module", "kwargs", "label", "attempts"} sau None.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            for row in db.execute(
+                "SELECT id, attempts FROM jobs WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (RUNNING, now, self.max_attempts),
+            ).fetchall():
+                error = f"Procesul worker s-a oprit neașteptat (de {row['attempts']} ori)."
+                db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished = ?, lease_owner = NULL WHERE id = ?",
+                    (ERROR, error, now, row["id"]),
+                )
+                self._add_event(db, row["id"], {"type": STATUS, "status": ERROR, "message": None, "error": error})
+
+            row = db.execute(
+                "SELECT id, session_id, module, kwargs, label, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY created LIMIT 1",
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?, "
+                "started = COALESCE(started, ?) WHERE id = ?",
+                (RUNNING, worker_id, now + self.lease_seconds, now, row["id"]),
+            )
+            self._add_event(db, row["id"], {"type": STATUS, "status": RUNNING, "worker": worker_id,
+                                            "attempt": row["attempts"] + 1})
+            job = dict(row)
+            job["kwargs"] = json.loads(job["kwargs"])
+            job["attempts"] += 1
+            return job
+
+    def heartbeat(self, job_id, worker_id):
+        """
+        Prelungește lease-ul. Returnează False dacă worker-ul nu mai deține job-ul.
+        """
+        cursor = self._db().execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+            (time.time() + self.lease_seconds, job_id, worker_id, RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, worker_id, message=None, error=None):
+        """
+        Marchează job-ul terminat (DONE, sau ERROR dacă 'error'), doar dacă worker-ul încă îl deține.
+        Returnează False dacă job-ul a fost preluat între timp de alt worker.
+        """
+        status = ERROR if error else DONE
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = ?, message = ?, error = ?, finished = ?, lease_owner = NULL "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (status, message, error, time.time(), job_id, worker_id, RUNNING),
+            )
+            if cursor.rowcount != 1:
+                return False
+            self._add_event(db, job_id, {"type": STATUS, "status": status, "message": message, "error": error})
+            return True
+
+    def event_sink(self, job_id):
+        """
+        Destinație pentru app/progress.py: evenimentele sunt scrise în coadă.
+        """
+        return _EventSink(self, job_id)
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class _EventSink:
+    """
+    Are metoda put() ca o coadă multiprocessing; scrie evenimentele de progres în coada SQLite.
+    """
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+
+    def put(self, event):
+        event = dict(event)
+        event.pop("job_id", None)
+        with self.queue._transaction() as db:
+            self.queue._add_event(db, self.job_id, event)
+
+
+class QueueJobManager:
+    """
+    Aceeași interfață ca JobManager (app/jobs.py), dar job-urile sunt scrise în
+    coada durabilă și rulate de procesele `python -m app.worker`.
+    Metodele care citesc din SQLite sunt rapide (index), deci se apelează direct.
+    """
+
+    def __init__(self, queue, queue_limit=JOB_QUEUE_LIMIT, history=JOB_HISTORY):
+        self.queue = queue
+        self.queue_limit = queue_limit
+        self.history = history
+
+    def submit(self, session_id, module_name, kwargs, label):
+        job = self.queue.enqueue(session_id, module_name, kwargs, label, self.queue_limit)
+        self.queue.trim_history(self.history)
+        return job
+
+    def get(self, job_id):
+        return self.queue.get(job_id)
+
+    def latest(self, session_id):
+        return self.queue.latest(session_id)
+
+    def is_active(self, session_id):
+        return self.queue.is_active(session_id)
+
+    def active_count(self):
+        return sum(self.queue.counts().values())
+
+    def position(self, job):
+        return self.queue.position(job)
+
+    def public(self, job):
+        data = {key: value for key, value in job.items() if key != "session_id"}
+        data["position"] = self.position(job)
+        return data
+
+    def stats(self):
+        counts = self.queue.counts()
+        return {
+            "backend": "queue",
+            "queue_limit": self.queue_limit,
+            "queued": counts[QUEUED],
+            "running": counts[RUNNING],
+        }
+
+    def event_count(self, job_id):
+        return self.queue.event_count(job_id)
+
+    async def events(self, job_id, start=0, keepalive=None):
+        """
+        Ca JobManager.events(): evenimentele job-ului, citite periodic din coadă.
+        """
+        idle = 0.0
+        while True:
+            events = await asyncio.to_thread(self.queue.events_since, job_id, start)
+            for event in events:
+                yield event
+                start = event["id"] + 1
+            if events:
+                idle = 0.0
+            job = await asyncio.to_thread(self.queue.get, job_id)
+            if job is None or job["status"] not in ACTIVE_STATES:
+                # Evenimentele scrise odată cu starea finală
+                for event in await asyncio.to_thread(self.queue.events_since, job_id, start):
+                    yield event
+                return
+            await asyncio.sleep(EVENTS_POLL_INTERVAL)
+            idle += EVENTS_POLL_INTERVAL
+            if keepalive and idle >= keepalive:
+                idle = 0.0
+                yield None
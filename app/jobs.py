@@ -0,0 +1,255 @@
+"""
+Job-uri asincrone de procesare pentru endpoint-ul /process/.
+
+/process/ nu mai ține ocupat un thread pe toată durata conversiei: cererea
+doar pune job-ul în coadă și primește un ID, iar starea se citește din
+/jobs/{id}. Job-urile rulează pe pool-ul de procese (WorkerPool) fără să
+blocheze event loop-ul sau threadpool-ul FastAPI.
+
+Evenimentele de progres trimise de worker-i (vezi app/progress.py) sunt
+păstrate pe job, împreună cu evenimentele de stare ale job-ului, și pot fi
+urmărite pe măsură ce apar cu events() (folosit de /process/events).
+
+Configurare (variabile de mediu):
+ - JOB_MAX_CONCURRENCY : câte job-uri rulează simultan (implicit = WORKER_POOL_SIZE)
+ - JOB_QUEUE_LIMIT     : câte job-uri pot fi active (în așteptare + în rulare);
+                         peste această limită /process/ răspunde cu 429
+ - JOB_HISTORY         : câte job-uri terminate păstrăm pentru /jobs/{id}
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from app import progress
+from app.worker_pool import WORKER_POOL_SIZE
+
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", str(max(WORKER_POOL_SIZE, 1))))
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "20"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "500"))
+
+# Cât așteptăm, după terminarea job-ului, ultimele evenimente de progres din coadă
+EVENTS_DRAIN_TIMEOUT = 5
+
+# Stările unui job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# Tipul evenimentelor de stare ale job-ului (celelalte sunt cele din app/progress.py)
+STATUS = "status"
+
+
+class QueueFull(Exception):
+    """
+    Coada de job-uri este plină; clientul trebuie să reîncerce mai târziu.
+    """
+
+
+class JobManager:
+    """
+    Coadă de job-uri cu limită de concurență și limită de adâncime.
+    Toate metodele se apelează din event loop-ul aplicației.
+    """
+
+    def __init__(self, pool, max_concurrency=JOB_MAX_CONCURRENCY,
+                 queue_limit=JOB_QUEUE_LIMIT, history=JOB_HISTORY):
+        self.pool = pool
+        self.max_concurrency = max(max_concurrency, 1)
+        self.queue_limit = queue_limit
+        self.history = history
+        self._jobs = OrderedDict()  # {job_id: job}
+        self._active = {}           # {session_id: job_id} pentru job-urile active
+        self._semaphore = None
+        self._tasks = set()         # referințe la task-uri (altfel pot fi colectate de GC)
+        self._events = {}           # {job_id: [evenimente]}
+        self._changed = {}          # {job_id: asyncio.Event}, setat la fiecare eveniment nou
+        self._drained = {}          # {job_id: asyncio.Event}, setat când sosește END de la worker
+        self._loop = None
+        self.on_finished = None     # funcția apelată cu job-ul după terminarea lui (done / error)
+        pool.event_handler = self._on_worker_event
+
+    def active_count(self):
+        return len(self._active)
+
+    def is_active(self, session_id):
+        """
+        True dacă sesiunea are un job în așteptare sau în rulare.
+        """
+        return session_id in self._active
+
+    def submit(self, session_id, module_name, kwargs, label):
+        """
+        Pune un job în coadă și îl returnează imediat.
+        Dacă sesiunea are deja un job activ, returnează acel job (ambele ar scrie
+        în același folder de output). Aruncă QueueFull dacă s-a atins limita.
+        """
+        active_id = self._active.get(session_id)
+        if active_id is not None:
+            return self._jobs[active_id]
+        if self.active_count() >= self.queue_limit:
+            raise QueueFull(
+                f"Prea multe procesări în curs ({self.queue_limit}). Reîncercați în câteva momente."
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = asyncio.get_running_loop()
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "session_id": session_id,
+            "label": label,
+            "status": QUEUED,
+            "message": None,
+            "error": None,
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+        }
+        self._jobs[job["id"]] = job
+        self._active[session_id] = job["id"]
+        self._events[job["id"]] = []
+        self._changed[job["id"]] = asyncio.Event()
+        self._drained[job["id"]] = asyncio.Event()
+        self._record(job["id"], {"type": STATUS, "status": QUEUED})
+        task = asyncio.create_task(self._run(job, module_name, kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job, module_name, kwargs):
+        try:
+            async with self._semaphore:
+                job["status"] = RUNNING
+                job["started"] = time.time()
+                self._record(job["id"], {"type": STATUS, "status": RUNNING})
+                await self.pool.run_async(module_name, kwargs, job["id"])
+            if self.pool.emits_events:
+                await self._wait_drained(job["id"])
+            job["status"] = DONE
+            job["message"] = f"Procesare {job['label']} finalizată!"
+        except Exception as e:
+            job["status"] = ERROR
+            job["error"] = str(e)
+        finally:
+            job["finished"] = time.time()
+            self._active.pop(job["session_id"], None)
+            self._record(job["id"], {"type": STATUS, "status": job["status"],
+                                     "message": job["message"], "error": job["error"]})
+            self._drained.pop(job["id"], None)
+            self._trim_history()
+            if self.on_finished is not None:
+                self.on_finished(job)
+
+    async def _wait_drained(self, job_id):
+        """
+        Rezultatul job-ului și evenimentele de progres vin pe canale diferite:
+        așteptăm (cel mult EVENTS_DRAIN_TIMEOUT secunde) ca toate evenimentele
+        worker-ului să fie primite, înainte de a marca job-ul terminat.
+        """
+        try:
+            await asyncio.wait_for(self._drained[job_id].wait(), EVENTS_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+
+    def _on_worker_event(self, event):
+        """
+        Apelată din thread-ul care citește coada de evenimente a pool-ului.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._record_worker_event, event)
+
+    def _record_worker_event(self, event):
+        job_id = event.pop("job_id")
+        if event["type"] == progress.END:
+            drained = self._drained.get(job_id)
+            if drained is not None:
+                drained.set()
+            return
+        self._record(job_id, event)
+
+    def _record(self, job_id, event):
+        """
+        Adaugă un eveniment la job (cu număr de ordine 'id') și trezește abonații.
+        """
+        events = self._events.get(job_id)
+        if events is None:
+            return  # job scos deja din istoric
+        event.setdefault("time", time.time())
+        event["id"] = len(events)
+        events.append(event)
+        changed, self._changed[job_id] = self._changed[job_id], asyncio.Event()
+        changed.set()
+
+    async def events(self, job_id, start=0, keepalive=None):
+        """
+        Produce evenimentele job-ului începând cu numărul de ordine 'start', pe
+        măsură ce apar, până la terminarea job-ului. Dacă nu apare nimic timp de
+        'keepalive' secunde, produce None (pentru mesaje de menținere a conexiunii).
+        """
+        while True:
+            events = self._events.get(job_id, [])
+            while start < len(events):
+                yield events[start]
+                start += 1
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] not in ACTIVE_STATES:
+                return
+            try:
+                await asyncio.wait_for(self._changed[job_id].wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+    def event_count(self, job_id):
+        return len(self._events.get(job_id, []))
+
+    def _trim_history(self):
+        """
+        Păstrează cel mult JOB_HISTORY job-uri terminate (cele mai vechi ies primele).
+        """
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] not in ACTIVE_STATES]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+            self._events.pop(job_id, None)
+            self._changed.pop(job_id, None)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def latest(self, session_id):
+        """
+        Cel mai recent job al sesiunii (activ sau terminat), sau None.
+        """
+        for job in reversed(self._jobs.values()):
+            if job["session_id"] == session_id:
+                return job
+        return None
+
+    def position(self, job):
+        """
+        Poziția job-ului în coada de așteptare (1 = următorul), sau 0 dacă nu așteaptă.
+        """
+        if job["status"] != QUEUED:
+            return 0
+        queued = [j["id"] for j in self._jobs.values() if j["status"] == QUEUED]
+        return queued.index(job["id"]) + 1
+
+    def public(self, job):
+        """
+        Reprezentarea JSON a unui job (fără session_id).
+        """
+        data = {key: value for key, value in job.items() if key != "session_id"}
+        data["position"] = self.position(job)
+        return data
+
+    def stats(self):
+        statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_limit": self.queue_limit,
+            "queued": statuses.count(QUEUED),
+            "running": statuses.count(RUNNING),
+        }
@@ -1,15 +1,36 @@
-from fastapi import FastAPI, UploadFile, Form, BackgroundTasks, File, Request
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi import FastAPI, BackgroundTasks, Request
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from typing import List
 from pathlib import Path
-import shutil
+import asyncio
+import html
+import json
 import os
-import zipfile
-import subprocess
+import re
+import sys
 from datetime import datetime
 import time  # Pentru a ține evidența duratei sesiunii
 
+from app.combined_workbook import combined_name
+from app.csv_reader import SIDECAR_SUFFIX
+from app.job_queue import JOB_BACKEND, JobQueue, QueueJobManager
+from app.jobs import ACTIVE_STATES, DONE, ERROR, JobManager, QueueFull
+from app.pairing import pairing_errors
+from app.parallel import PARALLEL_FANOUT
+from app.pipelines import get_pipeline
+from app.process_log import read_log
+from app.result_cache import RESULT_CACHE
+from app.session_janitor import SessionJanitor
+from app.static_pages import StaticPages
+from app.session_store import SESSION_TTL, create_session_store
+from app.uploads import (
+    UPLOAD_MAX_FILE_BYTES, UPLOAD_MAX_FILE_MB, UPLOAD_MAX_REQUEST_BYTES, UPLOAD_MAX_REQUEST_MB,
+    InvalidUpload, UploadTooLarge, detach_folder, extract_zip, index_csv, limit_request_body, remove_folders,
+    safe_filename, save_upload,
+)
+from app.worker_pool import WorkerPool
+from app.zip_stream import archive_key, stream_zip
+
 app = FastAPI()
 
 # Servește fișierele HTML
@@ -31,75 +52,141 @@ TEMPLATE_FOLDER.mkdir(parents=True, exist_ok=True)
 SESSION_FOLDER.mkdir(parents=True, exist_ok=True)
 
 BLOCKED_BOTS = ["Googlebot", "Bingbot", "Slurp", "DuckDuckBot", "Baiduspider", "YandexBot"]
+# Compilat o singură dată: un singur regex, fără lower() pe fiecare nume la fiecare cerere
+BOT_PATTERN = re.compile("|".join(re.escape(bot) for bot in BLOCKED_BOTS), re.IGNORECASE)
+# Rutele care nu folosesc sesiunea (fără cookie, fără acces la store)
+SESSIONLESS_PREFIXES = ("/static/", "/favicon.ico")
 
 # -----------------------------------------------------------------------------------
 # Nou: gestionare sesiuni per utilizator cu durată de 8 ore
 # -----------------------------------------------------------------------------------
-SESSIONS = {}  # Dicționar pentru a memora momentul de creare al sesiunii {session_id: timestamp}
-USER_SELECTED_FILE_TYPE = {}  # Dicționar pentru a asocia session_id -> tipul fișierului (în loc de variabila globală)
+# Momentul creării și tipul de fișier selectat, per session_id (în memorie sau SQLite, vezi app/session_store.py)
+SESSIONS = create_session_store()
+
+# -----------------------------------------------------------------------------------
+# Pool de procese preîncălzite pentru procesare (în loc de subprocess.run la fiecare cerere)
+# -----------------------------------------------------------------------------------
+WORKER_POOL = WorkerPool()
+
+
+def server_workers():
+    """
+    Numărul de procese ale serverului web: WEB_CONCURRENCY (folosit de uvicorn/gunicorn
+    ca valoare implicită pentru --workers) sau opțiunea --workers din linia de comandă.
+    """
+    args = sys.argv[1:]
+    for index, arg in enumerate(args):
+        if arg.startswith("--workers="):
+            return int(arg.split("=", 1)[1])
+        if arg == "--workers" and index + 1 < len(args):
+            return int(args[index + 1])
+    return int(os.getenv("WEB_CONCURRENCY", "1"))
+
+
+# JOB_BACKEND=queue: job-urile merg în coada durabilă și sunt rulate de `python -m app.worker`
+# (vezi app/job_queue.py); pool-ul de procese al serverului nu mai este pornit
+if JOB_BACKEND == "queue":
+    JOBS = QueueJobManager(JobQueue())
+elif JOB_BACKEND == "local":
+    # Job-urile (și evenimentele lor) sunt în memoria procesului: /jobs/{id} ar răspunde 404
+    # când cererea ajunge la alt proces uvicorn decât cel care a primit /process/
+    if server_workers() > 1:
+        raise RuntimeError("JOB_BACKEND=local funcționează cu un singur proces de server; "
+                           "pentru uvicorn --workers N (WEB_CONCURRENCY) folosiți JOB_BACKEND=queue.")
+    JOBS = JobManager(WORKER_POOL)
+else:
+    raise ValueError(f"JOB_BACKEND necunoscut: {JOB_BACKEND!r} (local / queue)")
+# Paginile HTML servite din memorie, comprimate, cu ETag (vezi app/static_pages.py)
+STATIC_PAGES = StaticPages("static", ["index.html", "main.html", "instructions.html", "sidebar.html"])
+# Curățarea periodică a folderelor de sesiune + contoarele pentru /user_count
+JANITOR = SessionJanitor(SESSION_FOLDER, SESSIONS, SESSION_TTL, is_busy=JOBS.is_active)
+if JOB_BACKEND == "local":
+    # Fișierele generate intră în contoare la terminarea job-ului; cu JOB_BACKEND=queue
+    # (worker-i pe alte procese/mașini) ele sunt numărate la următoarea parcurgere a JANITOR
+    JOBS.on_finished = lambda job: JANITOR.track(
+        job["session_id"], SESSION_FOLDER / job["session_id"] / "output",
+        SESSION_FOLDER / job["session_id"] / "process_log.txt",
+    )
+# La câte secunde fără evenimente trimitem un comentariu SSE (ține conexiunea deschisă prin proxy-uri)
+SSE_KEEPALIVE = 15
+
+
+@app.on_event("startup")
+def start_worker_pool():
+    STATIC_PAGES.load()
+    if JOB_BACKEND == "local":
+        WORKER_POOL.start()
+    JANITOR.start()
+
+
+@app.on_event("shutdown")
+def stop_worker_pool():
+    JANITOR.stop()
+    WORKER_POOL.shutdown()
 
 @app.middleware("http")
 async def block_bots_and_add_session(request: Request, call_next):
     """
     Middleware pentru:
      1. Blocare boți (codul original).
-     2. Crearea / validarea unui session_id pentru fiecare utilizator (durată 8 ore).
+     2. Crearea / validarea unui session_id pentru fiecare utilizator (durată SESSION_TTL_HOURS, implicit 8 ore).
+    Fișierele statice (/static/) nu au nevoie de sesiune: pentru ele se face doar
+    verificarea de boți. Cookie-ul este trimis doar când sesiunea este nouă; el
+    expiră odată cu sesiunea de pe server (max_age = durata rămasă a sesiunii).
     """
-    user_agent = request.headers.get("user-agent", "").lower()
-    if any(bot.lower() in user_agent for bot in BLOCKED_BOTS):
+    if BOT_PATTERN.search(request.headers.get("user-agent", "")):
         return JSONResponse(status_code=403, content={"message": "Access Forbidden for Bots"})
-    
+
+    if request.scope["path"].startswith(SESSIONLESS_PREFIXES):
+        return await call_next(request)
+
     # ----------------------------------------------------------------
     # Partea de Sesiune
     # ----------------------------------------------------------------
     session_id_cookie = request.cookies.get("session_id")
     current_time = time.time()
+    session = SESSIONS.get(session_id_cookie, current_time) if session_id_cookie else None
+
+    if session is not None:
+        # Sesiunea cookie-ului încă e validă; cookie-ul existent rămâne valabil
+        request.state.session_id = session_id_cookie
+        return await call_next(request)
 
     # Preiau IP-ul clientului (dacă e disponibil)
     client_ip = "unknown_ip"
     if request.client:
         client_ip = request.client.host  # ex: 127.0.0.1
 
-    # Data/ora curentă în format "YYYYmmdd_HHMMSS"
-    now_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-
     # ----------------------------------------------------------------
     # Noua variantă: session_id = <client_ip>_<YYYYmmdd_HHMMSS>
     # ----------------------------------------------------------------
-    # Dacă cookie-ul "session_id" nu există sau nu se află în SESSIONS,
+    # Dacă cookie-ul "session_id" nu mai corespunde unei sesiuni valide,
     # generăm un nou session_id bazat pe IP și timestamp.
     # (Ex: 192.168.1.10_20250119_160452)
-    if not session_id_cookie or session_id_cookie not in SESSIONS:
-        session_id = client_ip
-        SESSIONS[session_id] = current_time
+    if session_id_cookie:
+        # Sesiunea cookie-ului a expirat (și a fost ștearsă din store) -> generăm una nouă
+        now_str = datetime.fromtimestamp(current_time).strftime("%Y%m%d_%H%M%S")
+        session_id = f"{client_ip}_{now_str}"
     else:
-        # Avem cookie, deci extragem creation_time
-        creation_time = SESSIONS[session_id_cookie]
-        if (current_time - creation_time) > 8 * 3600:
-            # Sesiunea cookie-ului a expirat -> generăm una nouă
-            del SESSIONS[session_id_cookie]
-            session_id = f"{client_ip}_{now_str}"
-            SESSIONS[session_id] = current_time
-        else:
-            # Sesiunea cookie-ului încă e validă
-            session_id = session_id_cookie
+        session_id = client_ip
+    session = SESSIONS.create(session_id, current_time)
 
     # Transmitem session_id mai departe în request.state
     request.state.session_id = session_id
 
     response = await call_next(request)
-    # Setăm cookie-ul cu session_id; max_age = 8 ore
+    # Setăm cookie-ul cu session_id; expiră odată cu sesiunea
     response.set_cookie(
         key="session_id",
         value=session_id,
-        max_age=8 * 3600, 
+        max_age=max(int(session["created"] + SESSION_TTL - current_time), 0),
         httponly=True
     )
     return response
 
 @app.get("/", response_class=HTMLResponse)
-def serve_index():
-    return FileResponse("static/index.html")
+def serve_index(request: Request):
+    return STATIC_PAGES.response("index.html", request)
 
 # def home():
 #     index_path = Path(__file__).parent / "templates" / "index.html"
@@ -108,67 +195,129 @@ def serve_index():
 #     return "<h1>Eroare: Fișierul index.html lipsește.</h1>"
 
 @app.get("/main", response_class=HTMLResponse)
-def serve_main():
-    return FileResponse("static/main.html")
+def serve_main(request: Request):
+    return STATIC_PAGES.response("main.html", request)
 
 @app.get("/instructions", response_class=HTMLResponse)
-def serve_instructions():
-    return FileResponse("static/instructions.html")
+def serve_instructions(request: Request):
+    return STATIC_PAGES.response("instructions.html", request)
 
 @app.get("/sidebar", response_class=HTMLResponse)
-def serve_main():
-     return FileResponse("static/sidebar.html")
+def serve_sidebar(request: Request):
+    return STATIC_PAGES.response("sidebar.html", request)
 
 
 @app.post("/upload/")
-def upload_csv(
-    request: Request,
-    files: List[UploadFile] = File(...),
-    file_type: str = Form(...)
-):
+async def upload_csv(request: Request, background_tasks: BackgroundTasks):
     """
     Salvează fișierele CSV într-un folder dedicat sesiunii curente.
-    - Dacă fișierul există deja, îl rescrie și va fi raportat ca 'overwritten'.
-    - Dacă fișierul NU există, va fi raportat ca 'newly_created'.
+    - Fișierele sunt copiate în flux, cu limită per fișier și per încărcare (413).
+    - Fișierele încărcate anterior sunt mutate deoparte și șterse în fundal.
+    - În loc de CSV-uri se poate trimite o arhivă .zip; CSV-urile din ea sunt extrase în flux.
+    - Denumirile sunt verificate (perechi 1M/3M, MM/YY) și problemele afișate imediat.
+    Formularul conține câmpurile 'files' (unul sau mai multe fișiere) și 'file_type'.
     """
     # global selected_file_type  # Comentăm, vom folosi un dicționar bazat pe session_id
     # selected_file_type = file_type
-    
+
+    # Refuzăm din start încărcările declarate prea mari, înainte de a citi corpul cererii
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > UPLOAD_MAX_REQUEST_BYTES:
+        return HTMLResponse(
+            content=f"<p><strong>Eroare:</strong> Încărcarea depășește {UPLOAD_MAX_REQUEST_MB} MB.</p>",
+            status_code=413
+        )
+
     session_id = request.state.session_id
-    USER_SELECTED_FILE_TYPE[session_id] = file_type  # Stocăm tipul în dict, per session_id
+    if JOBS.is_active(session_id):
+        return HTMLResponse(
+            content="<p><strong>Eroare:</strong> Procesarea anterioară nu s-a terminat încă.</p>",
+            status_code=409
+        )
+
+    # Limita se aplică și în timpul citirii: Content-Length poate lipsi (transfer „chunked”)
+    # sau poate fi fals, iar parserul de formular stochează tot corpul înainte de save_upload
+    limit_message = f"Încărcarea depășește {UPLOAD_MAX_REQUEST_MB} MB."
+    receive = limit_request_body(request.receive, UPLOAD_MAX_REQUEST_BYTES, limit_message)
+    try:
+        form = await Request(request.scope, receive).form()
+    except UploadTooLarge as e:
+        return HTMLResponse(content=f"<p><strong>Eroare:</strong> {e}</p>", status_code=413)
+    files = [item for item in form.getlist("files") if hasattr(item, "read")]
+    file_type = form.get("file_type")
+    if not files or not isinstance(file_type, str):
+        return HTMLResponse(
+            content="<p><strong>Eroare:</strong> Lipsesc fișierele sau tipul fișierului.</p>",
+            status_code=422
+        )
+    SESSIONS.set_file_type(session_id, file_type)  # Stocăm tipul per session_id
 
     # Creăm foldere separate pentru această sesiune
     session_folder = SESSION_FOLDER / session_id
     session_csv_folder = session_folder / "csv"
     session_output_folder = session_folder / "output"
     session_folder.mkdir(parents=True, exist_ok=True)
-    session_csv_folder.mkdir(parents=True, exist_ok=True)
-    session_output_folder.mkdir(parents=True, exist_ok=True)
-
-    # 🔹 Ștergem toate fișierele din folderul `csv/`
-    for existing_file in session_output_folder.iterdir():  # Verifică toate fișierele și subfolderele
-        if existing_file.is_file():  # Asigură că ștergem doar fișiere, nu subfoldere
-            existing_file.unlink()  # Șterge fișierul
-    # 🔹 Ștergem toate fișierele din folderul `csv/`
-    for existing_file in session_csv_folder.iterdir():  # Verifică toate fișierele și subfolderele
-        if existing_file.is_file():  # Asigură că ștergem doar fișiere, nu subfoldere
-            existing_file.unlink()  # Șterge fișierul
+
+    # 🔹 Golim folderele `csv/` și `output/`: le mutăm deoparte și le ștergem în fundal
+    old_folders = [detach_folder(session_output_folder), detach_folder(session_csv_folder)]
+    background_tasks.add_task(remove_folders, old_folders)
 
     new_files = []
-    
-    for file in files:
-        file_path = session_csv_folder / file.filename
-        new_files.append(file.filename)
-        
-        # Copiem conținutul, suprascriind dacă fișierul există
-        with file_path.open("wb") as f:
-            shutil.copyfileobj(file.file, f)
+    skipped = []
+    remaining = UPLOAD_MAX_REQUEST_BYTES
+    try:
+        for file in files:
+            filename = safe_filename(file.filename)
+            if not filename:
+                continue
+            if filename.lower().endswith(".zip"):
+                # Arhivă cu CSV-uri: o extragem în flux, cu limite anti „zip bomb”
+                if (file.size or 0) > remaining:
+                    raise UploadTooLarge(limit_message)
+                remaining -= file.size or 0
+                await file.seek(0)
+                infos, ignored = await asyncio.to_thread(extract_zip, file.file, session_csv_folder)
+                skipped += [f"{filename}: {name}" for name in ignored]
+                for info in infos:
+                    new_files.append(await index_csv(session_csv_folder / info["name"], info))
+                continue
+            if remaining < UPLOAD_MAX_FILE_BYTES:
+                max_bytes, limit = remaining, limit_message
+            else:
+                max_bytes, limit = UPLOAD_MAX_FILE_BYTES, f"Fișierul {filename} depășește {UPLOAD_MAX_FILE_MB} MB."
+            # Copiem conținutul, suprascriind dacă fișierul există
+            info = await save_upload(file, session_csv_folder / filename, max_bytes, limit)
+            remaining -= info["bytes"]
+            new_files.append(await index_csv(session_csv_folder / filename, info))
+    except (UploadTooLarge, InvalidUpload) as e:
+        # Încărcarea este respinsă complet: nu păstrăm fișierele copiate deja
+        background_tasks.add_task(remove_folders, [detach_folder(session_csv_folder)])
+        status_code = 413 if isinstance(e, UploadTooLarge) else 400
+        return HTMLResponse(content=f"<p><strong>Eroare:</strong> {e}</p>", status_code=status_code)
+    finally:
+        await form.close()
+        # Contoarele de utilizare: CSV-urile noi înlocuiesc folderele mutate deoparte
+        JANITOR.track(session_id, session_csv_folder, session_output_folder)
 
     if new_files:
-        new_files_html = "<ul>" + "".join(f"<li>{f}</li>" for f in new_files) + "</ul>"
+        new_files_html = "<ul>" + "".join(
+            f"<li>{f['name']} (<em>format nerecunoscut: {f['error']}</em>)</li>" if "error" in f
+            else f"<li>{f['name']} ({f['rows']} rânduri)</li>"
+            for f in new_files
+        ) + "</ul>"
     else:
         new_files_html = "<p><em>Niciun fișier nou.</em></p>"
 
+    # Verificăm denumirile (perechi 1M/3M, MM/YY) încă de acum, nu abia la procesare
+    warnings = pairing_errors(get_pipeline(file_type)["pairing"], [f["name"] for f in new_files])
+    warnings += [f"Ignorat (nu este fișier CSV): {name}" for name in skipped]
+    if warnings:
+        new_files_html += (
+            "<p><strong>Atenție:</strong></p><ul class='text-red-600'>"
+            + "".join(f"<li>{warning}</li>" for warning in warnings)
+            + "</ul>"
+        )
+
     html_response = f"""
     <p><strong>Fișiere încărcate cu succes pentru sesiunea curentă:</strong></p>
     {new_files_html}
@@ -189,72 +338,150 @@ def upload_csv(
 
 
 @app.post("/process/")
-def process_files(request: Request):
+async def process_files(request: Request):
     """
-    Aici apelăm scriptul specific în funcție de tipul selectat (PPI, CPI etc.),
-    dar acum tipul este luat din dicționar, pe baza session_id.
+    Pune în coadă procesarea pentru tipul selectat (PPI, CPI etc.), tipul fiind
+    luat din store-ul de sesiuni, pe baza session_id. Răspunde imediat cu ID-ul job-ului;
+    starea se urmărește prin /jobs/{job_id}.
+    Cu workbook=1 (formular sau query), rezultatul este un singur fișier XLSX cu
+    o foaie per simbol, în loc de câte un fișier per simbol.
+    Cu values_only=1, coloanele cu formule conțin valorile calculate (vezi app/derived_columns.py).
+    Cu events=1, interfața urmărește job-ul prin /process/events, iar fragmentul de stare nu mai
+    interoghează /jobs/{job_id} la fiecare secundă.
     """
     session_id = request.state.session_id
     # if not selected_file_type:
     #     return JSONResponse(content={"error": "Nu a fost selectat niciun tip anterior."}, status_code=400})
 
-    file_type = USER_SELECTED_FILE_TYPE.get(session_id)
+    session = SESSIONS.get(session_id)
+    file_type = session["file_type"] if session else None
     if not file_type:
         return JSONResponse(
             content={"error": "Nu a fost selectat niciun tip anterior pentru această sesiune."},
             status_code=400
         )
-    
+
+    pipeline = get_pipeline(file_type)
+    form = await request.form()
+    combined = "1" in (form.get("workbook"), request.query_params.get("workbook"))
+    values_only = "1" in (form.get("values_only"), request.query_params.get("values_only"))
+    follows_events = form.get("events") == "1"
     try:
-        if file_type == "PPI":
-            # Rulăm process_script.py adica Full PC Procent
-            subprocess.run([
-                "python", "app/process_script.py",
-                "--csv-folder", f"sessions/{session_id}/csv",
-                "--template-path", "template/template.xlsx",
-                "--output-folder", f"sessions/{session_id}/output",
-                "--log-file", f"sessions/{session_id}/process_log.txt"
-            ], check=True)
-            msg = f"Procesare PPI finalizată!"
-        if file_type == "PMIPCNOMINAL":
-            # Rulăm pmipcnominal.py (când îl vei crea)
-            subprocess.run(["python", "app/pmipcnominal.py",
-                "--csv-folder", f"sessions/{session_id}/csv",
-                "--template-path", "template/pmipcnominal.xlsx",
-                "--output-folder", f"sessions/{session_id}/output",
-                "--log-file", f"sessions/{session_id}/process_log.txt"], check=True)
-            msg = f"Procesare PMI PC Valoare Nominala finalizată!"
-
-        elif file_type == "GDPPCY":
-            # Rulăm gdppcy.py (când îl vei crea)
-            subprocess.run(["python", "app/gdppcy.py",
-                "--csv-folder", f"sessions/{session_id}/csv",
-                "--template-path", "template/GDPPCy.xlsx",
-                "--output-folder", f"sessions/{session_id}/output",
-                "--log-file", f"sessions/{session_id}/process_log.txt"], check=True)
-            msg = f"Procesare GDPPCY finalizată!"
-
-        elif file_type == "REALGDPQY":
-            # Rulăm realgdpqy.py (când îl vei crea)
-            subprocess.run(["python", "app/realgdpqy.py",
-                "--csv-folder", f"sessions/{session_id}/csv",
-                "--template-path", "template/realGDPQY.xlsx",
-                "--output-folder", f"sessions/{session_id}/output",
-                "--log-file", f"sessions/{session_id}/process_log.txt"], check=True)
-            msg = f"Procesare REALGDPQY finalizată!"
-
-        else:
-            # Rulăm momyoy.py (exemplu)
-            subprocess.run(["python", "app/momyoy.py",
-                "--csv-folder", f"sessions/{session_id}/csv",
-                "--template-path", "template/RSMoMYoY.xlsx",
-                "--output-folder", f"sessions/{session_id}/output",
-                "--log-file", f"sessions/{session_id}/process_log.txt"], check=True)
-            msg = f"Procesare MOM YOY finalizată!"
-        
-        return HTMLResponse(content=msg)
-    except subprocess.CalledProcessError as e:
-        return HTMLResponse(content=f"<p><strong>ERROR:</strong> {str(e)}</p>", status_code=500)
+        job = JOBS.submit(session_id, pipeline["module"], {
+            "csv_folder": f"sessions/{session_id}/csv",
+            "template_path": str(pipeline["template"]),
+            "output_folder": f"sessions/{session_id}/output",
+            "log_file": f"sessions/{session_id}/process_log.txt",
+            "parallel": PARALLEL_FANOUT,
+            "engine": pipeline["engine"],
+            "workbook": combined_name(pipeline["label"]) if combined else None,
+            "values_only": values_only,
+        }, pipeline["label"])
+    except QueueFull as e:
+        return HTMLResponse(
+            content=f"<p><strong>ERROR:</strong> {str(e)}</p>",
+            status_code=429,
+            headers={"Retry-After": "5"},
+        )
+
+    if request.headers.get("hx-request"):
+        response = job_status_html(job, poll=not follows_events)
+    else:
+        response = JSONResponse(content=JOBS.public(job), status_code=202)
+    # Interfața deschide cu acest ID fluxul de progres /process/events
+    response.headers["X-Job-Id"] = job["id"]
+    return response
+
+
+def job_status_html(job, poll=True):
+    """
+    Fragment HTML pentru htmx: cât timp job-ul e activ, fragmentul se reîncarcă
+    singur la fiecare secundă; la final declanșează evenimentul 'processingDone'.
+    poll=False: browserul primește starea prin /process/events (evenimentul 'status',
+    vezi watchJobEvents în static/main.html), deci fragmentul nu se mai reîncarcă.
+    """
+    if job["status"] == DONE:
+        return HTMLResponse(content=job["message"], headers={"HX-Trigger": "processingDone"})
+    if job["status"] == ERROR:
+        return HTMLResponse(
+            content=f"<p><strong>ERROR:</strong> {job['error']}</p>",
+            headers={"HX-Trigger": "processingDone"},
+        )
+
+    position = JOBS.position(job)
+    text = f"În așteptare (poziția {position})..." if position else "Se procesează..."
+    if not poll:
+        return HTMLResponse(content=f"<div>{text}</div>")
+    return HTMLResponse(content=(
+        f'<div hx-get="/jobs/{job["id"]}" hx-trigger="load delay:1s" hx-swap="outerHTML">'
+        f"{text}</div>"
+    ))
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request):
+    """
+    Starea unui job de procesare (JSON sau fragment HTML pentru htmx).
+    Fiecare sesiune își vede doar propriile job-uri.
+    """
+    job = JOBS.get(job_id)
+    if job is None or job["session_id"] != request.state.session_id:
+        return JSONResponse(content={"error": f"Job-ul {job_id} nu există."}, status_code=404)
+    if request.headers.get("hx-request"):
+        return job_status_html(job)
+    return JSONResponse(content=JOBS.public(job))
+
+
+@app.get("/process/events")
+async def process_events(request: Request, job_id: str = None):
+    """
+    Progresul unui job (implicit cel mai recent job al sesiunii) ca server-sent events:
+    câte un eveniment pentru fiecare simbol ('started', 'written', 'skipped', 'error',
+    cu durata în secunde) și pentru fiecare schimbare de stare a job-ului ('status').
+    Fluxul se închide după ultima stare (done / error). La reconectare, browserul
+    trimite Last-Event-ID și primește doar evenimentele noi.
+    """
+    session_id = request.state.session_id
+    job = JOBS.get(job_id) if job_id else JOBS.latest(session_id)
+    if job is None or job["session_id"] != session_id:
+        return JSONResponse(content={"error": "Nu există niciun job de procesare."}, status_code=404)
+
+    last_event_id = request.headers.get("last-event-id", "")
+    start = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+    if job["status"] not in ACTIVE_STATES and start >= JOBS.event_count(job["id"]):
+        # Nimic de trimis; 204 oprește reconectarea automată a EventSource
+        return Response(status_code=204)
+
+    return StreamingResponse(
+        sse_stream(job["id"], start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def sse_stream(job_id, start):
+    """
+    Evenimentele job-ului în formatul server-sent events.
+    """
+    async for event in JOBS.events(job_id, start, keepalive=SSE_KEEPALIVE):
+        if event is None:
+            yield ": keepalive\n\n"
+            continue
+        data = json.dumps(event, ensure_ascii=False)
+        yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+@app.get("/stats/")
+def get_stats():
+    """
+    Statistici de procesare (hit/miss pentru cache-ul de template-uri și cel de
+    rezultate, job-uri în coadă), în format JSON.
+    """
+    stats = WORKER_POOL.stats()
+    stats["result_cache"].update(RESULT_CACHE.usage())
+    stats["jobs"] = JOBS.stats()
+    stats["sessions"] = JANITOR.counters()
+    return JSONResponse(content=stats)
 
 
 @app.get("/download/{filename}")
@@ -275,17 +502,21 @@ def download_file(filename: str, request: Request):
 @app.get("/download_all/")
 def download_all(background_tasks: BackgroundTasks, request: Request):
     """
-    Arhivează și permite descărcarea tuturor fișierelor XLSX pentru sesiunea curentă.
+    Trimite în flux (streaming) o arhivă cu toate fișierele XLSX ale sesiunii curente.
+    Dacă fișierele nu s-au schimbat de la ultima descărcare, se trimite arhiva salvată atunci.
     """
     session_id = request.state.session_id
-    session_output_folder = SESSION_FOLDER / session_id / "output"
-    archive_path = session_output_folder / "output.zip"
+    session_folder = SESSION_FOLDER / session_id
+    session_output_folder = session_folder / "output"
+    files = sorted(session_output_folder.glob("*.xlsx"))
 
-    with zipfile.ZipFile(archive_path, "w") as zipf:
-        for file in session_output_folder.glob("*.xlsx"):
-            zipf.write(file, file.name)
+    archive_path = session_folder / f"output-{archive_key(files)}.zip"
+    # Păstrăm doar arhiva pentru setul curent de fișiere
+    for old_archive in session_folder.glob("output-*.zip"):
+        if old_archive != archive_path:
+            old_archive.unlink(missing_ok=True)
 
-    response = FileResponse(archive_path, filename="output.zip")
+    response = StreamingResponse(stream_zip(files, archive_path), media_type="application/zip")
     response.headers["Content-Disposition"] = "attachment; filename=output.zip"
 
     # # Șterge fișierele după descărcare
@@ -301,18 +532,34 @@ def download_all(background_tasks: BackgroundTasks, request: Request):
 
 
 @app.get("/log", response_class=HTMLResponse)
-def get_log(request: Request):
+def get_log(request: Request, since: int = 0):
     """
-    Returnează conținutul fișierului log *din sesiunea curentă*.
+    Returnează log-ul de procesare *din sesiunea curentă*: doar intrările scrise
+    după offset-ul 'since' (în octeți). Offset-ul pentru cererea următoare este
+    trimis în antetul X-Log-Offset. Cu 'Accept: application/json' răspunsul
+    este JSON ({"entries", "offset", "reset"}), altfel fragment HTML.
     """
     session_id = request.state.session_id
     session_log_file = (SESSION_FOLDER / session_id / "process_log.txt").resolve()
-
-    if session_log_file.exists():
-        with session_log_file.open("r", encoding="utf-8") as f:
-            log_content = f.read()
-        return HTMLResponse(content=f"<div>{log_content}</div>", status_code=200)
-    return HTMLResponse(content=f"<pre><em>Nu există erori în log pentru sesiunea curentă.</em></pre>", status_code=200)
+    entries, offset, reset = read_log(session_log_file, max(since, 0))
+    headers = {"X-Log-Offset": str(offset)}
+
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse(content={"entries": entries, "offset": offset, "reset": reset}, headers=headers)
+
+    # Prima citire (sau după rotirea log-ului) înlocuiește conținutul; restul se adaugă la final
+    if since <= 0 or reset:
+        headers["HX-Reswap"] = "innerHTML"
+        if not entries:
+            return HTMLResponse(
+                content="<em>Nu există erori în log pentru sesiunea curentă.</em>\n", headers=headers
+            )
+    lines = "".join(
+        f"[{entry['time']}] {html.escape(entry['message'], quote=False)}\n" if entry.get("time")
+        else f"{html.escape(entry['message'], quote=False)}\n"
+        for entry in entries
+    )
+    return HTMLResponse(content=lines, headers=headers)
 
 
 
@@ -348,7 +595,8 @@ def delete_files(request: Request):
         for file in session_csv_folder.glob("*"):
             try:
                 file.unlink()
-                deleted_files.append(f"{session_id}/csv/{file.name}")
+                if not file.name.endswith(SIDECAR_SUFFIX):  # sidecar-ele nu sunt fișiere ale utilizatorului
+                    deleted_files.append(f"{session_id}/csv/{file.name}")
             except Exception as e:
                 return HTMLResponse(
                     content=f"<p><strong>Eroare:</strong> Nu s-a putut șterge {file.name}: {e}</p>",
@@ -366,6 +614,8 @@ def delete_files(request: Request):
                     status_code=500
                 )
 
+    JANITOR.track(session_id, session_csv_folder, session_output_folder)
+
     # Construim mesajul HTML
     if deleted_files:
         deleted_files_html = "<ul class='list-disc pl-5'>" + "".join(f"<li>{file}</li>" for file in deleted_files) + "</ul>"
@@ -394,28 +644,15 @@ def check_session(request: Request):
     Verifică dacă sesiunea curentă este activă.
     """
     session_id = request.state.session_id
-    if session_id in SESSIONS:
+    if SESSIONS.get(session_id) is not None:
         return JSONResponse(content={"active": True})
     return JSONResponse(content={"active": False})
 
-def count_user_folders(session_folder_path):
-    try:
-        if not os.path.isdir(session_folder_path):
-            return 0
-        
-        # Folosim pathlib pentru a verifica subfolderele
-        subfolders = [f for f in session_folder_path.iterdir() if f.is_dir()]
-        return len(subfolders)
-    except Exception as e:
-        print(f"A apărut o eroare: {e}")
-        return 0
-
-
 @app.get("/user_count", response_class=HTMLResponse)
 def get_user_count(request: Request):
     """
-    Returnează numărul de utilizatori (subfoldere) din folderul 'sessions'.
+    Returnează numărul de utilizatori (subfoldere) din folderul 'sessions',
+    din contoarele ținute de JANITOR (fără parcurgerea folderului).
     """
-    folder_path = SESSION_FOLDER
-    num_users = count_user_folders(folder_path)
+    num_users = JANITOR.counters()["sessions"]
     return HTMLResponse(content=f"<h2>{num_users}</h2>")
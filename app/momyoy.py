@@ -1,20 +1,67 @@
 import os
-import re
-import pandas as pd
-from openpyxl import load_workbook
-from datetime import datetime
 import argparse
+import sys
 
-def log_processing_info(log_file, message):
-    """
-    Scrie în fișierul 'log_file' un mesaj, cu data/ora curentă.
-    Creează fișierul dacă nu există.
-    """
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"[{now}] {message}\n")
+if __package__ in (None, ""):
+    # Rulat direct (python app/<script>.py): facem importabil pachetul `app`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.combined_workbook import combine_outputs, remove_combined_outputs
+from app.csv_reader import ChunkedTvCsv, read_tv_csv
+from app.derived_columns import Asinh, Correl, Lead, Mean, Stdev, ZScore, fill_patch, fill_sheet
+from app.pairing import pair_mm_yy
+from app.process_log import ProcessLog
+from app.result_cache import RESULT_CACHE, run_cached_tasks
+from app.stage_timer import stage
+from app.template_cache import TEMPLATE_CACHE, load_template, seed_template_cache, template_max_row
+from app.xlsx_utils import TrimPlan, write_series
+from app.xml_engine import SheetPatch
+
+# Versiunea rezultatului (intră în cheia cache-ului de rezultate); se schimbă
+# la orice modificare a scriptului care schimbă fișierele XLSX generate
+PIPELINE_VERSION = "momyoy-2"
+
+# Coloanele cu formule golite pe ultimul rând de date lunare (1M)
+LUNAR_FORMULA_COLUMNS = ["I", "J", "K", "L", "M", "N"]
+
+# Coloanele cu formule golite pe ultimul rând de date trimestriale (3M)
+QUARTER_FORMULA_COLUMNS = ["W", "X", "Y", "Z", "AA", "AB"]
+
+# Coloanele golite după ultimul rând de date trimestriale (3M)
+QUARTER_COLUMNS = ["Q", "R", "S", "T", "U", "V", "W", "X", "Y", "Z", "AA", "AB"]
 
-def find_csv_pairs(csv_folder, log_file):
+# Coloanele cu formule ale template-ului, calculate cu NumPy în modul „doar valori”
+# (vezi app/derived_columns.py); verificate cu: python -m app.derived_columns MOMYOY
+DERIVED_COLUMNS = [
+    # Variația MoM (fișierul MM, coloana B)
+    ("C", 2, Asinh("B")),
+    ("D", 13, ZScore("C", length=12)),
+    ("E", 3, ZScore("C", anchor=2)),
+    ("F", 13, Stdev("C", 12)),
+    ("G", 24, ZScore("F", length=12)),
+    ("H", 14, ZScore("F", anchor=13)),
+    ("I", 2, Lead("C")),
+    ("J", 13, Correl("C", "I", 12)),
+    ("K", 24, ZScore("J", length=12)),
+    ("L", 14, ZScore("J", anchor=13)),
+    ("M", 24, Mean("D", "G", "K")),
+    ("N", 24, Mean("E", "H", "L")),
+    # Variația YoY (fișierul YY, coloana P)
+    ("Q", 2, Asinh("P")),
+    ("R", 6, ZScore("Q", length=5)),
+    ("S", 3, ZScore("Q", anchor=2)),
+    ("T", 6, Stdev("Q", 5)),
+    ("U", 10, ZScore("T", length=5)),
+    ("V", 7, ZScore("T", anchor=6)),
+    ("W", 2, Lead("Q")),
+    ("X", 6, Correl("Q", "W", 5)),
+    ("Y", 10, ZScore("X", length=5)),
+    ("Z", 7, ZScore("X", anchor=6)),
+    ("AA", 10, Mean("R", "U", "Y")),
+    ("AB", 10, Mean("S", "V", "Z")),
+]
+
+def find_csv_pairs(csv_folder, log):
     """
     Identifică perechile de fișiere CSV (MM și YY) pe baza numelui comun.
     Pentru fișierele care nu respectă modelul, scrie o eroare în log.
@@ -29,18 +76,13 @@ def find_csv_pairs(csv_folder, log_file):
       ...
     }
     """
-    csv_files = os.listdir(csv_folder)
-    csv_pairs = {}
-    
-    for file in csv_files:
-        if file.endswith(".csv"):
-            # Regex pentru a extrage numele principal și tipul indicatorului (MM sau YY)
-            match = re.match(r"(.+?)(MM|YY),\s*1M\.csv$", file)
-            if match:
-                base_name, indicator_type = match.groups()  # Extragem numele și tipul indicatorului
-                csv_pairs.setdefault(base_name, {})[indicator_type] = os.path.join(csv_folder, file)
-            else:
-                log_processing_info(log_file, f"Eroare: Fișierul '{file}' nu respectă modelul de nume pentru MOM YOY.")
+    csv_pairs, unmatched = pair_mm_yy(os.listdir(csv_folder))
+    for file in unmatched:
+        log.write(f"Eroare: Fișierul '{file}' nu respectă modelul de nume pentru MOM YOY.")
+    csv_pairs = {
+        base_name: {kind: os.path.join(csv_folder, file) for kind, file in files.items()}
+        for base_name, files in csv_pairs.items()
+    }
     
     # Filtrăm și logăm perechile incomplete
     complete_pairs = {}
@@ -48,126 +90,161 @@ def find_csv_pairs(csv_folder, log_file):
         if "MM" in files and "YY" in files:
             complete_pairs[base_name] = files
         else:
-            log_processing_info(log_file, f"Eroare: Fișierele CSV pentru '{base_name}' nu sunt complete: {files}")
+            log.write(f"Eroare: Fișierele CSV pentru '{base_name}' nu sunt complete: {files}")
     
     return complete_pairs
 
 
-def clear_last_row_formulas_lunar(ws, last_data_row):
+def process_pair(base_name, files, template_path, output_folder, engine="openpyxl", values_only=False):
     """
-    Elimină formulele din coloanele specifice pentru ultimul rând generat 
-    pentru date lunare (1M).
+    Procesează o pereche de fișiere CSV (MM și YY) și salvează fișierul XLSX rezultat.
+    engine: "openpyxl" (implicit), "xml" (rescrie direct XML-ul template-ului) sau
+    "stream" (ca "xml", cu CSV-urile citite în bucăți, pentru istoricele foarte lungi).
+    values_only: formulele sunt înlocuite cu valorile lor (vezi app/derived_columns.py).
+    Returnează mesajul pentru log (succes sau eroare).
     """
-    columns_to_clear = ["I", "J", "K", "L", "M", "N"]
-    for col in columns_to_clear:
-        ws[f"{col}{last_data_row}"].value = None
+    # Verificăm dacă avem și fișier MM, și fișier YY
+    if "MM" not in files or "YY" not in files:
+        error_msg = f"Eroare: Fișierele CSV MM / YY pentru '{base_name}' nu sunt complete sau corecte."
+        return error_msg
 
-def clear_last_row_formulas_quarter(ws, last_data_row_quarter):
-    """
-    Elimină formulele din coloanele
-    pentru ultimul rând din datele trimestriale (3M).
-    """
-    columns_to_clear = ["W", "X", "Y", "Z", "AA", "AB"]
-    for col in columns_to_clear:
-        ws[f"{col}{last_data_row_quarter}"].value = None
+    try:
+        if engine == "stream":
+            # Ca motorul "xml", dar CSV-urile sunt citite în bucăți abia la scrierea foii:
+            # memoria nu crește cu lungimea istoricului
+            if values_only:
+                raise ValueError("modul „doar valori” are nevoie de coloanele întregi, nu merge cu motorul stream")
+            with stage("read_csv"):
+                source_lunar = ChunkedTvCsv(files["MM"])
+                source_quarter = ChunkedTvCsv(files["YY"])
+            num_rows = len(source_lunar)
+            num_rows_quarter = len(source_quarter)
+            with stage("write"):
+                patch = SheetPatch(title=base_name)
+                patch.stream_series(source_lunar, date_column=1, value_column=2)
+                patch.stream_series(source_quarter, date_column=15, value_column=16, limit=num_rows)
+                patch.truncate(num_rows + 1)
+                patch.clear(QUARTER_COLUMNS, num_rows_quarter + 2)
+                patch.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+                patch.clear(QUARTER_FORMULA_COLUMNS, num_rows_quarter + 1, num_rows_quarter + 1)
+            with stage("save"):
+                patch.save(template_path, os.path.join(output_folder, f"{base_name}.xlsx"))
+            return f"✔ Fișier completat: {base_name}.xlsx"
 
-def remove_extra_rows(ws, num_rows):
-    """
-    Elimină rândurile în plus din fișierul Excel dacă sunt mai multe decât 
-    în fișierul CSV 1M (num_rows).
-    """
-    max_existing_rows = ws.max_row
-    if max_existing_rows > num_rows + 1:
-        ws.delete_rows(num_rows + 2, max_existing_rows - num_rows - 1)
+        # Citește datele din CSV-uri
+        with stage("read_csv"):
+            dates_lunar, values_lunar = read_tv_csv(files["MM"])
+            dates_quarter, values_quarter = read_tv_csv(files["YY"])
 
-def remove_extra_rows_quarter(ws, num_rows_quarter):
-    """
-    Elimină valorile în plus din coloane dacă fișierul 3M 
-    are mai puține rânduri decât template-ul.
-    """
-    columns_to_clear = [
-        "Q", "R", "S", "T", "U", "V", "W", "X", "Y", "Z", 
-        "AA", "AB"
-    ]
-    max_existing_rows = ws.max_row
-    
-    # Golim conținutul (nu ștergem rândurile) după num_rows_quarter
-    for row in range(num_rows_quarter + 2, max_existing_rows + 1):
-        for col in columns_to_clear:
-            ws[f"{col}{row}"].value = None
+        num_rows = len(dates_lunar)
+        num_rows_quarter = len(dates_quarter)
+        output_file = os.path.join(output_folder, f"{base_name}.xlsx")
+
+        # Coloanele din CSV citite de formule (pentru modul „doar valori”)
+        data = {"B": values_lunar, "P": values_quarter[:num_rows]}
+
+        if engine == "xml":
+            # Aceiași pași ca mai jos, aplicați direct pe XML-ul template-ului
+            with stage("write"):
+                patch = SheetPatch(title=base_name)
+                patch.write_series(dates_lunar, values_lunar, date_column=1, value_column=2)
+                patch.write_series(dates_quarter, values_quarter, date_column=15, value_column=16, limit=num_rows)
+                patch.truncate(num_rows + 1)
+                patch.clear(QUARTER_COLUMNS, num_rows_quarter + 2)
+                patch.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+                patch.clear(QUARTER_FORMULA_COLUMNS, num_rows_quarter + 1, num_rows_quarter + 1)
+            if values_only:
+                with stage("derived"):
+                    fill_patch(patch, template_path, DERIVED_COLUMNS, data)
+            with stage("save"):
+                patch.save(template_path, output_file)
+            return f"✔ Fișier completat: {base_name}.xlsx"
+
+        # Încarcă șablonul Excel (din cache, parsat o singură dată per proces)
+        with stage("load_template"):
+            wb = load_template(template_path)
+        ws = wb.active
+
+        # Redenumește foaia de lucru
+        ws.title = base_name
+
+        with stage("write"):
+            # Inserăm datele 1M (coloanele A și B)
+            write_series(ws, dates_lunar, values_lunar, date_column=1, value_column=2)
+
+            # Inserăm datele 3M (coloanele O și P), cel mult cât are 1M
+            write_series(ws, dates_quarter, values_quarter, date_column=15, value_column=16, limit=num_rows)
+
+        # Eliminăm rândurile și formulele în plus, într-o singură trecere (vezi xlsx_utils.TrimPlan)
+        with stage("trim"):
+            plan = TrimPlan(template_max_row(template_path))
+            plan.truncate(num_rows + 1)
+            plan.clear(QUARTER_COLUMNS, num_rows_quarter + 2)
+            plan.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+            plan.clear(QUARTER_FORMULA_COLUMNS, num_rows_quarter + 1, num_rows_quarter + 1)
+            plan.apply(ws)
+
+        # Modul „doar valori”: formulele rămase sunt înlocuite cu valorile calculate
+        if values_only:
+            with stage("derived"):
+                fill_sheet(ws, template_path, DERIVED_COLUMNS, data, num_rows + 1)
 
-def process_csv_to_xlsx(csv_folder, template_path, output_folder, log_file="process_log.txt"):
+        # Salvează fișierul XLSX rezultat
+        with stage("save"):
+            wb.save(output_file)
+
+        msg_ok = f"✔ Fișier completat: {base_name}.xlsx"
+        return msg_ok
+
+    except Exception as e:
+        # Dacă apare vreo eroare la procesare, o logăm și continuăm
+        error_msg = f"Eroare la procesarea '{base_name}': {e}"
+        return error_msg
+
+def process_csv_to_xlsx(csv_folder, template_path, output_folder, log_file="process_log.txt", parallel=False,
+                        engine="openpyxl", workbook=None, values_only=False):
     """
     Completează template.xlsx cu datele din fișierele CSV (1M și 3M),
     fără a modifica structura acestuia. 
     Scrie log-uri în 'log_file'.
+    Cu parallel=True, fișierele sunt procesate pe mai multe procese
+    (log-urile rămân în aceeași ordine).
+    engine: "openpyxl", "xml" sau "stream" (vezi app/xml_engine.py).
+    Cu 'workbook' (nume de fișier), rezultatele sunt combinate la final într-un
+    singur fișier cu o foaie per simbol (vezi app/combined_workbook.py).
+    Cu values_only=True, coloanele cu formule conțin valorile calculate, nu formulele.
     """
-    csv_pairs = find_csv_pairs(csv_folder, log_file)
-    
-    # Creăm folderul de output dacă nu există
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    
-    # Log: începem procesarea
-    log_processing_info(log_file, f"Start procesare fișiere'")
-    
-    for base_name, files in csv_pairs.items():
-        # Verificăm dacă avem și fișier MM, și fișier 3M
-        if "MM" not in files or "YY" not in files:
-            error_msg = f"Eroare: Fișierele CSV MM / YY pentru '{base_name}' nu sunt complete sau corecte."
-            print(error_msg)
-            log_processing_info(log_file, error_msg)
-            # Continuăm cu următorul 'base_name'
-            continue
-        
-        try:
-            # Încarcă șablonul Excel
-            wb = load_workbook(template_path)
-            ws = wb.active
-            
-            # Redenumește foaia de lucru
-            ws.title = base_name
-            
-            # Citește datele din CSV-uri
-            df_lunar = pd.read_csv(files["MM"])
-            df_quarter = pd.read_csv(files["YY"])
-            
-            num_rows = len(df_lunar)
-            num_rows_quarter = len(df_quarter)
-            
-            # Inserăm datele 1M (exemplu: coloanele A și B)
-            for index, row in df_lunar.iterrows():
-                ws.cell(row=index+2, column=1, value=row.iloc[0])  # data 1M
-                ws.cell(row=index+2, column=2, value=row.iloc[1])  # valoare 1M
-            
-            # Inserăm datele 3M (exemplu: coloanele R și S)
-            for index, row in df_quarter.iterrows():
-                if index < num_rows:  
-                    ws.cell(row=index+2, column=15, value=row.iloc[0])  # data 3M
-                    ws.cell(row=index+2, column=16, value=row.iloc[1])  # valoare 3M
-            
-            # Eliminăm rândurile și formulele în plus
-            remove_extra_rows(ws, num_rows)
-            remove_extra_rows_quarter(ws, num_rows_quarter)
-            clear_last_row_formulas_lunar(ws, num_rows + 1)
-            clear_last_row_formulas_quarter(ws, num_rows_quarter + 1)
-            
-            # Salvează fișierul XLSX rezultat
-            output_file = os.path.join(output_folder, f"{base_name}.xlsx")
-            wb.save(output_file)
-            
-            msg_ok = f"✔ Fișier completat: {base_name}.xlsx"
-            print(msg_ok)
-            log_processing_info(log_file, msg_ok)
-        
-        except Exception as e:
-            # Dacă apare vreo eroare la procesare, o logăm și continuăm
-            error_msg = f"Eroare la procesarea '{base_name}': {e}"
-            print(error_msg)
-            log_processing_info(log_file, error_msg)
-    
-    # Log: finalizare
-    log_processing_info(log_file, "Final procesare fișiere.")
+    with ProcessLog(log_file) as log:
+        csv_pairs = find_csv_pairs(csv_folder, log)
+
+        # Creăm folderul de output dacă nu există
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+        # Fișierul combinat al unei rulări anterioare nu mai corespunde rezultatelor noi
+        remove_combined_outputs(output_folder, workbook)
+
+        # Log: începem procesarea
+        log.write(f"Start procesare fișiere'")
+
+        tasks = [(base_name, files, template_path, output_folder, engine, values_only)
+                 for base_name, files in csv_pairs.items()]
+        # Fișierele generate deja din aceleași date și același template vin din cache
+        entries = [(RESULT_CACHE.key(PIPELINE_VERSION, engine, template_path, base_name, files,
+                                     values_only=values_only),
+                    os.path.join(output_folder, f"{base_name}.xlsx"))
+                   for base_name, files in csv_pairs.items()]
+        # În modul paralel, template-ul este parsat o singură dată aici și trimis proceselor copil
+        initargs = (TEMPLATE_CACHE.export(template_path),) if parallel and engine == "openpyxl" else ()
+        for message in run_cached_tasks(process_pair, tasks, entries, parallel=parallel,
+                                        initializer=seed_template_cache, initargs=initargs):
+            print(message)
+            log.write(message)
+
+        if workbook:
+            combine_outputs([output_file for _, output_file in entries], os.path.join(output_folder, workbook), log)
+
+        # Log: finalizare
+        log.write("Final procesare fișiere.")
 
 
 # ------------------------------------------------
@@ -201,6 +278,28 @@ if __name__ == "__main__":
         default=None,
         help="Numele/locația fișierului de log."
     )
+    parser.add_argument(
+        "--engine",
+        choices=["openpyxl", "xml", "stream"],
+        default=os.getenv("ENGINE", "openpyxl"),
+        help="Motorul de generare XLSX: openpyxl (implicit), xml sau stream (memorie constantă)."
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Procesează fișierele în paralel, pe mai multe procese."
+    )
+    parser.add_argument(
+        "--workbook",
+        type=str,
+        default=None,
+        help="Combină rezultatele într-un singur fișier XLSX cu acest nume (o foaie per simbol)."
+    )
+    parser.add_argument(
+        "--values-only",
+        action="store_true",
+        help="Scrie valorile calculate în locul formulelor (fișiere citibile direct, ex: cu pandas)."
+    )
     args = parser.parse_args()
 
     # 2) Preia și din variabile de mediu (dacă nu vin din CLI):
@@ -235,5 +334,9 @@ if __name__ == "__main__":
         csv_folder=csv_folder,
         template_path=template_path,
         output_folder=output_folder,
-        log_file=log_file
+        log_file=log_file,
+        parallel=args.parallel,
+        engine=args.engine,
+        workbook=args.workbook,
+        values_only=args.values_only
     )
\ No newline at end of file
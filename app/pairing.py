@@ -0,0 +1,72 @@
+"""
+Regulile de împerechere a fișierelor CSV după nume, fără acces la disc.
+
+Sunt folosite atât de scripturile de procesare (find_csv_pairs), cât și la
+încărcare, ca erorile de denumire să fie afișate înainte de procesare:
+ - 1M / 3M (PPI, PMIPCNOMINAL): '<Nume>, 1M.csv' + '<Nume>, 3M.csv'
+ - MM / YY (MOMYOY)           : '<Nume>MM, 1M.csv' + '<Nume>YY, 1M.csv'
+GDPPCY și REALGDPQY procesează fiecare CSV separat (fără perechi).
+"""
+import re
+
+MM_YY_PATTERN = re.compile(r"(.+?)(MM|YY),\s*1M\.csv$")
+
+
+def pair_1m_3m(names):
+    """
+    Grupează numele de fișiere pe nume comun: {'Nume': {'1M': nume, '3M': nume}}.
+    Ca în scripturile originale, tipul este dat de apariția '1M' / '3M' în nume;
+    perechile incomplete sunt păstrate (sunt raportate la procesare).
+    """
+    pairs = {}
+    for name in names:
+        if name.endswith(".csv"):
+            base_name = name.rsplit(", ", 1)[0]  # Eliminăm partea finală (1M sau 3M)
+            if "1M" in name:
+                pairs.setdefault(base_name, {})["1M"] = name
+            elif "3M" in name:
+                pairs.setdefault(base_name, {})["3M"] = name
+    return pairs
+
+
+def pair_mm_yy(names):
+    """
+    Grupează numele de fișiere MM / YY: ({'Nume': {'MM': nume, 'YY': nume}}, [nume nerecunoscute]).
+    Perechile incomplete sunt păstrate în rezultat.
+    """
+    pairs = {}
+    unmatched = []
+    for name in names:
+        if name.endswith(".csv"):
+            match = MM_YY_PATTERN.match(name)
+            if match:
+                base_name, indicator_type = match.groups()
+                pairs.setdefault(base_name, {})[indicator_type] = name
+            else:
+                unmatched.append(name)
+    return pairs, unmatched
+
+
+def pairing_errors(pairing, names):
+    """
+    Erorile de denumire pentru regula 'pairing' ("1M/3M", "MM/YY" sau None),
+    cu aceleași mesaje ca în log-ul de procesare.
+    """
+    names = [name for name in names if name.endswith(".csv")]
+    errors = []
+    if pairing == "1M/3M":
+        pairs = pair_1m_3m(names)
+        paired = {name for files in pairs.values() for name in files.values()}
+        for name in sorted(set(names) - paired):
+            errors.append(f"Eroare: Fișierul '{name}' nu conține 1M sau 3M în nume și va fi ignorat.")
+        for base_name, files in sorted(pairs.items()):
+            if "1M" not in files or "3M" not in files:
+                errors.append(f"Eroare: Fișierele CSV 1M / 3M pentru '{base_name}' nu sunt complete.")
+    elif pairing == "MM/YY":
+        pairs, unmatched = pair_mm_yy(names)
+        for name in sorted(unmatched):
+            errors.append(f"Eroare: Fișierul '{name}' nu respectă modelul de nume pentru MOM YOY.")
+        for base_name, files in sorted(pairs.items()):
+            if "MM" not in files or "YY" not in files:
+                errors.append(f"Eroare: Fișierele CSV pentru '{base_name}' nu sunt complete: {sorted(files)}")
+    return errors
@@ -0,0 +1,133 @@
+"""
+Distribuirea fișierelor/perechilor CSV pe mai multe procese (mod opțional).
+
+Fiecare simbol este independent, așa că process_csv_to_xlsx poate trimite
+procesarea fiecărei perechi către un pool de procese dimensionat după
+numărul de nuclee. Rezultatele (mesajele de log) sunt returnate în ordinea
+task-urilor, indiferent de ordinea în care se termină procesele.
+
+Dacă un proces copil moare (ex: OOM), ProcessPoolExecutor oprește tot pool-ul.
+Ca în WorkerPool, fiecare task anunță pid-ul procesului pe care rulează: task-ul
+de pe procesul mort primește un mesaj de eroare, iar celelalte task-uri
+neterminate sunt retrimise către un pool nou.
+
+Configurare (variabile de mediu):
+ - PARALLEL_FANOUT  : "1" activează modul paralel pentru /process/
+ - PARALLEL_WORKERS : numărul maxim de procese (0 = numărul de nuclee)
+"""
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PARALLEL_FANOUT = os.getenv("PARALLEL_FANOUT", "0") == "1"
+PARALLEL_WORKERS = int(os.getenv("PARALLEL_WORKERS", "0"))
+
+# Cât așteptăm, după o cădere a pool-ului, oprirea proceselor
+CRASH_INSPECT_TIMEOUT = 5
+
+_claims = None  # coada prin care procesul copil anunță (task, pid) la începutul unui task
+
+
+def available_cores():
+    """
+    Numărul de nuclee disponibile procesului curent (ține cont de affinity/cgroups).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _init_child(claims, initializer, initargs):
+    global _claims
+    _claims = claims
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _run_task(index, func, task):
+    _claims.put((index, os.getpid()))
+    return func(*task)
+
+
+def _crashed_tasks(processes, claims, unfinished):
+    """
+    Task-urile neterminate care rulau pe procese moarte singure (după o cădere,
+    ProcessPoolExecutor le oprește pe celelalte cu SIGTERM). Dacă procesul mort
+    nu poate fi identificat, sunt considerate vinovate toate task-urile pornite;
+    dacă niciunul nu pornise, primul task neterminat.
+    """
+    processes = list(processes.values())
+    for process in processes:
+        process.join(CRASH_INSPECT_TIMEOUT)
+    crashed = {process.pid for process in processes
+               if process.exitcode not in (None, 0, -signal.SIGTERM)}
+    started = {}
+    while not claims.empty():
+        index, pid = claims.get()
+        started[index] = pid
+    running = [index for index in unfinished if index in started]
+    return ([index for index in running if started[index] in crashed]
+            or running or unfinished[:1])
+
+
+def run_tasks(func, tasks, parallel=False, max_workers=None, initializer=None, initargs=()):
+    """
+    Rulează func(*task) pentru fiecare task și produce rezultatele în ordinea task-urilor.
+    - parallel=False : rulare secvențială, în procesul curent
+    - parallel=True  : pool de procese (cel mult max_workers / PARALLEL_WORKERS / nuclee)
+    'initializer' rulează o dată în fiecare proces copil (ex: încărcarea template-ului).
+    Task-ul al cărui proces moare primește rezultatul "Eroare la procesarea '<task[0]>': ...".
+    """
+    tasks = list(tasks)
+    workers = min(max_workers or PARALLEL_WORKERS or available_cores(), len(tasks))
+    if not parallel or workers < 2:
+        for task in tasks:
+            yield func(*task)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    position = 0
+    pending = list(range(len(tasks)))
+    while pending:
+        claims = context.SimpleQueue()
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(pending)),
+            mp_context=context,
+            initializer=_init_child,
+            initargs=(claims, initializer, initargs),
+        ) as executor:
+            # Referința rămâne validă după cădere (ca în WorkerPool)
+            processes = executor._processes
+            futures = {index: executor.submit(_run_task, index, func, tasks[index]) for index in pending}
+            broken = False
+            for index in pending:
+                try:
+                    results[index] = futures[index].result()
+                except BrokenProcessPool:
+                    broken = True
+                    break
+                while position in results:
+                    yield results.pop(position)
+                    position += 1
+        if not broken:
+            break
+
+        unfinished = []
+        for index in pending:
+            future = futures[index]
+            if index in results or position > index:
+                continue
+            if future.done() and future.exception() is None:
+                results[index] = future.result()
+            else:
+                unfinished.append(index)
+        for index in _crashed_tasks(processes, claims, unfinished):
+            results[index] = f"Eroare la procesarea '{tasks[index][0]}': procesul s-a oprit neașteptat."
+            unfinished.remove(index)
+        pending = unfinished
+        while position in results:
+            yield results.pop(position)
+            position += 1
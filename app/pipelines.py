@@ -0,0 +1,89 @@
+"""
+Registrul scripturilor de procesare (pipeline-uri) disponibile în aplicație.
+
+Fiecare tip de fișier selectat în formular (PPI, PMIPCNOMINAL etc.) are:
+ - 'module'   : modulul din folderul app/ care expune process_csv_to_xlsx
+ - 'template' : template-ul XLSX folosit
+ - 'label'    : numele afișat în mesajul de final
+ - 'pairing'  : regula de împerechere a CSV-urilor după nume ("1M/3M", "MM/YY"
+                sau None pentru fișiere procesate separat), vezi app/pairing.py
+ - 'engine'   : motorul de generare XLSX ("openpyxl", "xml" sau "stream"), configurabil
+                prin variabila de mediu ENGINE_<TIP> (ex: ENGINE_PPI=xml)
+"""
+import os
+from pathlib import Path
+
+from app.pairing import MM_YY_PATTERN, pair_1m_3m
+
+TEMPLATE_FOLDER = Path("template")
+
+PIPELINES = {
+    "PPI": {
+        "module": "process_script",
+        "template": TEMPLATE_FOLDER / "template.xlsx",
+        "label": "PPI",
+        "pairing": "1M/3M",
+        "engine": os.getenv("ENGINE_PPI", "openpyxl"),
+    },
+    "PMIPCNOMINAL": {
+        "module": "pmipcnominal",
+        "template": TEMPLATE_FOLDER / "pmipcnominal.xlsx",
+        "label": "PMI PC Valoare Nominala",
+        "pairing": "1M/3M",
+        "engine": os.getenv("ENGINE_PMIPCNOMINAL", "openpyxl"),
+    },
+    "GDPPCY": {
+        "module": "gdppcy",
+        "template": TEMPLATE_FOLDER / "GDPPCy.xlsx",
+        "label": "GDPPCY",
+        "pairing": None,
+        "engine": os.getenv("ENGINE_GDPPCY", "openpyxl"),
+    },
+    "REALGDPQY": {
+        "module": "realgdpqy",
+        "template": TEMPLATE_FOLDER / "realGDPQY.xlsx",
+        "label": "REALGDPQY",
+        "pairing": None,
+        "engine": os.getenv("ENGINE_REALGDPQY", "openpyxl"),
+    },
+    "MOMYOY": {
+        "module": "momyoy",
+        "template": TEMPLATE_FOLDER / "RSMoMYoY.xlsx",
+        "label": "MOM YOY",
+        "pairing": "MM/YY",
+        "engine": os.getenv("ENGINE_MOMYOY", "openpyxl"),
+    },
+}
+
+# Ca în codul original: orice tip necunoscut rulează momyoy.py
+DEFAULT_PIPELINE = "MOMYOY"
+
+
+def get_pipeline(file_type):
+    """
+    Returnează descrierea pipeline-ului pentru tipul de fișier dat.
+    """
+    return PIPELINES.get(file_type, PIPELINES[DEFAULT_PIPELINE])
+
+
+def detect_pipelines(folder):
+    """
+    Tipurile de fișier posibile pentru CSV-urile dintr-un folder (conversia în masă, app/batch.py).
+    Un nume de tip în cale (ex: exports/PPI/2024-01) decide singur. Altfel, numele
+    fișierelor deosebesc doar familiile: MM / YY (MOMYOY), perechi 1M / 3M (PPI,
+    PMIPCNOMINAL) și fișiere 3M separate (GDPPCY, REALGDPQY).
+    """
+    for part in reversed(Path(folder).resolve().parts):
+        if part.upper() in PIPELINES:
+            return [part.upper()]
+
+    names = [name for name in os.listdir(folder) if name.endswith(".csv")]
+    if not names:
+        return []
+    if all(MM_YY_PATTERN.match(name) for name in names):
+        return ["MOMYOY"]
+    if any(len(files) == 2 for files in pair_1m_3m(names).values()):
+        return ["PPI", "PMIPCNOMINAL"]
+    if all(name.endswith("3M.csv") for name in names):
+        return ["GDPPCY", "REALGDPQY"]
+    return sorted(PIPELINES)
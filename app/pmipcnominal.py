@@ -1,17 +1,82 @@
 import os
-import pandas as pd
-from openpyxl import load_workbook
-from datetime import datetime
 import argparse
+import sys
 
-def log_processing_info(log_file, message):
-    """
-    Scrie în fișierul 'log_file' un mesaj, cu data/ora curentă.
-    Creează fișierul dacă nu există.
-    """
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"[{now}] {message}\n")
+if __package__ in (None, ""):
+    # Rulat direct (python app/<script>.py): facem importabil pachetul `app`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.combined_workbook import combine_outputs, remove_combined_outputs
+from app.csv_reader import ChunkedTvCsv, read_tv_csv
+from app.derived_columns import Asinh, Correl, Difference, Lead, Mean, Stdev, ZScore, fill_patch, fill_sheet
+from app.pairing import pair_1m_3m
+from app.process_log import ProcessLog
+from app.result_cache import RESULT_CACHE, run_cached_tasks
+from app.stage_timer import stage
+from app.template_cache import TEMPLATE_CACHE, load_template, seed_template_cache, template_max_row
+from app.xlsx_utils import TrimPlan, write_series
+from app.xml_engine import SheetPatch
+
+# Versiunea rezultatului (intră în cheia cache-ului de rezultate); se schimbă
+# la orice modificare a scriptului care schimbă fișierele XLSX generate
+PIPELINE_VERSION = "pmipcnominal-2"
+
+# Coloanele cu formule golite pe ultimul rând de date lunare (1M)
+LUNAR_FORMULA_COLUMNS = ["J", "K", "L", "M", "N", "O", "AL", "AM", "AN", "AO", "AP", "AQ"]
+
+# Coloanele cu formule golite pe ultimul rând de date trimestriale (3M)
+QUARTER_FORMULA_COLUMNS = ["Y", "Z", "AA", "AB", "AC", "AD"]
+
+# Coloanele golite după ultimul rând de date trimestriale (3M)
+QUARTER_COLUMNS = ["R", "S", "T", "U", "V", "W", "X", "Y", "Z", "AA", "AB", "AC", "AD"]
+
+# Coloanele cu formule ale template-ului, calculate cu NumPy în modul „doar valori”
+# (vezi app/derived_columns.py); verificate cu: python -m app.derived_columns PMIPCNOMINAL
+DERIVED_COLUMNS = [
+    # Date lunare (1M): diferența MoM
+    ("C", 3, Difference("B")),
+    ("D", 3, Asinh("C")),
+    ("E", 14, ZScore("D", length=12)),
+    ("F", 4, ZScore("D", anchor=3)),
+    ("G", 14, Stdev("D", 12)),
+    ("H", 25, ZScore("G", length=12)),
+    ("I", 15, ZScore("G", anchor=14)),
+    ("J", 3, Lead("C")),
+    ("K", 14, Correl("C", "J", 12)),
+    ("L", 25, ZScore("K", length=12)),
+    ("M", 15, ZScore("K", anchor=14)),
+    ("N", 25, Mean("E", "H", "L")),
+    ("O", 25, Mean("F", "I", "M")),
+    # Date trimestriale (3M): diferența față de acum 4 trimestre
+    ("R", 6, Difference("Q", 4)),
+    ("S", 6, Asinh("R")),
+    ("T", 13, ZScore("S", length=8)),
+    ("U", 7, ZScore("S", anchor=6)),
+    ("V", 13, Stdev("S", 8)),
+    ("W", 20, ZScore("V", length=8)),
+    ("X", 14, ZScore("V", anchor=13)),
+    ("Y", 6, Lead("S")),
+    ("Z", 13, Correl("S", "Y", 8)),
+    ("AA", 20, ZScore("Z", length=8)),
+    ("AB", 14, ZScore("Z", anchor=13)),
+    ("AC", 20, Mean("T", "W", "AA")),
+    ("AD", 20, Mean("U", "X", "AB")),
+    # Date lunare (1M): diferența YoY
+    ("AE", 14, Difference("B", 12)),
+    ("AF", 14, Asinh("AE")),
+    ("AG", 18, ZScore("AF", length=5)),
+    ("AH", 15, ZScore("AF", anchor=14)),
+    ("AI", 18, Stdev("AF", 5)),
+    ("AJ", 22, ZScore("AI", length=5)),
+    ("AK", 19, ZScore("AI", anchor=18)),
+    ("AL", 14, Lead("AF")),
+    ("AM", 18, Correl("AF", "AL", 5)),
+    ("AN", 22, ZScore("AM", length=5)),
+    # În template, AO de pe rândul r folosește AM de pe rândul r+1
+    ("AO", 18, ZScore("AM", anchor=18, offset=1)),
+    ("AP", 22, Mean("AG", "AJ", "AN")),
+    ("AQ", 22, Mean("AH", "AK", "AO")),
+]
 
 def find_csv_pairs(csv_folder):
     """
@@ -25,135 +90,163 @@ def find_csv_pairs(csv_folder):
       ...
     }
     """
-    csv_files = os.listdir(csv_folder)
-    csv_pairs = {}
-    
-    for file in csv_files:
-        if file.endswith(".csv"):
-            base_name = file.rsplit(", ", 1)[0]  # Eliminăm partea finală (1M sau 3M)
-            if "1M" in file:
-                csv_pairs.setdefault(base_name, {})["1M"] = os.path.join(csv_folder, file)
-            elif "3M" in file:
-                csv_pairs.setdefault(base_name, {})["3M"] = os.path.join(csv_folder, file)
-    
-    return csv_pairs
-
-def clear_last_row_formulas_lunar(ws, last_data_row):
-    """
-    Elimină formulele din coloanele specifice pentru ultimul rând generat 
-    pentru date lunare (1M).
-    """
-    columns_to_clear = ["J", "K", "L", "M", "N", "O", 
-                        "AL", "AM", "AN", "AO", "AP", "AQ"]
-    for col in columns_to_clear:
-        ws[f"{col}{last_data_row}"].value = None
+    csv_pairs = pair_1m_3m(os.listdir(csv_folder))
+    return {
+        base_name: {kind: os.path.join(csv_folder, file) for kind, file in files.items()}
+        for base_name, files in csv_pairs.items()
+    }
 
-def clear_last_row_formulas_quarter(ws, last_data_row_quarter):
+def process_pair(base_name, files, template_path, output_folder, engine="openpyxl", values_only=False):
     """
-    Elimină formulele din coloanele "Y", "Z", "AA", "AB", "AC", "AD"
-    pentru ultimul rând din datele trimestriale (3M).
+    Procesează o pereche de fișiere CSV (1M și 3M) și salvează fișierul XLSX rezultat.
+    engine: "openpyxl" (implicit), "xml" (rescrie direct XML-ul template-ului) sau
+    "stream" (ca "xml", cu CSV-urile citite în bucăți, pentru istoricele foarte lungi).
+    values_only: formulele sunt înlocuite cu valorile lor (vezi app/derived_columns.py).
+    Returnează mesajul pentru log (succes sau eroare).
     """
-    columns_to_clear = ["Y", "Z", "AA", "AB", "AC", "AD"]
-    for col in columns_to_clear:
-        ws[f"{col}{last_data_row_quarter}"].value = None
+    # Verificăm dacă avem și fișier 1M, și fișier 3M
+    if "1M" not in files or "3M" not in files:
+        error_msg = f"Eroare: Fișierele CSV 1M / 3M pentru '{base_name}' nu sunt complete."
+        return error_msg
 
-def remove_extra_rows(ws, num_rows):
-    """
-    Elimină rândurile în plus din fișierul Excel dacă sunt mai multe decât 
-    în fișierul CSV 1M (num_rows).
-    """
-    max_existing_rows = ws.max_row
-    if max_existing_rows > num_rows + 1:
-        ws.delete_rows(num_rows + 2, max_existing_rows - num_rows - 1)
+    try:
+        if engine == "stream":
+            # Ca motorul "xml", dar CSV-urile sunt citite în bucăți abia la scrierea foii:
+            # memoria nu crește cu lungimea istoricului
+            if values_only:
+                raise ValueError("modul „doar valori” are nevoie de coloanele întregi, nu merge cu motorul stream")
+            with stage("read_csv"):
+                source_lunar = ChunkedTvCsv(files["1M"])
+                source_quarter = ChunkedTvCsv(files["3M"])
+            num_rows = len(source_lunar)
+            num_rows_quarter = len(source_quarter)
+            with stage("write"):
+                patch = SheetPatch(title=base_name)
+                patch.stream_series(source_lunar, date_column=1, value_column=2)
+                patch.stream_series(source_quarter, date_column=16, value_column=17, limit=num_rows)
+                patch.truncate(num_rows + 1)
+                patch.clear(QUARTER_COLUMNS, num_rows_quarter + 2)
+                patch.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+                patch.clear(QUARTER_FORMULA_COLUMNS, num_rows_quarter + 1, num_rows_quarter + 1)
+            with stage("save"):
+                patch.save(template_path, os.path.join(output_folder, f"{base_name}.xlsx"))
+            return f"✔ Fișier completat: {base_name}.xlsx"
 
-def remove_extra_rows_quarter(ws, num_rows_quarter):
-    """
-    Elimină valorile în plus din coloanele T..AH dacă fișierul 3M 
-    are mai puține rânduri decât template-ul.
-    """
-    columns_to_clear = [
-        "R", "S", "T", "U", "V", "W", "X", "Y", "Z", 
-        "AA", "AB", "AC", "AD"
-    ]
-    max_existing_rows = ws.max_row
-    
-    # Golim conținutul (nu ștergem rândurile) după num_rows_quarter
-    for row in range(num_rows_quarter + 2, max_existing_rows + 1):
-        for col in columns_to_clear:
-            ws[f"{col}{row}"].value = None
-
-def process_csv_to_xlsx(csv_folder, template_path, output_folder, log_file="process_log.txt"):
+        # Citește datele din CSV-uri
+        with stage("read_csv"):
+            dates_lunar, values_lunar = read_tv_csv(files["1M"])
+            dates_quarter, values_quarter = read_tv_csv(files["3M"])
+
+        num_rows = len(dates_lunar)
+        num_rows_quarter = len(dates_quarter)
+        output_file = os.path.join(output_folder, f"{base_name}.xlsx")
+
+        # Coloanele din CSV citite de formule (pentru modul „doar valori”)
+        data = {"B": values_lunar, "Q": values_quarter[:num_rows]}
+
+        if engine == "xml":
+            # Aceiași pași ca mai jos, aplicați direct pe XML-ul template-ului
+            with stage("write"):
+                patch = SheetPatch(title=base_name)
+                patch.write_series(dates_lunar, values_lunar, date_column=1, value_column=2)
+                patch.write_series(dates_quarter, values_quarter, date_column=16, value_column=17, limit=num_rows)
+                patch.truncate(num_rows + 1)
+                patch.clear(QUARTER_COLUMNS, num_rows_quarter + 2)
+                patch.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+                patch.clear(QUARTER_FORMULA_COLUMNS, num_rows_quarter + 1, num_rows_quarter + 1)
+            if values_only:
+                with stage("derived"):
+                    fill_patch(patch, template_path, DERIVED_COLUMNS, data)
+            with stage("save"):
+                patch.save(template_path, output_file)
+            return f"✔ Fișier completat: {base_name}.xlsx"
+
+        # Încarcă șablonul Excel (din cache, parsat o singură dată per proces)
+        with stage("load_template"):
+            wb = load_template(template_path)
+        ws = wb.active
+
+        # Redenumește foaia de lucru
+        ws.title = base_name
+
+        with stage("write"):
+            # Inserăm datele 1M (coloanele A și B)
+            write_series(ws, dates_lunar, values_lunar, date_column=1, value_column=2)
+
+            # Inserăm datele 3M (coloanele P și Q), cel mult cât are 1M
+            write_series(ws, dates_quarter, values_quarter, date_column=16, value_column=17, limit=num_rows)
+
+        # Eliminăm rândurile și formulele în plus, într-o singură trecere (vezi xlsx_utils.TrimPlan)
+        with stage("trim"):
+            plan = TrimPlan(template_max_row(template_path))
+            plan.truncate(num_rows + 1)
+            plan.clear(QUARTER_COLUMNS, num_rows_quarter + 2)
+            plan.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+            plan.clear(QUARTER_FORMULA_COLUMNS, num_rows_quarter + 1, num_rows_quarter + 1)
+            plan.apply(ws)
+
+        # Modul „doar valori”: formulele rămase sunt înlocuite cu valorile calculate
+        if values_only:
+            with stage("derived"):
+                fill_sheet(ws, template_path, DERIVED_COLUMNS, data, num_rows + 1)
+
+        # Salvează fișierul XLSX rezultat
+        with stage("save"):
+            wb.save(output_file)
+
+        msg_ok = f"✔ Fișier completat: {base_name}.xlsx"
+        return msg_ok
+
+    except Exception as e:
+        # Dacă apare vreo eroare la procesare, o logăm și continuăm
+        error_msg = f"Eroare la procesarea '{base_name}': {e}"
+        return error_msg
+
+def process_csv_to_xlsx(csv_folder, template_path, output_folder, log_file="process_log.txt", parallel=False,
+                        engine="openpyxl", workbook=None, values_only=False):
     """
     Completează template.xlsx cu datele din fișierele CSV (1M și 3M),
     fără a modifica structura acestuia. 
     Scrie log-uri în 'log_file'.
+    Cu parallel=True, fișierele sunt procesate pe mai multe procese
+    (log-urile rămân în aceeași ordine).
+    engine: "openpyxl", "xml" sau "stream" (vezi app/xml_engine.py).
+    Cu 'workbook' (nume de fișier), rezultatele sunt combinate la final într-un
+    singur fișier cu o foaie per simbol (vezi app/combined_workbook.py).
+    Cu values_only=True, coloanele cu formule conțin valorile calculate, nu formulele.
     """
-    csv_pairs = find_csv_pairs(csv_folder)
-    
-    # Creăm folderul de output dacă nu există
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    
-    # Log: începem procesarea
-    log_processing_info(log_file, f"Start procesare fișiere.'")
-    
-    for base_name, files in csv_pairs.items():
-        # Verificăm dacă avem și fișier 1M, și fișier 3M
-        if "1M" not in files or "3M" not in files:
-            error_msg = f"Eroare: Fișierele CSV 1M / 3M pentru '{base_name}' nu sunt complete."
-            print(error_msg)
-            log_processing_info(log_file, error_msg)
-            # Continuăm cu următorul 'base_name'
-            continue
-        
-        try:
-            # Încarcă șablonul Excel
-            wb = load_workbook(template_path)
-            ws = wb.active
-            
-            # Redenumește foaia de lucru
-            ws.title = base_name
-            
-            # Citește datele din CSV-uri
-            df_lunar = pd.read_csv(files["1M"])
-            df_quarter = pd.read_csv(files["3M"])
-            
-            num_rows = len(df_lunar)
-            num_rows_quarter = len(df_quarter)
-            
-            # Inserăm datele 1M (exemplu: coloanele A și B)
-            for index, row in df_lunar.iterrows():
-                ws.cell(row=index+2, column=1, value=row.iloc[0])  # data 1M
-                ws.cell(row=index+2, column=2, value=row.iloc[1])  # valoare 1M
-            
-            # Inserăm datele 3M (exemplu: coloanele R și S)
-            for index, row in df_quarter.iterrows():
-                if index < num_rows:  
-                    ws.cell(row=index+2, column=16, value=row.iloc[0])  # data 3M
-                    ws.cell(row=index+2, column=17, value=row.iloc[1])  # valoare 3M
-            
-            # Eliminăm rândurile și formulele în plus
-            remove_extra_rows(ws, num_rows)
-            remove_extra_rows_quarter(ws, num_rows_quarter)
-            clear_last_row_formulas_lunar(ws, num_rows + 1)
-            clear_last_row_formulas_quarter(ws, num_rows_quarter + 1)
-            
-            # Salvează fișierul XLSX rezultat
-            output_file = os.path.join(output_folder, f"{base_name}.xlsx")
-            wb.save(output_file)
-            
-            msg_ok = f"✔ Fișier completat: {base_name}.xlsx"
-            print(msg_ok)
-            log_processing_info(log_file, msg_ok)
-        
-        except Exception as e:
-            # Dacă apare vreo eroare la procesare, o logăm și continuăm
-            error_msg = f"Eroare la procesarea '{base_name}': {e}"
-            print(error_msg)
-            log_processing_info(log_file, error_msg)
-    
-    # Log: finalizare
-    log_processing_info(log_file, "Final procesare fișiere.")
+    with ProcessLog(log_file) as log:
+        csv_pairs = find_csv_pairs(csv_folder)
+
+        # Creăm folderul de output dacă nu există
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+        # Fișierul combinat al unei rulări anterioare nu mai corespunde rezultatelor noi
+        remove_combined_outputs(output_folder, workbook)
+
+        # Log: începem procesarea
+        log.write(f"Start procesare fișiere.'")
+
+        tasks = [(base_name, files, template_path, output_folder, engine, values_only)
+                 for base_name, files in csv_pairs.items()]
+        # Fișierele generate deja din aceleași date și același template vin din cache
+        entries = [(RESULT_CACHE.key(PIPELINE_VERSION, engine, template_path, base_name, files,
+                                     values_only=values_only),
+                    os.path.join(output_folder, f"{base_name}.xlsx"))
+                   for base_name, files in csv_pairs.items()]
+        # În modul paralel, template-ul este parsat o singură dată aici și trimis proceselor copil
+        initargs = (TEMPLATE_CACHE.export(template_path),) if parallel and engine == "openpyxl" else ()
+        for message in run_cached_tasks(process_pair, tasks, entries, parallel=parallel,
+                                        initializer=seed_template_cache, initargs=initargs):
+            print(message)
+            log.write(message)
+
+        if workbook:
+            combine_outputs([output_file for _, output_file in entries], os.path.join(output_folder, workbook), log)
+
+        # Log: finalizare
+        log.write("Final procesare fișiere.")
+
 
 # ------------------------------------------------
 # EXEMPLU de utilizare (script standalone):
@@ -186,6 +279,28 @@ if __name__ == "__main__":
         default=None,
         help="Numele/locația fișierului de log."
     )
+    parser.add_argument(
+        "--engine",
+        choices=["openpyxl", "xml", "stream"],
+        default=os.getenv("ENGINE", "openpyxl"),
+        help="Motorul de generare XLSX: openpyxl (implicit), xml sau stream (memorie constantă)."
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Procesează fișierele în paralel, pe mai multe procese."
+    )
+    parser.add_argument(
+        "--workbook",
+        type=str,
+        default=None,
+        help="Combină rezultatele într-un singur fișier XLSX cu acest nume (o foaie per simbol)."
+    )
+    parser.add_argument(
+        "--values-only",
+        action="store_true",
+        help="Scrie valorile calculate în locul formulelor (fișiere citibile direct, ex: cu pandas)."
+    )
     args = parser.parse_args()
 
     # 2) Preia și din variabile de mediu (dacă nu vin din CLI):
@@ -220,5 +335,9 @@ if __name__ == "__main__":
         csv_folder=csv_folder,
         template_path=template_path,
         output_folder=output_folder,
-        log_file=log_file
+        log_file=log_file,
+        parallel=args.parallel,
+        engine=args.engine,
+        workbook=args.workbook,
+        values_only=args.values_only
     )
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Log-ul de procesare al unei sesiuni (process_log.txt), comun tuturor scripturilor.
+
+Fiecare mesaj este scris ca un rând JSON:
+    {"time": "2024-01-31 12:00:00", "level": "info", "message": "✔ Fișier completat: X.xlsx"}
+Mesajele care încep cu "Eroare" au nivelul "error".
+
+Scrierea nu mai deschide și închide fișierul la fiecare mesaj: mesajele trec
+printr-o coadă în memorie (QueueHandler) și sunt scrise de un thread separat
+(QueueListener) într-un RotatingFileHandler ținut deschis pe durata job-ului.
+La închiderea log-ului (finalul job-ului) coada este golită pe disc.
+
+read_log() citește doar intrările de după un offset (în octeți), ca /log să
+trimită doar rândurile noi (?since=<offset>), nu tot istoricul sesiunii.
+Rândurile în formatul vechi ("[data] mesaj") sunt citite în continuare.
+
+Configurare (variabile de mediu):
+ - LOG_MAX_MB  : dimensiunea la care fișierul este rotit (implicit 5)
+ - LOG_BACKUPS : câte fișiere rotite se păstrează (implicit 3)
+"""
+import json
+import logging
+import os
+import queue
+import re
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_MAX_MB = int(os.getenv("LOG_MAX_MB", "5"))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "3"))
+
+# Formatul vechi, scris direct de scripturi: "[2024-01-31 12:00:00] mesaj"
+LEGACY_LINE = re.compile(r"^\[(.*?)\] (.*)$")
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Un rând JSON per mesaj: time, level, message.
+    """
+
+    def format(self, record):
+        return json.dumps({
+            "time": datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname.lower(),
+            "message": record.getMessage(),
+        }, ensure_ascii=False)
+
+
+class ProcessLog:
+    """
+    Log-ul unui job de procesare; se folosește ca context manager:
+
+        with ProcessLog(log_file) as log:
+            log.write("Start procesare fișiere")
+    """
+
+    def __init__(self, log_file, max_bytes=LOG_MAX_MB * 1024 * 1024, backups=LOG_BACKUPS):
+        self._handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups,
+                                            encoding="utf-8", delay=True)
+        self._handler.setFormatter(JsonLineFormatter())
+        self._queue = queue.SimpleQueue()
+        self._listener = QueueListener(self._queue, self._handler)
+        # Logger neînregistrat global: fiecare job are propriul logger, eliberat la final
+        self._logger = logging.Logger(f"process_log.{log_file}")
+        self._logger.addHandler(QueueHandler(self._queue))
+        self._listener.start()
+
+    def write(self, message):
+        """
+        Adaugă un mesaj în log (nivel "error" pentru mesajele care încep cu "Eroare").
+        """
+        level = logging.ERROR if message.startswith("Eroare") else logging.INFO
+        self._logger.log(level, message)
+
+    def close(self):
+        """
+        Scrie pe disc mesajele rămase în coadă și închide fișierul.
+        """
+        self._listener.stop()
+        self._handler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _parse_line(line):
+    try:
+        entry = json.loads(line)
+        if isinstance(entry, dict):
+            return entry
+    except ValueError:
+        pass
+    match = LEGACY_LINE.match(line)
+    if match:
+        return {"time": match.group(1), "level": "info", "message": match.group(2)}
+    return {"time": None, "level": "info", "message": line}
+
+
+def read_log(log_file, since=0):
+    """
+    Intrările log-ului scrise după offset-ul 'since' (în octeți).
+    Returnează (intrări, offset-ul următor, reset). 'reset' este True dacă
+    fișierul a fost rotit sau șters de la citirea anterioară ('since' depășește
+    dimensiunea lui); atunci intrările sunt citite de la început.
+    Un rând încă incomplet (în curs de scriere) rămâne pentru citirea următoare.
+    """
+    try:
+        size = os.path.getsize(log_file)
+    except FileNotFoundError:
+        return [], 0, since > 0
+    reset = since > size
+    if reset:
+        since = 0
+    with open(log_file, "rb") as f:
+        f.seek(since)
+        data = f.read(size - since)
+    end = data.rfind(b"\n") + 1
+    entries = [
+        _parse_line(line.decode("utf-8", errors="replace"))
+        for line in data[:end].splitlines()
+        if line.strip()
+    ]
+    return entries, since + end, reset
@@ -0,0 +1,49 @@
+"""
+Evenimente de progres ale procesării, trimise din procesele worker către aplicație.
+
+Procesele din WorkerPool primesc la pornire o coadă multiprocessing comună;
+în timpul unui job, run_cached_tasks emite câte un eveniment pentru fiecare
+simbol (început, scris, sărit din cache, eroare, durată). Aplicația citește
+coada într-un thread și transmite evenimentele job-ului corespunzător, de
+unde ajung în browser prin /process/events (server-sent events).
+
+Fără coadă (script rulat din linia de comandă sau WORKER_POOL_SIZE=0),
+emit() nu face nimic.
+"""
+import time
+
+# Tipurile de evenimente pentru un simbol
+STARTED = "started"
+WRITTEN = "written"
+SKIPPED = "skipped"
+ERROR = "error"
+# Ultimul eveniment al unui job, trimis de worker după ce pipeline-ul s-a terminat
+END = "end"
+
+_sink = None    # coada către procesul aplicației
+_job_id = None  # job-ul care rulează acum în acest proces
+
+
+def configure(sink):
+    """
+    Setează coada în care sunt trimise evenimentele (inițializarea procesului worker).
+    """
+    global _sink
+    _sink = sink
+
+
+def set_job(job_id):
+    """
+    Job-ul căruia îi aparțin evenimentele emise de acum înainte (None = niciunul).
+    """
+    global _job_id
+    _job_id = job_id
+
+
+def emit(event_type, **fields):
+    """
+    Trimite un eveniment pentru job-ul curent; nu face nimic fără coadă sau fără job.
+    """
+    if _sink is None or _job_id is None:
+        return
+    _sink.put({"job_id": _job_id, "type": event_type, "time": time.time(), **fields})
@@ -1,95 +1,194 @@
 import os
-import pandas as pd
-from openpyxl import load_workbook
-from datetime import datetime
 import argparse
+import sys
 
-def log_processing_info(log_file, message):
-    """
-    Scrie în fișierul 'log_file' un mesaj, cu data/ora curentă.
-    Creează fișierul dacă nu există.
-    """
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"[{now}] {message}\n")
+if __package__ in (None, ""):
+    # Rulat direct (python app/<script>.py): facem importabil pachetul `app`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.combined_workbook import combine_outputs, remove_combined_outputs
+from app.csv_reader import ChunkedTvCsv, read_tv_csv
+from app.derived_columns import Asinh, Correl, Lead, Mean, PctChange, Stdev, ZScore, fill_patch, fill_sheet
+from app.process_log import ProcessLog
+from app.result_cache import RESULT_CACHE, run_cached_tasks
+from app.stage_timer import stage
+from app.template_cache import TEMPLATE_CACHE, load_template, seed_template_cache, template_max_row
+from app.xlsx_utils import TrimPlan, write_series
+from app.xml_engine import SheetPatch
 
-def clear_last_row_formulas_lunar(ws, last_data_row):
-    """
-    Elimină formulele din coloanele specifice pentru ultimul rând generat 
-    pentru date lunare (1M).
-    """
-    columns_to_clear = ["J", "K", "L", "M", "N", "O", "W", "X", "Y", "Z", "AA", "AB"]
-    for col in columns_to_clear:
-        ws[f"{col}{last_data_row}"].value = None
+# Versiunea rezultatului (intră în cheia cache-ului de rezultate); se schimbă
+# la orice modificare a scriptului care schimbă fișierele XLSX generate
+PIPELINE_VERSION = "realgdpqy-2"
+
+# Coloanele cu formule golite pe ultimul rând de date lunare (1M)
+LUNAR_FORMULA_COLUMNS = ["J", "K", "L", "M", "N", "O", "W", "X", "Y", "Z", "AA", "AB"]
 
-def remove_extra_rows(ws, num_rows):
+# Coloanele cu formule ale template-ului, calculate cu NumPy în modul „doar valori”
+# (vezi app/derived_columns.py); verificate cu: python -m app.derived_columns REALGDPQY
+DERIVED_COLUMNS = [
+    # Variația față de trimestrul anterior
+    ("C", 3, PctChange("B")),
+    ("D", 3, Asinh("C")),
+    ("E", 10, ZScore("D", length=8)),
+    ("F", 4, ZScore("D", anchor=3)),
+    ("G", 10, Stdev("D", 8)),
+    ("H", 17, ZScore("G", length=8)),
+    ("I", 11, ZScore("G", anchor=10)),
+    ("J", 3, Lead("C")),
+    ("K", 10, Correl("D", "J", 8)),
+    ("L", 17, ZScore("K", length=8)),
+    ("M", 11, ZScore("K", anchor=10)),
+    ("N", 18, Mean("E", "H", "L")),
+    ("O", 18, Mean("F", "I", "M")),
+    # Variația față de același trimestru de anul trecut
+    ("P", 6, PctChange("B", 4)),
+    ("Q", 6, Asinh("P")),
+    ("R", 10, ZScore("Q", length=5)),
+    ("S", 7, ZScore("Q", anchor=6)),
+    ("T", 10, Stdev("Q", 5)),
+    ("U", 14, ZScore("T", length=5)),
+    ("V", 11, ZScore("T", anchor=10)),
+    ("W", 6, Lead("Q")),
+    ("X", 10, Correl("Q", "W", 5)),
+    ("Y", 14, ZScore("X", length=5)),
+    ("Z", 11, ZScore("X", anchor=10)),
+    ("AA", 14, Mean("R", "U", "Y")),
+    ("AB", 14, Mean("S", "V", "Z")),
+]
+
+def process_file(csv_file, csv_folder, template_path, output_folder, engine="openpyxl", values_only=False):
     """
-    Elimină rândurile în plus din fișierul Excel dacă sunt mai multe decât 
-    în fișierul CSV 1M (num_rows).
+    Procesează un fișier CSV și salvează fișierul XLSX rezultat.
+    engine: "openpyxl" (implicit), "xml" (rescrie direct XML-ul template-ului) sau
+    "stream" (ca "xml", cu CSV-ul citit în bucăți, pentru istoricele foarte lungi).
+    values_only: formulele sunt înlocuite cu valorile lor (vezi app/derived_columns.py).
+    Returnează mesajul pentru log (succes sau eroare).
     """
-    max_existing_rows = ws.max_row
-    if max_existing_rows > num_rows + 1:
-        ws.delete_rows(num_rows + 2, max_existing_rows - num_rows - 1)
+    base_name = os.path.splitext(csv_file)[0]  # Scoatem extensia
+    csv_path = os.path.join(csv_folder, csv_file)
+
+    try:
+        if engine == "stream":
+            # Ca motorul "xml", dar CSV-ul este citit în bucăți abia la scrierea foii:
+            # memoria nu crește cu lungimea istoricului
+            if values_only:
+                raise ValueError("modul „doar valori” are nevoie de coloanele întregi, nu merge cu motorul stream")
+            with stage("read_csv"):
+                source = ChunkedTvCsv(csv_path)
+            num_rows = len(source)
+            with stage("write"):
+                patch = SheetPatch(title=base_name)
+                patch.stream_series(source, date_column=1, value_column=2)
+                patch.truncate(num_rows + 1)
+                patch.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+            with stage("save"):
+                patch.save(template_path, os.path.join(output_folder, f"{base_name}.xlsx"))
+            return f"✔ Fișier completat: {base_name}.xlsx"
+
+        # Citește datele din CSV
+        with stage("read_csv"):
+            dates, values = read_tv_csv(csv_path)
+        num_rows = len(dates)
+        output_file = os.path.join(output_folder, f"{base_name}.xlsx")
+
+        # Coloanele din CSV citite de formule (pentru modul „doar valori”)
+        data = {"B": values}
+
+        if engine == "xml":
+            # Aceiași pași ca mai jos, aplicați direct pe XML-ul template-ului
+            with stage("write"):
+                patch = SheetPatch(title=base_name)
+                patch.write_series(dates, values, date_column=1, value_column=2)
+                patch.truncate(num_rows + 1)
+                patch.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+            if values_only:
+                with stage("derived"):
+                    fill_patch(patch, template_path, DERIVED_COLUMNS, data)
+            with stage("save"):
+                patch.save(template_path, output_file)
+            return f"✔ Fișier completat: {base_name}.xlsx"
+
+        # Încarcă șablonul Excel (din cache, parsat o singură dată per proces)
+        with stage("load_template"):
+            wb = load_template(template_path)
+        ws = wb.active
+
+        # Redenumește foaia de lucru
+        ws.title = base_name
+
+        with stage("write"):
+            # Inserăm datele în coloanele A (data) și B (valoare) ale fișierului Excel
+            write_series(ws, dates, values, date_column=1, value_column=2)
+
+        # Eliminăm rândurile și formulele în plus, într-o singură trecere (vezi xlsx_utils.TrimPlan)
+        with stage("trim"):
+            plan = TrimPlan(template_max_row(template_path))
+            plan.truncate(num_rows + 1)
+            plan.clear(LUNAR_FORMULA_COLUMNS, num_rows + 1, num_rows + 1)
+            plan.apply(ws)
+
+        # Modul „doar valori”: formulele rămase sunt înlocuite cu valorile calculate
+        if values_only:
+            with stage("derived"):
+                fill_sheet(ws, template_path, DERIVED_COLUMNS, data, num_rows + 1)
+
+        # Salvează fișierul XLSX rezultat
+        with stage("save"):
+            wb.save(output_file)
 
+        msg_ok = f"✔ Fișier completat: {base_name}.xlsx"
+        return msg_ok
 
+    except Exception as e:
+        # Dacă apare vreo eroare la procesare, o logăm și continuăm
+        error_msg = f"Eroare la procesarea '{base_name}': {e}"
+        return error_msg
 
-def process_csv_to_xlsx(csv_folder, template_path, output_folder, log_file="process_log.txt"):
+def process_csv_to_xlsx(csv_folder, template_path, output_folder, log_file="process_log.txt", parallel=False,
+                        engine="openpyxl", workbook=None, values_only=False):
     """
     Completează template.xlsx cu datele din fișierele CSV,
     fără a modifica structura acestuia. 
     Scrie log-uri în 'log_file'.
+    Cu parallel=True, fișierele sunt procesate pe mai multe procese
+    (log-urile rămân în aceeași ordine).
+    engine: "openpyxl", "xml" sau "stream" (vezi app/xml_engine.py).
+    Cu 'workbook' (nume de fișier), rezultatele sunt combinate la final într-un
+    singur fișier cu o foaie per simbol (vezi app/combined_workbook.py).
+    Cu values_only=True, coloanele cu formule conțin valorile calculate, nu formulele.
     """
-    csv_files = [f for f in os.listdir(csv_folder) if f.endswith(".csv")]
-    
-    # Creăm folderul de output dacă nu există
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    
-    # Log: începem procesarea
-    log_processing_info(log_file, f"Start procesare fișiere'")
-    
-    for csv_file in csv_files:
-        base_name = os.path.splitext(csv_file)[0]  # Scoatem extensia
-        csv_path = os.path.join(csv_folder, csv_file)
-        
-        try:
-            # Încarcă șablonul Excel
-            wb = load_workbook(template_path)
-            ws = wb.active
-            
-            # Redenumește foaia de lucru
-            ws.title = base_name
-            
-            # Citește datele din CSV-uri
-            df = pd.read_csv(csv_path)
-            num_rows = len(df)
-            
-            # Inserăm datele în coloanele A și B ale fișierului Excel
-            for index, row in df.iterrows():
-                ws.cell(row=index+2, column=1, value=row.iloc[0])  # Data CSV
-                ws.cell(row=index+2, column=2, value=row.iloc[1])  # Valoare CSV
-            
-            # Eliminăm rândurile și formulele în plus
-            remove_extra_rows(ws, num_rows)
-            clear_last_row_formulas_lunar(ws, num_rows + 1)
-            
-            # Salvează fișierul XLSX rezultat
-            output_file = os.path.join(output_folder, f"{base_name}.xlsx")
-            wb.save(output_file)
-            
-            msg_ok = f"✔ Fișier completat: {base_name}.xlsx"
-            print(msg_ok)
-            log_processing_info(log_file, msg_ok)
-        
-        except Exception as e:
-            # Dacă apare vreo eroare la procesare, o logăm și continuăm
-            error_msg = f"Eroare la procesarea '{base_name}': {e}"
-            print(error_msg)
-            log_processing_info(log_file, error_msg)
-    
-    # Log: finalizare
-    log_processing_info(log_file, "Final procesare fișiere.")
+    with ProcessLog(log_file) as log:
+        csv_files = [f for f in os.listdir(csv_folder) if f.endswith(".csv")]
+
+        # Creăm folderul de output dacă nu există
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+        # Fișierul combinat al unei rulări anterioare nu mai corespunde rezultatelor noi
+        remove_combined_outputs(output_folder, workbook)
+
+        # Log: începem procesarea
+        log.write(f"Start procesare fișiere'")
+
+        tasks = [(csv_file, csv_folder, template_path, output_folder, engine, values_only) for csv_file in csv_files]
+        # Fișierele generate deja din aceleași date și același template vin din cache
+        entries = [(RESULT_CACHE.key(PIPELINE_VERSION, engine, template_path, os.path.splitext(csv_file)[0],
+                                     {"csv": os.path.join(csv_folder, csv_file)},
+                                     values_only=values_only),
+                    os.path.join(output_folder, f"{os.path.splitext(csv_file)[0]}.xlsx"))
+                   for csv_file in csv_files]
+        # În modul paralel, template-ul este parsat o singură dată aici și trimis proceselor copil
+        initargs = (TEMPLATE_CACHE.export(template_path),) if parallel and engine == "openpyxl" else ()
+        for message in run_cached_tasks(process_file, tasks, entries, parallel=parallel,
+                                        initializer=seed_template_cache, initargs=initargs):
+            print(message)
+            log.write(message)
+
+        if workbook:
+            combine_outputs([output_file for _, output_file in entries], os.path.join(output_folder, workbook), log)
+
+        # Log: finalizare
+        log.write("Final procesare fișiere.")
+
 
 # ------------------------------------------------
 # EXEMPLU de utilizare (script standalone):
@@ -122,6 +221,28 @@ if __name__ == "__main__":
         default=None,
         help="Numele/locația fișierului de log."
     )
+    parser.add_argument(
+        "--engine",
+        choices=["openpyxl", "xml", "stream"],
+        default=os.getenv("ENGINE", "openpyxl"),
+        help="Motorul de generare XLSX: openpyxl (implicit), xml sau stream (memorie constantă)."
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Procesează fișierele în paralel, pe mai multe procese."
+    )
+    parser.add_argument(
+        "--workbook",
+        type=str,
+        default=None,
+        help="Combină rezultatele într-un singur fișier XLSX cu acest nume (o foaie per simbol)."
+    )
+    parser.add_argument(
+        "--values-only",
+        action="store_true",
+        help="Scrie valorile calculate în locul formulelor (fișiere citibile direct, ex: cu pandas)."
+    )
     args = parser.parse_args()
 
     # 2) Preia și din variabile de mediu (dacă nu vin din CLI):
@@ -156,5 +277,9 @@ if __name__ == "__main__":
         csv_folder=csv_folder,
         template_path=template_path,
         output_folder=output_folder,
-        log_file=log_file
+        log_file=log_file,
+        parallel=args.parallel,
+        engine=args.engine,
+        workbook=args.workbook,
+        values_only=args.values_only
     )
\ No newline at end of file
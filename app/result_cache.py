@@ -0,0 +1,270 @@
+"""
+Cache global pentru fișierele XLSX generate, adresat după conținut.
+
+Utilizatorii reîncarcă des aceleași exporturi TradingView și repornesc /process/.
+Cheia unui rezultat este hash-ul SHA-256 al:
+ - conținutului CSV-urilor de intrare,
+ - conținutului template-ului,
+ - versiunii pipeline-ului și motorului de generare,
+ - numelui simbolului (devine numele foii și al fișierului).
+La hit, fișierul din cache este legat (hard link) sau copiat în output-ul
+sesiunii, fără regenerare. Hash-ul CSV-urilor încărcate prin /upload/ este
+calculat o singură dată, la încărcare, și citit din sidecar (app/csv_reader.py).
+
+Cache-ul este limitat ca dimensiune; la depășire sunt șterse intrările folosite
+cel mai demult (LRU, după mtime - actualizat la fiecare hit).
+
+Configurare (variabile de mediu):
+ - RESULT_CACHE_DIR    : folderul cache-ului (implicit cache/results)
+ - RESULT_CACHE_MAX_MB : dimensiunea maximă în MB (0 = cache dezactivat)
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from app import progress
+from app.csv_reader import source_sha256
+from app.parallel import run_tasks
+from app.template_cache import file_sha256
+
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join("cache", "results"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+
+# Se incrementează când se schimbă formatul cheii sau al intrărilor
+CACHE_FORMAT = 1
+
+
+class ResultCache:
+    """
+    Cache {cheie -> fișier XLSX} pe disc, partajat de toate procesele.
+    """
+
+    def __init__(self, folder=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hashes = {}  # {cale absolută: ((mtime_ns, size), sha256)}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def file_hash(self, path):
+        """
+        SHA-256 al unui fișier, memorat cât timp fișierul nu se schimbă.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        sha256 = file_sha256(path)
+        with self._lock:
+            self._hashes[path] = (signature, sha256)
+        return sha256
+
+    def key(self, pipeline_version, engine, template_path, base_name, inputs, values_only=False):
+        """
+        Cheia rezultatului pentru un simbol.
+        - inputs      : {rol: cale CSV} (ex: {"1M": ..., "3M": ...})
+        - values_only : fișierul are valori în locul formulelor (alt rezultat, altă cheie)
+        Se calculează și cu cache-ul dezactivat: identifică rezultatul și în
+        checkpoint-ul conversiei în masă (vezi app/batch.py).
+        """
+        digest = hashlib.sha256()
+        parts = [str(CACHE_FORMAT), pipeline_version, engine, self.file_hash(template_path), base_name]
+        parts += [f"{role}={source_sha256(path) or self.file_hash(path)}" for role, path in sorted(inputs.items())]
+        if values_only:
+            parts.append("values")
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.xlsx")
+
+    def restore(self, key, output_file):
+        """
+        Pune rezultatul din cache la 'output_file'. Returnează True la hit.
+        Fișierul de output existent este șters în ambele cazuri: poate fi un
+        hard link către o intrare din cache, care nu trebuie suprascrisă pe loc.
+        """
+        if os.path.lexists(output_file):
+            os.unlink(output_file)
+        if key is None or not self.enabled:
+            return False
+
+        entry = self._path(key)
+        try:
+            _link_or_copy(entry, output_file)
+            os.utime(entry)  # marcăm intrarea ca folosită recent (LRU)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, output_file):
+        """
+        Adaugă în cache fișierul generat și aplică limita de dimensiune.
+        """
+        if key is None or not self.enabled or not os.path.exists(output_file):
+            return
+        entry = self._path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Scriem sub un nume temporar și redenumim atomic: alte procese
+        # nu văd niciodată o intrare incompletă
+        temp = f"{entry}.{uuid.uuid4().hex}.tmp"
+        _link_or_copy(output_file, temp)
+        os.utime(temp)  # un hard link păstrează mtime-ul fișierului; LRU pornește de acum
+        os.replace(temp, entry)
+        with self._lock:
+            self.stores += 1
+        self._evict()
+
+    def _entries(self):
+        """
+        Intrările din cache: listă de (mtime, size, cale).
+        """
+        entries = []
+        if not os.path.isdir(self.folder):
+            return entries
+        for shard in os.scandir(self.folder):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                if item.name.endswith(".xlsx"):
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        return entries
+
+    def _evict(self):
+        """
+        Șterge intrările folosite cel mai demult până când cache-ul încape în limită.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def usage(self):
+        """
+        Ocuparea curentă a cache-ului pe disc.
+        """
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+def _link_or_copy(source, target):
+    """
+    Hard link dacă se poate (același sistem de fișiere), altfel copie.
+    """
+    try:
+        os.link(source, target)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+# Cache-ul procesului curent (intrările de pe disc sunt comune tuturor proceselor)
+RESULT_CACHE = ResultCache()
+
+# Cheile simbolurilor deja generate în rularea anterioară a unei conversii în masă
+# (checkpoint-ul din app/batch.py); setate pentru job-ul curent al procesului
+_completed = frozenset()
+
+
+def set_completed(keys):
+    """
+    Simbolurile cu aceste chei, al căror fișier de output există deja, nu mai sunt generate.
+    """
+    global _completed
+    _completed = frozenset(keys or ())
+
+
+# Marcajul simbolurilor sărite datorită checkpoint-ului (în locul lui True / False de la restore)
+CHECKPOINT = "checkpoint"
+
+
+def run_cached_tasks(func, tasks, entries, **kwargs):
+    """
+    Ca run_tasks(), dar sare peste task-urile al căror rezultat este deja în cache.
+    - entries : pentru fiecare task, (cheie, fișier de output)
+    Rezultatele (mesajele de log) sunt produse tot în ordinea task-urilor.
+    Pentru fiecare simbol se emit evenimente de progres (vezi app/progress.py);
+    în modul paralel, durata este timpul de așteptare după rezultatul simbolului.
+    Simbolurile din checkpoint (set_completed) cu output-ul deja scris sunt sărite.
+    """
+    hits = [
+        CHECKPOINT if key in _completed and os.path.exists(output_file) else RESULT_CACHE.restore(key, output_file)
+        for key, output_file in entries
+    ]
+    pending = [task for task, hit in zip(tasks, hits) if not hit]
+    results = run_tasks(func, pending, **kwargs)
+
+    total = len(entries)
+    for index, ((key, output_file), hit) in enumerate(zip(entries, hits), start=1):
+        file_name = os.path.basename(output_file)
+        symbol = os.path.splitext(file_name)[0]
+        if hit == CHECKPOINT:
+            message = f"✔ Fișier completat: {file_name} (generat anterior)"
+            progress.emit(progress.SKIPPED, symbol=symbol, index=index, total=total,
+                          reason="checkpoint", key=key, message=message)
+            yield message
+            continue
+        if hit:
+            message = f"✔ Fișier completat: {file_name} (din cache)"
+            progress.emit(progress.SKIPPED, symbol=symbol, index=index, total=total,
+                          reason="cache", key=key, message=message)
+            yield message
+            continue
+
+        progress.emit(progress.STARTED, symbol=symbol, index=index, total=total)
+        start = time.perf_counter()
+        message = next(results)
+        seconds = round(time.perf_counter() - start, 3)
+        if message.startswith("Eroare"):
+            progress.emit(progress.ERROR, symbol=symbol, index=index, total=total,
+                          seconds=seconds, message=message)
+        else:
+            RESULT_CACHE.store(key, output_file)
+            progress.emit(progress.WRITTEN, symbol=symbol, index=index, total=total,
+                          seconds=seconds, key=key, message=message)
+        yield message
@@ -0,0 +1,277 @@
+"""
+Curățarea periodică a folderului sessions/.
+
+Un thread de fundal parcurge periodic folderele sesiunilor și:
+ - șterge folderele sesiunilor expirate (sesiunea nu mai există în store și
+   nu a mai fost folosită de SESSION_TTL_HOURS),
+ - dacă spațiul total depășește SESSIONS_MAX_MB, șterge sesiunile folosite
+   cel mai demult (LRU după ultima accesare), până sub limită,
+ - șterge resturile rămase de la încărcări (folderele '*.old-*', vezi
+   app/uploads.py) și de la curățările anterioare.
+Sesiunile cu un job de procesare activ nu sunt atinse. Un folder este întâi
+redenumit (operație instantanee, sesiunea dispare imediat) și abia apoi șters.
+
+La fiecare parcurgere sunt recalculate contoarele (sesiuni, octeți, fișiere),
+păstrate în memorie: /user_count și /stats/ le citesc fără să parcurgă discul.
+Între parcurgeri, contoarele sunt ajustate incremental prin track(): după o
+încărcare, o ștergere sau un job terminat se măsoară doar intrările atinse ale
+sesiunii (csv/, output/, process_log.txt) și se înlocuiește contribuția lor anterioară.
+
+Configurare (variabile de mediu):
+ - JANITOR_INTERVAL : la câte secunde rulează curățarea (implicit 300; 0 = dezactivată)
+ - SESSIONS_MAX_MB  : spațiul maxim ocupat de sessions/ (implicit 2048; 0 = fără limită)
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+
+JANITOR_INTERVAL = int(os.getenv("JANITOR_INTERVAL", "300"))
+SESSIONS_MAX_MB = int(os.getenv("SESSIONS_MAX_MB", "2048"))
+
+# Prefixul folderelor redenumite înainte de ștergere
+TRASH_PREFIX = ".trash-"
+# Marcajul folderelor mutate deoparte la încărcare (detach_folder)
+DETACHED_MARKER = ".old-"
+
+
+def _folder_usage(path):
+    """
+    (octeți, fișiere, ultima modificare) pentru un folder, recursiv.
+    """
+    size = files = 0
+    latest = 0.0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            size += stat.st_size
+            files += 1
+            latest = max(latest, stat.st_mtime)
+    return size, files, latest
+
+
+def _entry_usage(path):
+    """
+    (octeți, fișiere, ultima modificare) pentru un folder sau un fișier; (0, 0, 0) dacă lipsește.
+    """
+    try:
+        stat = os.stat(path, follow_symlinks=False)
+    except OSError:
+        return 0, 0, 0.0
+    if os.path.isdir(path) and not os.path.islink(path):
+        return _folder_usage(path)
+    return stat.st_size, 1, stat.st_mtime
+
+
+def _session_usage(path):
+    """
+    Ca _folder_usage pentru folderul unei sesiuni, plus {nume: (octeți, fișiere)} pentru
+    fiecare intrare a lui (baza pentru track()), într-o singură parcurgere.
+    """
+    size = files = 0
+    latest = 0.0
+    folders = {}
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return size, files, latest, folders
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                usage = _folder_usage(entry.path)
+            else:
+                stat = entry.stat(follow_symlinks=False)
+                usage = (stat.st_size, 1, stat.st_mtime)
+        except OSError:
+            continue
+        if DETACHED_MARKER not in entry.name:
+            folders[entry.name] = usage[:2]
+        size += usage[0]
+        files += usage[1]
+        latest = max(latest, usage[2])
+    return size, files, latest, folders
+
+
+def remove_tree(path, trash_root):
+    """
+    Redenumește 'path' în 'trash_root' (instantaneu) și apoi îl șterge.
+    """
+    trash = os.path.join(trash_root, f"{TRASH_PREFIX}{uuid.uuid4().hex}")
+    try:
+        os.rename(path, trash)
+    except OSError:
+        trash = path  # ex: alt sistem de fișiere; ștergem pe loc
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+class SessionJanitor:
+    """
+    Curățarea folderelor de sesiune, cu contoare de utilizare ținute în memorie.
+    - store   : store-ul de sesiuni (vezi app/session_store.py)
+    - is_busy : funcție session_id -> True dacă sesiunea are un job activ
+    """
+
+    def __init__(self, root, store, ttl, is_busy=lambda session_id: False,
+                 max_bytes=SESSIONS_MAX_MB * 1024 * 1024, interval=JANITOR_INTERVAL):
+        self.root = str(root)
+        self.store = store
+        self.ttl = ttl
+        self.is_busy = is_busy
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._known = set()  # sesiunile cu folder pe disc, la ultima parcurgere (+ cele noi)
+        self._usage = {}     # {session_id: {intrare: (octeți, fișiere)}} pentru track()
+        self._counters = {"sessions": 0, "bytes": 0, "files": 0, "removed": 0, "freed_bytes": 0,
+                          "last_run": None}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def track(self, session_id, *paths):
+        """
+        Înregistrează pe loc o sesiune nouă cu folder (fără să aștepte următoarea parcurgere)
+        și actualizează contoarele cu dimensiunea actuală a intrărilor date ale sesiunii
+        (ex: csv/ după încărcare, output/ după procesare), în locul celei măsurate anterior.
+        """
+        measured = {os.path.basename(str(path)): _entry_usage(str(path))[:2] for path in paths}
+        with self._lock:
+            if session_id not in self._known:
+                self._known.add(session_id)
+                self._counters["sessions"] += 1
+            usage = self._usage.setdefault(session_id, {})
+            for name, (size, files) in measured.items():
+                old_size, old_files = usage.get(name, (0, 0))
+                usage[name] = (size, files)
+                self._counters["bytes"] += size - old_size
+                self._counters["files"] += files - old_files
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def _scan(self):
+        """
+        Folderele de sesiune cu utilizarea lor și resturile de șters.
+        """
+        sessions = {}
+        leftovers = []
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return sessions, leftovers
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            if entry.name.startswith(TRASH_PREFIX):
+                leftovers.append(entry.path)
+                continue
+            size, files, latest, folders = _session_usage(entry.path)
+            # Folderele detașate la încărcare, rămase neșterse (ex: oprirea serverului)
+            try:
+                leftovers.extend(child.path for child in os.scandir(entry.path)
+                                 if DETACHED_MARKER in child.name and child.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+            sessions[entry.name] = {"bytes": size, "files": files, "modified": latest,
+                                    "folders": folders}
+        return sessions, leftovers
+
+    def run_once(self, now=None, clean=True):
+        """
+        O parcurgere completă: curăță (dacă 'clean') și recalculează contoarele.
+        Returnează {"removed": sesiuni șterse, "freed_bytes": octeți eliberați}.
+        """
+        now = now or time.time()
+        sessions, leftovers = self._scan()
+        live = self.store.sessions()
+        if not clean:
+            leftovers = []
+
+        for path in leftovers:
+            if not os.path.basename(path).startswith(TRASH_PREFIX):
+                size, files, _ = _folder_usage(path)
+                session = sessions.get(os.path.basename(os.path.dirname(path)))
+                if session is not None:
+                    session["bytes"] -= size
+                    session["files"] -= files
+            remove_tree(path, self.root)
+
+        # Ultima accesare: din store (sesiuni active), altfel ultima modificare pe disc
+        for session_id, usage in sessions.items():
+            record = live.get(session_id)
+            usage["accessed"] = max(record["accessed"], usage["modified"]) if record else usage["modified"]
+            usage["live"] = record is not None
+
+        removable = sorted(
+            (session_id for session_id in sessions if clean and not self.is_busy(session_id)),
+            key=lambda session_id: sessions[session_id]["accessed"],
+        )
+        evict = [session_id for session_id in removable
+                 if not sessions[session_id]["live"] and now - sessions[session_id]["accessed"] > self.ttl]
+        total = sum(usage["bytes"] for usage in sessions.values())
+        remaining = total - sum(sessions[session_id]["bytes"] for session_id in evict)
+        if self.max_bytes:
+            for session_id in removable:
+                if remaining <= self.max_bytes:
+                    break
+                if session_id not in evict:
+                    evict.append(session_id)
+                    remaining -= sessions[session_id]["bytes"]
+
+        freed = 0
+        for session_id in evict:
+            remove_tree(os.path.join(self.root, session_id), self.root)
+            freed += sessions.pop(session_id)["bytes"]
+
+        with self._lock:
+            self._known = set(sessions)
+            self._usage = {session_id: usage["folders"] for session_id, usage in sessions.items()}
+            self._counters.update(
+                sessions=len(sessions),
+                bytes=sum(usage["bytes"] for usage in sessions.values()),
+                files=sum(usage["files"] for usage in sessions.values()),
+                removed=self._counters["removed"] + len(evict),
+                freed_bytes=self._counters["freed_bytes"] + freed,
+                last_run=now,
+            )
+        return {"removed": len(evict), "freed_bytes": freed}
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Eroare la curățarea sesiunilor: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        """
+        Pornește thread-ul de curățare (prima parcurgere rulează imediat).
+        Cu interval 0 (curățare dezactivată), doar calculează contoarele o dată.
+        """
+        if self.interval <= 0:
+            self.run_once(clean=False)
+            return
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="session-janitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,212 @@
+"""
+Stocarea sesiunilor utilizatorilor (în locul dicționarelor SESSIONS și
+USER_SELECTED_FILE_TYPE din main.py), cu expirare (TTL).
+
+Pentru fiecare session_id se păstrează:
+ - created   : momentul creării (sesiunea expiră după SESSION_TTL_HOURS)
+ - accessed  : ultima cerere (pentru evicția LRU)
+ - file_type : tipul de fișier selectat la încărcare (PPI, CPI etc.)
+
+Backend-uri:
+ - "memory" : dicționar LRU în proces, limitat la SESSION_MAX sesiuni
+              (un singur proces uvicorn)
+ - "sqlite" : fișier SQLite local, comun tuturor proceselor
+              (uvicorn --workers N pe același port, împreună cu JOB_BACKEND=queue)
+Sesiunile expirate sunt șterse periodic (cel mult o dată la PURGE_INTERVAL
+secunde), nu doar când cookie-ul expirat revine.
+
+Configurare (variabile de mediu):
+ - SESSION_BACKEND   : "memory" (implicit) sau "sqlite"
+ - SESSION_DB        : fișierul SQLite (implicit cache/sessions.db)
+ - SESSION_TTL_HOURS : durata unei sesiuni (implicit 8)
+ - SESSION_MAX       : numărul maxim de sesiuni în memorie (implicit 10000)
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB = os.getenv("SESSION_DB", "cache/sessions.db")
+SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "8"))
+SESSION_TTL = SESSION_TTL_HOURS * 3600
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+
+# La câte secunde sunt șterse sesiunile expirate
+PURGE_INTERVAL = 60
+# 'accessed' se actualizează în SQLite doar dacă e mai vechi de atât (evită o scriere la fiecare cerere)
+ACCESS_RESOLUTION = 60
+
+
+class MemorySessionStore:
+    """
+    Sesiuni într-un OrderedDict (ordinea = ultima accesare), cu TTL și limită LRU.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # {session_id: {"created", "accessed", "file_type"}}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def get(self, session_id, now=None):
+        """
+        Sesiunea (dict cu created / accessed / file_type) sau None dacă nu există ori a expirat.
+        """
+        now = now or time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if now - session["created"] > self.ttl:
+                del self._sessions[session_id]
+                return None
+            session["accessed"] = now
+            self._sessions.move_to_end(session_id)
+            return dict(session)
+
+    def create(self, session_id, now=None):
+        """
+        Creează (sau recreează) sesiunea și o returnează.
+        """
+        now = now or time.time()
+        self.purge_expired(now)
+        session = {"created": now, "accessed": now, "file_type": None}
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return dict(session)
+
+    def set_file_type(self, session_id, file_type):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session["file_type"] = file_type
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self, now=None, force=False):
+        """
+        Șterge sesiunile expirate (cel mult o dată la PURGE_INTERVAL secunde, dacă nu e 'force').
+        Returnează numărul de sesiuni șterse.
+        """
+        now = now or time.time()
+        with self._lock:
+            if not force and now - self._last_purge < PURGE_INTERVAL:
+                return 0
+            self._last_purge = now
+            expired = [sid for sid, s in self._sessions.items() if now - s["created"] > self.ttl]
+            for session_id in expired:
+                del self._sessions[session_id]
+        return len(expired)
+
+    def sessions(self):
+        """
+        Toate sesiunile active: {session_id: dict}.
+        """
+        now = time.time()
+        with self._lock:
+            return {sid: dict(s) for sid, s in self._sessions.items() if now - s["created"] <= self.ttl}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """
+    Sesiuni într-un fișier SQLite, comun mai multor procese. Fiecare thread
+    are propria conexiune; modul WAL permite citiri simultane cu o scriere.
+    """
+
+    def __init__(self, path=SESSION_DB, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY, created REAL NOT NULL, accessed REAL NOT NULL, file_type TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_created ON sessions (created)")
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    def get(self, session_id, now=None):
+        now = now or time.time()
+        db = self._connection()
+        row = db.execute(
+            "SELECT created, accessed, file_type FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if now - row["created"] > self.ttl:
+            db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            return None
+        session = dict(row)
+        if now - session["accessed"] > ACCESS_RESOLUTION:
+            db.execute("UPDATE sessions SET accessed = ? WHERE id = ?", (now, session_id))
+            session["accessed"] = now
+        return session
+
+    def create(self, session_id, now=None):
+        now = now or time.time()
+        self.purge_expired(now)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO sessions (id, created, accessed, file_type) VALUES (?, ?, ?, NULL)",
+            (session_id, now, now),
+        )
+        return {"created": now, "accessed": now, "file_type": None}
+
+    def set_file_type(self, session_id, file_type):
+        self._connection().execute("UPDATE sessions SET file_type = ? WHERE id = ?", (file_type, session_id))
+
+    def delete(self, session_id):
+        self._connection().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge_expired(self, now=None, force=False):
+        now = now or time.time()
+        if not force and now - self._last_purge < PURGE_INTERVAL:
+            return 0
+        self._last_purge = now
+        cursor = self._connection().execute("DELETE FROM sessions WHERE created < ?", (now - self.ttl,))
+        return cursor.rowcount
+
+    def sessions(self):
+        rows = self._connection().execute(
+            "SELECT id, created, accessed, file_type FROM sessions WHERE created >= ?",
+            (time.time() - self.ttl,),
+        ).fetchall()
+        return {row["id"]: {key: row[key] for key in ("created", "accessed", "file_type")} for row in rows}
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store(backend=SESSION_BACKEND):
+    """
+    Backend-ul de sesiuni configurat prin SESSION_BACKEND.
+    """
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    raise ValueError(f"SESSION_BACKEND necunoscut: {backend!r} (memory / sqlite)")
@@ -0,0 +1,43 @@
+"""
+Măsurarea duratei etapelor de procesare (citire CSV, template, scriere, salvare).
+
+Scripturile marchează etapele cu `with stage("nume"):`; timpii se adună per
+proces și sunt citiți de benchmark (bench/run.py). Costul este neglijabil
+(două apeluri perf_counter per etapă), așa că măsurarea este mereu activă.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_totals = {}  # {etapă: [secunde, apeluri]}
+
+
+@contextmanager
+def stage(name):
+    """
+    Adună durata blocului 'with' la etapa 'name'.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            total = _totals.setdefault(name, [0.0, 0])
+            total[0] += elapsed
+            total[1] += 1
+
+
+def stage_times():
+    """
+    Timpii adunați până acum: {etapă: {"seconds": ..., "calls": ...}}.
+    """
+    with _lock:
+        return {name: {"seconds": round(seconds, 6), "calls": calls}
+                for name, (seconds, calls) in _totals.items()}
+
+
+def reset_stage_times():
+    with _lock:
+        _totals.clear()
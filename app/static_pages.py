@@ -0,0 +1,107 @@
+"""
+Paginile HTML din static/ (/, /main, /instructions, /sidebar), servite din memorie.
+
+La pornire, fiecare pagină este citită o singură dată și comprimată (gzip și,
+dacă modulul 'brotli' este instalat, brotli). Răspunsul folosește varianta
+acceptată de browser (Accept-Encoding), cu un ETag puternic (hash-ul
+conținutului) și Cache-Control. Cererile condiționate (If-None-Match) primesc
+304 fără acces la disc.
+
+Paginile se reîncarcă doar la repornirea aplicației.
+
+Configurare (variabile de mediu):
+ - STATIC_MAX_AGE : câte secunde poate browserul folosi pagina fără revalidare
+                    (implicit 0 = revalidare la fiecare cerere, cu 304 dacă nu s-a schimbat)
+"""
+import gzip
+import hashlib
+import os
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli este opțional
+    brotli = None
+
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "0"))
+
+# Ordinea de preferință a codificărilor (cea mai compactă prima)
+ENCODINGS = ("br", "gzip")
+
+
+def _accepted_encodings(header):
+    """
+    Codificările acceptate din antetul Accept-Encoding (fără cele cu q=0).
+    """
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if name and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.lower())
+    return accepted
+
+
+class StaticPage:
+    """
+    O pagină HTML în memorie: conținutul, variantele comprimate și ETag-urile lor.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.body = f.read()
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        # {codificare: (conținut, etag)}; None = necomprimat
+        self.variants = {None: (self.body, f'"{digest}"')}
+        self.variants["gzip"] = (gzip.compress(self.body, compresslevel=9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(self.body, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def matches(self, if_none_match):
+        """
+        True dacă If-None-Match conține ETag-ul oricărei variante a paginii.
+        """
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return not tags.isdisjoint(self.etags)
+
+
+class StaticPages:
+    """
+    Paginile din 'folder', încărcate la pornire, servite cu compresie, ETag și 304.
+    """
+
+    def __init__(self, folder, names, max_age=STATIC_MAX_AGE):
+        self.folder = folder
+        self.names = names
+        self.cache_control = f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+        self._pages = {}
+
+    def load(self):
+        self._pages = {name: StaticPage(os.path.join(self.folder, name)) for name in self.names}
+
+    def response(self, name, request):
+        """
+        Răspunsul pentru pagina 'name': 304 dacă browserul o are deja, altfel
+        varianta comprimată acceptată de browser.
+        """
+        page = self._pages.get(name)
+        if page is None:
+            # Pagina nu a fost preîncărcată (ex: aplicația folosită fără evenimentul de startup)
+            page = self._pages[name] = StaticPage(os.path.join(self.folder, name))
+
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((enc for enc in ENCODINGS if enc in accepted and enc in page.variants), None)
+        body, etag = page.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+
+        if page.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="text/html", headers=headers)
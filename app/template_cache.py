@@ -0,0 +1,142 @@
+"""
+Cache pentru template-urile XLSX deja parsate.
+
+load_workbook(template_path) pe template.xlsx (1 MB, mii de formule) durează
+câteva secunde; îl parsăm o singură dată per proces și păstrăm workbook-ul
+serializat cu pickle. Fiecare fișier de output primește o copie independentă
+(pickle.loads), mult mai ieftină decât reparsarea XML-ului. Tot aici se păstrează
+ultimul rând al foii active, folosit la trunchierea fișierelor generate (xlsx_utils.TrimPlan).
+
+Intrarea din cache este invalidată când se schimbă fișierul template
+(mtime/dimensiune, confirmat prin hash SHA-256 al conținutului).
+"""
+import hashlib
+import os
+import pickle
+import threading
+
+from openpyxl import load_workbook
+
+
+def file_sha256(path):
+    """
+    Hash SHA-256 al conținutului unui fișier, citit în bucăți.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TemplateCache:
+    """
+    Cache {cale template -> workbook serializat}, cu contoare hit/miss.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _entry(self, template_path):
+        key = os.path.abspath(template_path)
+        stat = os.stat(key)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["signature"] == signature:
+                self.hits += 1
+                return entry
+
+        # Fișierul este nou sau s-a modificat: verificăm conținutul
+        sha256 = file_sha256(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["sha256"] == sha256:
+                # Doar mtime s-a schimbat (ex: fișier copiat/atins), conținutul e același
+                entry["signature"] = signature
+                self.hits += 1
+                return entry
+            if entry is not None:
+                self.invalidations += 1
+            self.misses += 1
+
+        wb = load_workbook(key)
+        entry = {
+            "signature": signature,
+            "sha256": sha256,
+            "blob": pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL),
+            "max_row": wb.active.max_row,
+        }
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def get(self, template_path):
+        """
+        Returnează o copie independentă a workbook-ului template.
+        """
+        return pickle.loads(self._entry(template_path)["blob"])
+
+    def max_row(self, template_path):
+        """
+        Ultimul rând al foii active din template (vezi xlsx_utils.TrimPlan).
+        Se citește din intrarea curentă (încărcată deja de get), fără să afecteze contoarele.
+        """
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(template_path))
+        if entry is None:
+            entry = self._entry(template_path)
+        return entry["max_row"]
+
+    def export(self, template_path):
+        """
+        Intrarea din cache pentru un template, pentru a fi trimisă altor procese.
+        """
+        return {os.path.abspath(template_path): self._entry(template_path)}
+
+    def seed(self, entries):
+        """
+        Preia intrări exportate de alt proces (evită reparsarea template-ului).
+        """
+        with self._lock:
+            self._entries.update(entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
+
+
+# Cache-ul procesului curent (fiecare worker din pool are propriul cache)
+TEMPLATE_CACHE = TemplateCache()
+
+
+def seed_template_cache(entries=None):
+    """
+    Initializer pentru procesele copil: primesc template-ul deja parsat de la părinte.
+    """
+    if entries:
+        TEMPLATE_CACHE.seed(entries)
+
+
+def load_template(template_path):
+    """
+    Înlocuitor pentru load_workbook(template_path), servit din cache.
+    """
+    return TEMPLATE_CACHE.get(template_path)
+
+
+def template_max_row(template_path):
+    """
+    Ultimul rând al foii active din template, din cache.
+    """
+    return TEMPLATE_CACHE.max_row(template_path)
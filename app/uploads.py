@@ -0,0 +1,257 @@
+"""
+Salvarea fișierelor CSV încărcate prin /upload/.
+
+Fișierele sunt copiate pe disc în bucăți, fără să blocheze event loop-ul
+(scrierea rulează în thread-uri scurte, câte una per bucată). În timpul
+copierii se calculează hash-ul SHA-256 și numărul de rânduri și se aplică
+limitele de dimensiune; hash-ul este păstrat în sidecar și folosit de cheia
+cache-ului de rezultate (app/result_cache.py), fără recitirea CSV-ului. Limita
+per încărcare este aplicată încă din timpul citirii corpului cererii
+(limit_request_body), inclusiv pentru cererile fără Content-Length.
+
+În locul CSV-urilor individuale se poate încărca o singură arhivă .zip; CSV-urile
+din ea sunt extrase în flux, cu limite împotriva arhivelor „zip bomb”.
+
+După copiere, fiecare CSV este validat și coloanele lui sunt salvate într-un
+sidecar NumPy (vezi app/csv_reader.py), folosit apoi de toate pipeline-urile.
+
+Fișierele vechi ale sesiunii nu mai sunt șterse unul câte unul înainte de
+încărcare: folderul este redenumit (operație instantanee) și șters în fundal.
+
+Configurare (variabile de mediu):
+ - UPLOAD_MAX_FILE_MB    : dimensiunea maximă a unui fișier (implicit 20)
+ - UPLOAD_MAX_REQUEST_MB : dimensiunea maximă a unei încărcări (implicit 100)
+ - UPLOAD_ZIP_MAX_FILES  : numărul maxim de CSV-uri dintr-o arhivă ZIP (implicit 1000)
+ - UPLOAD_ZIP_MAX_MB     : dimensiunea maximă a arhivei dezarhivate (implicit 500)
+ - UPLOAD_ZIP_MAX_RATIO  : raportul maxim de compresie al unui fișier din arhivă (implicit 100)
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import uuid
+import zipfile
+import zlib
+
+from app.csv_reader import write_sidecar
+
+UPLOAD_MAX_FILE_MB = int(os.getenv("UPLOAD_MAX_FILE_MB", "20"))
+UPLOAD_MAX_REQUEST_MB = int(os.getenv("UPLOAD_MAX_REQUEST_MB", "100"))
+UPLOAD_MAX_FILE_BYTES = UPLOAD_MAX_FILE_MB * 1024 * 1024
+UPLOAD_MAX_REQUEST_BYTES = UPLOAD_MAX_REQUEST_MB * 1024 * 1024
+UPLOAD_ZIP_MAX_FILES = int(os.getenv("UPLOAD_ZIP_MAX_FILES", "1000"))
+UPLOAD_ZIP_MAX_MB = int(os.getenv("UPLOAD_ZIP_MAX_MB", "500"))
+UPLOAD_ZIP_MAX_BYTES = UPLOAD_ZIP_MAX_MB * 1024 * 1024
+UPLOAD_ZIP_MAX_RATIO = int(os.getenv("UPLOAD_ZIP_MAX_RATIO", "100"))
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """
+    Fișierul sau încărcarea depășește limita de dimensiune (HTTP 413).
+    """
+
+
+class InvalidUpload(Exception):
+    """
+    Fișierul încărcat nu poate fi folosit (ex: arhivă ZIP coruptă) (HTTP 400).
+    """
+
+
+def safe_filename(filename):
+    """
+    Doar numele fișierului, fără componente de cale (ex: '../').
+    """
+    return os.path.basename((filename or "").replace("\\", "/"))
+
+
+def limit_request_body(receive, max_bytes, limit_message):
+    """
+    Învelește canalul ASGI 'receive': aruncă UploadTooLarge (cu 'limit_message') de îndată
+    ce corpul cererii depășește 'max_bytes', înainte ca parserul de formular să-l stocheze.
+    """
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise UploadTooLarge(limit_message)
+        return message
+
+    return limited_receive
+
+
+class _CopyStats:
+    """
+    Hash, dimensiune și număr de rânduri, calculate pe măsură ce bucățile sunt copiate.
+    """
+
+    def __init__(self, max_bytes, limit_message):
+        self.max_bytes = max_bytes
+        self.limit_message = limit_message
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.newlines = 0
+        self.last_byte = b"\n"
+
+    def update(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(self.limit_message)
+        self.digest.update(chunk)
+        self.newlines += chunk.count(b"\n")
+        self.last_byte = chunk[-1:]
+
+    def result(self, target):
+        # Ultimul rând poate să nu se termine cu '\n'; primul rând este antetul
+        lines = self.newlines + (1 if self.size and self.last_byte != b"\n" else 0)
+        return {
+            "name": os.path.basename(target),
+            "bytes": self.size,
+            "sha256": self.digest.hexdigest(),
+            "rows": max(lines - 1, 0),
+        }
+
+
+async def save_upload(upload, target, max_bytes, limit_message):
+    """
+    Copiază un UploadFile în 'target', în bucăți.
+    Aruncă UploadTooLarge (cu 'limit_message') dacă fișierul depășește 'max_bytes';
+    fișierul parțial este șters.
+    Returnează {"name", "bytes", "sha256", "rows"} ('rows' fără antet).
+    """
+    stats = _CopyStats(max_bytes, limit_message)
+    f = await asyncio.to_thread(open, target, "wb")
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            stats.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        os.unlink(target)
+        raise
+    await asyncio.to_thread(f.close)
+    return stats.result(target)
+
+
+def _is_csv_member(member):
+    """
+    Membrii arhivei care sunt extrași: fișiere .csv (fără metadatele macOS sau fișiere ascunse).
+    """
+    name = safe_filename(member.filename)
+    return (
+        not member.is_dir()
+        and not member.filename.startswith("__MACOSX/")
+        and not name.startswith(".")
+        and name.lower().endswith(".csv")
+    )
+
+
+# Erori la citirea unui membru: arhivă coruptă, compresie nesuportată, membru criptat
+_EXTRACT_ERRORS = (zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError)
+
+
+def extract_zip(source, folder):
+    """
+    Extrage CSV-urile dintr-o arhivă ZIP (obiect fișier cu seek) în 'folder',
+    în bucăți, cu limite împotriva arhivelor „zip bomb”:
+     - numărul de CSV-uri (UPLOAD_ZIP_MAX_FILES),
+     - dimensiunea totală dezarhivată (UPLOAD_ZIP_MAX_MB), verificată atât după
+       antetele arhivei, cât și după octeții efectiv extrași,
+     - dimensiunea fiecărui fișier (UPLOAD_MAX_FILE_MB),
+     - raportul de compresie al fiecărui fișier (UPLOAD_ZIP_MAX_RATIO).
+    Folderele din arhivă sunt ignorate (se păstrează doar numele fișierelor).
+    Returnează (lista de info ca la save_upload, lista membrilor ignorați).
+    Rulează sincron (se apelează prin asyncio.to_thread).
+    """
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        raise InvalidUpload("Arhiva ZIP nu poate fi citită.")
+
+    with archive:
+        members = [member for member in archive.infolist() if not member.is_dir()]
+        csv_members = [member for member in members if _is_csv_member(member)]
+        skipped = [member.filename for member in members if not _is_csv_member(member)]
+
+        if len(csv_members) > UPLOAD_ZIP_MAX_FILES:
+            raise UploadTooLarge(f"Arhiva conține peste {UPLOAD_ZIP_MAX_FILES} fișiere CSV.")
+        if sum(member.file_size for member in csv_members) > UPLOAD_ZIP_MAX_BYTES:
+            raise UploadTooLarge(f"Arhiva dezarhivată depășește {UPLOAD_ZIP_MAX_MB} MB.")
+
+        infos = []
+        seen = set()
+        total = 0
+        for member in csv_members:
+            name = safe_filename(member.filename)
+            if name in seen:
+                skipped.append(member.filename)  # același nume în alt folder din arhivă
+                continue
+            seen.add(name)
+
+            # Limita efectivă: cea mai strictă dintre cele trei
+            limits = [
+                (UPLOAD_MAX_FILE_BYTES, f"Fișierul {name} depășește {UPLOAD_MAX_FILE_MB} MB."),
+                (UPLOAD_ZIP_MAX_BYTES - total, f"Arhiva dezarhivată depășește {UPLOAD_ZIP_MAX_MB} MB."),
+                (UPLOAD_ZIP_MAX_RATIO * max(member.compress_size, 1),
+                 f"Fișierul {name} are un raport de compresie suspect (peste {UPLOAD_ZIP_MAX_RATIO}:1)."),
+            ]
+            max_bytes, message = min(limits, key=lambda limit: limit[0])
+
+            target = os.path.join(folder, name)
+            stats = _CopyStats(max_bytes, message)
+            try:
+                with archive.open(member) as src, open(target, "wb") as dst:
+                    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                        stats.update(chunk)
+                        dst.write(chunk)
+            except (UploadTooLarge, *_EXTRACT_ERRORS) as e:
+                if os.path.exists(target):
+                    os.unlink(target)
+                if isinstance(e, UploadTooLarge):
+                    raise
+                raise InvalidUpload(f"Fișierul {name} din arhivă nu poate fi extras: {e}")
+            total += stats.size
+            infos.append(stats.result(target))
+    return infos, skipped
+
+
+async def index_csv(path, info):
+    """
+    Validează CSV-ul și îi scrie sidecar-ul cu coloanele dată/valoare și hash-ul din 'info'.
+    Completează 'info' cu numărul exact de rânduri sau cu eroarea de validare.
+    """
+    try:
+        info["rows"] = await asyncio.to_thread(write_sidecar, path, info.get("sha256"))
+    except Exception as e:
+        info["error"] = str(e)
+    return info
+
+
+def detach_folder(folder):
+    """
+    Înlocuiește 'folder' cu unul gol: cel vechi este redenumit și returnat
+    (pentru ștergere în fundal), sau None dacă nu exista.
+    """
+    old = None
+    if os.path.isdir(folder):
+        old = f"{folder}.old-{uuid.uuid4().hex}"
+        os.rename(folder, old)
+    os.makedirs(folder, exist_ok=True)
+    return old
+
+
+def remove_folders(folders):
+    """
+    Șterge folderele detașate (rulează ca task de fundal).
+    """
+    for folder in folders:
+        if folder:
+            shutil.rmtree(folder, ignore_errors=True)
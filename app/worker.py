@@ -0,0 +1,178 @@
+"""
+Proces worker pentru coada durabilă de job-uri (JOB_BACKEND=queue, vezi app/job_queue.py).
+
+Preia job-uri din coadă, le rulează și le marchează terminate. Cât timp un job
+rulează, un thread prelungește lease-ul la fiecare treime din JOB_LEASE_SECONDS;
+dacă worker-ul moare, lease-ul expiră și job-ul este preluat de alt worker.
+
+Fișierele XLSX sunt scrise întâi într-un folder temporar al job-ului și mutate
+în sessions/<id>/output doar dacă worker-ul mai deține job-ul la final: un
+worker considerat mort (ex: blocat mai mult decât lease-ul) nu suprascrie
+rezultatul celui care a preluat job-ul după el. La publicare, fișierele din
+output rămase de la rulările anterioare (ex: workbook-ul combinat al unei rulări
+cu opțiunea „Un singur fișier XLSX”) sunt șterse, ca în modul local.
+
+Se pot porni oricâte procese worker, pe mașini diferite, dacă toate văd
+același folder sessions/ și același fișier JOB_QUEUE_DB.
+
+Exemplu:
+    JOB_BACKEND=queue uvicorn app.main:app
+    python -m app.worker --processes 2
+"""
+import argparse
+import glob
+import importlib
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import threading
+import time
+import traceback
+
+from app import progress
+from app.job_queue import JOB_LEASE_SECONDS, JOB_QUEUE_DB, JobQueue
+from app.worker_pool import _warm_up
+
+# Prefixul folderului temporar în care scrie un job (lângă folderul de output)
+STAGING_PREFIX = ".job-"
+
+
+class _Heartbeat:
+    """
+    Prelungește lease-ul unui job într-un thread; 'lost' devine True dacă job-ul a fost preluat de altcineva.
+    """
+
+    def __init__(self, queue, job_id, worker_id, interval):
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, args=(queue, job_id, worker_id, interval),
+                                        name="job-heartbeat", daemon=True)
+        self._thread.start()
+
+    def _loop(self, queue, job_id, worker_id, interval):
+        while not self._stop.wait(interval):
+            try:
+                if not queue.heartbeat(job_id, worker_id):
+                    self.lost = True
+                    return
+            except Exception as e:  # ex: baza de date blocată temporar; reîncercăm la următorul interval
+                print(f"Eroare la prelungirea lease-ului job-ului {job_id}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _publish(staging, output_folder):
+    """
+    Mută fișierele scrise de job din folderul temporar în folderul de output și
+    șterge din output fișierele pe care job-ul nu le-a produs (rulările anterioare).
+    Pipeline-ul a rulat în folderul temporar, gol, deci curățarea lui de la început
+    (remove_combined_outputs) nu a atins folderul de output.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    produced = set(os.listdir(staging))
+    for name in produced:
+        os.replace(os.path.join(staging, name), os.path.join(output_folder, name))
+    for name in os.listdir(output_folder):
+        path = os.path.join(output_folder, name)
+        if name not in produced and os.path.isfile(path):
+            os.unlink(path)
+
+
+def run_job(queue, job, worker_id):
+    """
+    Rulează un job preluat din coadă și îl marchează terminat (dacă îl mai deține).
+    """
+    kwargs = dict(job["kwargs"])
+    output_folder = kwargs["output_folder"]
+    staging = os.path.join(os.path.dirname(output_folder), f"{STAGING_PREFIX}{job['id']}-{job['attempts']}")
+    kwargs["output_folder"] = staging
+    # Folderele rămase de la încercările anterioare (worker-i morți)
+    for previous in glob.glob(os.path.join(os.path.dirname(output_folder), f"{STAGING_PREFIX}{job['id']}-*")):
+        shutil.rmtree(previous, ignore_errors=True)
+    os.makedirs(staging, exist_ok=True)
+
+    heartbeat = _Heartbeat(queue, job["id"], worker_id, max(queue.lease_seconds / 3, 1))
+    progress.configure(queue.event_sink(job["id"]))
+    progress.set_job(job["id"])
+    error = None
+    try:
+        module = importlib.import_module(f"app.{job['module']}")
+        module.process_csv_to_xlsx(**kwargs)
+    except Exception as e:
+        traceback.print_exc()
+        error = str(e)
+    finally:
+        progress.set_job(None)
+        progress.configure(None)
+        heartbeat.stop()
+
+    try:
+        if heartbeat.lost:
+            print(f"Job-ul {job['id']} a fost preluat de alt worker; rezultatul este ignorat.")
+            return
+        if error is None:
+            _publish(staging, output_folder)
+        message = None if error else f"Procesare {job['label']} finalizată!"
+        queue.finish(job["id"], worker_id, message=message, error=error)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def work(queue_path=JOB_QUEUE_DB, lease_seconds=JOB_LEASE_SECONDS, poll=1.0, once=False):
+    """
+    Bucla unui worker: preia și rulează job-uri până la SIGTERM / Ctrl+C
+    (job-ul în curs este terminat înainte de oprire). Cu 'once', se oprește
+    când coada este goală.
+    """
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    _warm_up()
+    queue = JobQueue(queue_path, lease_seconds=lease_seconds)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Worker {worker_id} pornit (coada: {queue_path}).")
+    while not stop.is_set():
+        job = queue.claim(worker_id)
+        if job is None:
+            if once:
+                break
+            stop.wait(poll)
+            continue
+        started = time.time()
+        print(f"Job {job['id']} ({job['label']}, încercarea {job['attempts']}) preluat.")
+        run_job(queue, job, worker_id)
+        print(f"Job {job['id']} terminat în {time.time() - started:.1f}s.")
+    print(f"Worker {worker_id} oprit.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker pentru coada de job-uri de procesare.")
+    parser.add_argument("--queue", default=JOB_QUEUE_DB, help="Fișierul SQLite al cozii.")
+    parser.add_argument("--root", default=".",
+                        help="Folderul aplicației (căile din job-uri, ex: sessions/..., sunt relative la el).")
+    parser.add_argument("--lease", type=int, default=JOB_LEASE_SECONDS, help="Durata unui lease, în secunde.")
+    parser.add_argument("--poll", type=float, default=1.0, help="Pauza dintre verificări când coada e goală.")
+    parser.add_argument("--processes", type=int, default=1, help="Câte procese worker pornesc.")
+    parser.add_argument("--once", action="store_true", help="Oprire când coada este goală.")
+    args = parser.parse_args()
+
+    queue_path = os.path.abspath(args.queue)
+    os.chdir(args.root)
+    if args.processes <= 1:
+        work(queue_path, args.lease, args.poll, args.once)
+    else:
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=work, args=(queue_path, args.lease, args.poll, args.once))
+                   for _ in range(args.processes)]
+        for process in workers:
+            process.start()
+        # Ctrl+C ajunge la toți worker-ii; SIGTERM este transmis de aici
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in workers])
+        for process in workers:
+            process.join()
@@ -0,0 +1,358 @@
+"""
+Pool de procese „calde” pentru scripturile de procesare CSV -> XLSX.
+
+În loc să pornim câte un `python app/<script>.py` la fiecare apel /process/
+(care reimportă pandas/openpyxl de fiecare dată), ținem câteva procese
+pornite care au deja încărcate pandas, openpyxl și cele cinci pipeline-uri.
+
+Configurare (variabile de mediu):
+ - WORKER_POOL_SIZE     : numărul de procese din pool (0 = un subproces nou
+                          pentru fiecare job, ca înainte)
+ - WORKER_MAX_JOBS      : după câte job-uri este reciclat un proces
+                          (0 = fără reciclare)
+ - WORKER_CRASH_RETRIES : de câte ori reîncercăm un job dacă procesul care
+                          îl rula a murit (pool-ul este refăcut automat)
+
+Când un proces moare, ProcessPoolExecutor oprește tot pool-ul și toate job-urile
+în curs primesc BrokenProcessPool. Fiecare job anunță la început pid-ul procesului
+pe care rulează, așa că reîncercarea se contorizează doar pentru job-ul al cărui
+proces a murit; celelalte sunt retrimise fără să-și consume încercările.
+"""
+import asyncio
+import importlib
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import uuid
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app import progress
+from app.pipelines import PIPELINES
+
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", "2"))
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "100"))
+WORKER_CRASH_RETRIES = int(os.getenv("WORKER_CRASH_RETRIES", "1"))
+
+# Cât așteptăm, după o cădere a pool-ului, pid-urile anunțate și oprirea proceselor
+CRASH_INSPECT_TIMEOUT = 5
+
+_claims = None  # coada prin care worker-ul anunță (token, pid) la începutul unui job
+
+
+def _warm_up(events=None, claims=None):
+    """
+    Rulează o singură dată în fiecare proces nou: importă bibliotecile grele
+    și modulele pipeline-urilor și setează coada pentru evenimentele de progres.
+    """
+    global _claims
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+
+    for spec in PIPELINES.values():
+        importlib.import_module(f"app.{spec['module']}")
+    progress.configure(events)
+    _claims = claims
+
+
+def _ping():
+    return os.getpid()
+
+
+def _run_pipeline(module_name, kwargs, job_id=None, completed=None, token=None):
+    """
+    Rulează process_csv_to_xlsx din modulul dat, în procesul worker.
+    Evenimentele de progres sunt etichetate cu 'job_id'; ultimul este END.
+    'completed': cheile simbolurilor deja generate (checkpoint, vezi app/batch.py).
+    Returnează pid-ul și statisticile cache-urilor procesului.
+    """
+    from app.result_cache import RESULT_CACHE, set_completed
+    from app.template_cache import TEMPLATE_CACHE
+
+    if _claims is not None and token is not None:
+        # Scris direct în pipe (SimpleQueue): ajunge la pool chiar dacă procesul moare imediat
+        _claims.put((token, os.getpid()))
+
+    module = importlib.import_module(f"app.{module_name}")
+    progress.set_job(job_id)
+    set_completed(completed)
+    try:
+        module.process_csv_to_xlsx(**kwargs)
+    finally:
+        set_completed(None)
+        progress.emit(progress.END)
+        progress.set_job(None)
+    return {
+        "pid": os.getpid(),
+        "template_cache": TEMPLATE_CACHE.stats(),
+        "result_cache": RESULT_CACHE.stats(),
+    }
+
+
+def _run_subprocess(module_name, kwargs):
+    """
+    Varianta fără pool: rulează scriptul într-un proces nou, ca înainte.
+    """
+    command = [sys.executable, f"app/{module_name}.py"]
+    for key, value in kwargs.items():
+        option = f"--{key.replace('_', '-')}"
+        if value is None:
+            continue  # opțiune nefolosită; scriptul are aceeași valoare implicită
+        if isinstance(value, bool):
+            # Opțiunile booleene (ex: --parallel) sunt simple flag-uri
+            command += [option] if value else []
+        else:
+            command += [option, str(value)]
+    subprocess.run(command, check=True)
+
+
+class WorkerPool:
+    """
+    Pool de procese preîncălzite, refăcut automat dacă un proces moare.
+    """
+
+    def __init__(self, size=WORKER_POOL_SIZE, max_jobs=WORKER_MAX_JOBS,
+                 crash_retries=WORKER_CRASH_RETRIES):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.crash_retries = crash_retries
+        self._executor = None
+        self._lock = threading.Lock()
+        self._worker_stats = {}  # {pid: ultimele statistici raportate de worker}
+        self._context = multiprocessing.get_context("spawn")
+        self._events = None        # coada de evenimente de progres (comună tuturor worker-ilor)
+        self._event_thread = None
+        self.event_handler = None  # funcția apelată (din alt thread) pentru fiecare eveniment
+        self._claims = None        # (token, pid) anunțate de worker-i la începutul job-urilor
+        self._claim_thread = None
+        self._job_pids = {}        # {token: pid} pentru job-urile în curs
+        self._claimed = threading.Condition(self._lock)
+        self._processes = weakref.WeakKeyDictionary()  # {executor: procesele lui, păstrate și după shutdown}
+
+    @property
+    def emits_events(self):
+        """
+        True dacă job-urile trimit evenimente de progres (doar cu pool de procese).
+        """
+        return self.size > 0
+
+    def _create_executor(self):
+        if self._events is None:
+            self._events = self._context.Queue()
+            self._event_thread = threading.Thread(target=self._forward_events, args=(self._events,),
+                                                  name="worker-events", daemon=True)
+            self._event_thread.start()
+        if self._claims is None:
+            self._claims = self._context.SimpleQueue()
+            self._claim_thread = threading.Thread(target=self._collect_claims, args=(self._claims,),
+                                                  name="worker-claims", daemon=True)
+            self._claim_thread.start()
+        executor = ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=self._context,
+            initializer=_warm_up,
+            initargs=(self._events, self._claims),
+            max_tasks_per_child=self.max_jobs or None,
+        )
+        self._processes[executor] = executor._processes
+        return executor
+
+    def _forward_events(self, events):
+        """
+        Citește evenimentele trimise de worker-i și le predă lui event_handler.
+        Se oprește la primirea lui None (vezi shutdown()).
+        """
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            if self.event_handler is not None:
+                self.event_handler(event)
+
+    def _collect_claims(self, claims):
+        """
+        Reține pid-ul pe care rulează fiecare job. Se oprește la primirea lui None.
+        """
+        while True:
+            claim = claims.get()
+            if claim is None:
+                return
+            with self._claimed:
+                self._job_pids[claim[0]] = claim[1]
+                self._claimed.notify_all()
+
+    def start(self):
+        """
+        Pornește procesele și așteaptă să fie încălzite (prefork).
+        """
+        if self.size <= 0:
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+            executor = self._executor
+        pings = [executor.submit(_ping) for _ in range(self.size)]
+        for ping in pings:
+            ping.result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            events, self._events = self._events, None
+            event_thread, self._event_thread = self._event_thread, None
+        if events is not None:
+            events.put(None)
+            event_thread.join()
+        with self._lock:
+            claims, self._claims = self._claims, None
+            claim_thread, self._claim_thread = self._claim_thread, None
+        if claims is not None:
+            claims.put(None)
+            claim_thread.join()
+
+    def _restart(self, broken_executor):
+        """
+        Înlocuiește pool-ul stricat (doar dacă nu a fost deja înlocuit de alt thread).
+        """
+        with self._lock:
+            if self._executor is broken_executor:
+                self._executor = self._create_executor()
+        broken_executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, module_name, kwargs, job_id=None, completed=None, token=None):
+        """
+        Trimite un job către pool; returnează (executor, Future).
+        'token' identifică încercarea în pid-urile anunțate de worker-i.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+            executor = self._executor
+        try:
+            return executor, executor.submit(_run_pipeline, module_name, kwargs, job_id, completed, token)
+        except BrokenProcessPool:
+            self._restart(executor)
+            return self.submit(module_name, kwargs, job_id, completed, token)
+
+    def _crashed_pids(self, executor):
+        """
+        Pid-urile proceselor pool-ului stricat care au murit singure: după o cădere,
+        ProcessPoolExecutor le oprește pe celelalte cu SIGTERM.
+        """
+        processes = list(self._processes.get(executor, {}).values())
+        for process in processes:
+            process.join(CRASH_INSPECT_TIMEOUT)
+        return {process.pid for process in processes
+                if process.exitcode not in (None, 0, -signal.SIGTERM)}
+
+    def _job_pid(self, token):
+        """
+        Pid-ul anunțat de job (None dacă job-ul nu apucase să pornească).
+        """
+        with self._claimed:
+            self._claimed.wait_for(lambda: token in self._job_pids, CRASH_INSPECT_TIMEOUT)
+            return self._job_pids.pop(token, None)
+
+    def _forget(self, token):
+        with self._lock:
+            self._job_pids.pop(token, None)
+
+    def _handle_crash(self, executor, module_name, attempts, token):
+        """
+        Reface pool-ul după moartea unui worker; returnează numărul de încercări
+        sau aruncă eroare dacă s-au epuizat reîncercările. Încercarea se contorizează
+        doar dacă job-ul rula pe procesul mort (sau procesul nu poate fi identificat).
+        """
+        crashed = self._crashed_pids(executor)
+        self._restart(executor)
+        if crashed and self._job_pid(token) not in crashed:
+            return attempts
+        attempts += 1
+        if attempts > self.crash_retries:
+            raise RuntimeError(
+                f"Procesul worker s-a oprit neașteptat în timpul job-ului '{module_name}'."
+            )
+        return attempts
+
+    def run(self, module_name, kwargs, job_id=None, completed=None):
+        """
+        Rulează un job și așteaptă rezultatul. Dacă procesul worker moare
+        în timpul job-ului, pool-ul este refăcut și job-ul reîncercat.
+        """
+        if self.size <= 0:
+            _run_subprocess(module_name, kwargs)
+            return None
+
+        attempts = 0
+        while True:
+            token = uuid.uuid4().hex
+            executor, future = self.submit(module_name, kwargs, job_id, completed, token)
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                attempts = self._handle_crash(executor, module_name, attempts, token)
+                continue
+            finally:
+                self._forget(token)
+            self.record_stats(result)
+            return result
+
+    async def run_async(self, module_name, kwargs, job_id=None):
+        """
+        Varianta asincronă a run(): așteaptă job-ul fără să blocheze un thread.
+        Evenimentele de progres ale job-ului sunt etichetate cu 'job_id'.
+        """
+        if self.size <= 0:
+            await asyncio.to_thread(_run_subprocess, module_name, kwargs)
+            return None
+
+        attempts = 0
+        while True:
+            token = uuid.uuid4().hex
+            executor, future = self.submit(module_name, kwargs, job_id, token=token)
+            try:
+                result = await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                # Așteptarea proceselor oprite nu trebuie să blocheze event loop-ul
+                attempts = await asyncio.to_thread(self._handle_crash, executor, module_name, attempts, token)
+                continue
+            finally:
+                self._forget(token)
+            self.record_stats(result)
+            return result
+
+    def record_stats(self, result):
+        """
+        Reține statisticile trimise de un worker la finalul unui job.
+        """
+        with self._lock:
+            self._worker_stats[result["pid"]] = result
+
+    def stats(self):
+        """
+        Statistici agregate pe toate procesele worker (inclusiv cele reciclate).
+        """
+        with self._lock:
+            reports = list(self._worker_stats.values())
+        template_cache = {"hits": 0, "misses": 0, "invalidations": 0}
+        result_cache = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        for report in reports:
+            for key in template_cache:
+                template_cache[key] += report["template_cache"][key]
+            for key in result_cache:
+                result_cache[key] += report["result_cache"][key]
+        lookups = result_cache["hits"] + result_cache["misses"]
+        result_cache["hit_rate"] = round(result_cache["hits"] / lookups, 3) if lookups else None
+        return {
+            "pool_size": self.size,
+            "workers_reported": len(reports),
+            "template_cache": template_cache,
+            "result_cache": result_cache,
+        }
@@ -0,0 +1,202 @@
+"""
+Funcții comune pentru scrierea datelor din CSV-urile TradingView în foile Excel.
+"""
+import numpy as np
+import pandas as pd
+from openpyxl.cell.cell import Cell
+from openpyxl.utils import column_index_from_string
+
+
+# Datele care pot fi scrise în celule (datetime din Python: anii 1–9999)
+_MIN_TIME = np.datetime64("0001-01-01T00:00:00")
+_MAX_TIME = np.datetime64("9999-12-31T23:59:59")
+
+
+def _writable(converted):
+    """
+    datetime64 fără fus orar, cu NaT în locul datelor din afara anilor 1–9999.
+    """
+    out_of_range = (converted < _MIN_TIME) | (converted > _MAX_TIME)
+    if out_of_range.any():
+        converted = converted.copy()
+        converted[out_of_range] = np.datetime64("NaT")
+    return converted
+
+
+def _parse_each(times):
+    """
+    Conversia valoare cu valoare, pentru o coloană cu formate amestecate (ex: un rând
+    greșit): numerele (și textul numeric) ca timestamp Unix, restul ca dată ISO.
+    """
+    converted = _writable(pd.to_datetime(times, utc=True, errors="coerce", format="ISO8601")
+                          .tz_localize(None).to_numpy())
+    numbers = pd.to_numeric(pd.Series(times, dtype=object), errors="coerce").to_numpy(dtype=float)
+    is_number = ~np.isnan(numbers)
+    if is_number.any():
+        unix = _writable(pd.to_datetime(numbers, unit="s", errors="coerce").to_numpy())
+        converted = np.where(is_number, unix, converted)
+    return converted
+
+
+def parse_tv_times(times):
+    """
+    Convertește coloana 'time' dintr-un export TradingView într-un array
+    datetime64 (NaT pentru celulele goale), vectorizat:
+     - numere   -> timestamp Unix în secunde
+     - text     -> dată ISO (ex: '2024-01-01T00:00:00Z'); fusul orar se elimină (UTC)
+    Valorile care nu pot fi interpretate ca dată (sau sunt în afara anilor 1–9999)
+    rămân neschimbate, fiecare separat: rezultatul este atunci un array de obiecte
+    (datetime, valoarea brută sau None), același indiferent dacă coloana este
+    convertită întreagă sau pe bucăți (vezi csv_reader.ChunkedTvCsv).
+    """
+    times = np.asarray(times)
+    if times.dtype.kind == "M":
+        return times
+    try:
+        if times.dtype.kind in "iuf":
+            converted = _writable(pd.to_datetime(times, unit="s", errors="coerce").to_numpy())
+        else:
+            try:
+                converted = _writable(pd.to_datetime(times, utc=True).tz_localize(None).to_numpy())
+            except (ValueError, TypeError, OverflowError):
+                converted = _parse_each(times)
+    except (ValueError, TypeError, OverflowError):
+        return times
+
+    missing = pd.isna(times)
+    invalid = np.isnat(converted) & ~missing
+    if not invalid.any():
+        return converted
+    result = converted.astype(object)
+    result[invalid] = times[invalid]
+    result[missing] = None
+    return result
+
+
+def tv_time_to_datetime(times):
+    """
+    Ca parse_tv_times, dar pentru scrierea în celule: returnează un ndarray
+    de obiecte (datetime sau None). Valorile care nu sunt date rămân neschimbate.
+    """
+    converted = parse_tv_times(times)
+    if converted.dtype.kind != "M":
+        return converted.astype(object)
+
+    result = pd.DatetimeIndex(converted).to_pydatetime().astype(object)
+    result[np.isnat(converted)] = None
+    return result
+
+
+def _to_cell_values(values):
+    """
+    Transformă un array NumPy în listă de valori Python; NaN devine celulă goală.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        values = values.astype(object)
+        values[pd.isna(values)] = None
+    return values.tolist()
+
+
+def write_series(ws, dates, values, date_column, value_column, start_row=2, limit=None):
+    """
+    Scrie într-o singură trecere coloanele dată/valoare începând cu rândul 'start_row'.
+    - dates, values : array-uri NumPy (coloana 'time', dacă nu este deja
+                      datetime64, este convertită automat)
+    - limit         : numărul maxim de rânduri scrise (None = toate)
+    Returnează numărul de rânduri scrise.
+    """
+    if limit is not None:
+        dates = dates[:limit]
+        values = values[:limit]
+
+    date_list = _to_cell_values(tv_time_to_datetime(dates))
+    value_list = _to_cell_values(values)
+
+    # Setăm .value explicit: ws.cell(..., value=None) nu ar goli celula din template
+    cell = ws.cell
+    for offset, (date, value) in enumerate(zip(date_list, value_list)):
+        row = start_row + offset
+        cell(row=row, column=date_column).value = date
+        cell(row=row, column=value_column).value = value
+    return len(date_list)
+
+
+
+class TrimPlan:
+    """
+    Trunchierea foii openpyxl generate dintr-un template, cu aceiași pași ca
+    SheetPatch din app/xml_engine.py (truncate, clear), aplicați o singură dată.
+    Întinderea template-ului (ultimul rând) este cunoscută dinainte (vezi
+    app/template_cache.py), fără ws.max_row, care parcurge toate celulele:
+     - rândurile de după 'last_row' sunt eliminate într-o singură trecere prin celule
+       (ws.delete_rows sorta toate celulele foii și verifica fiecare rând × coloană);
+     - intervalele golite sunt parcurse cu indecși numerici, fără adrese text ("T5").
+    Celulele scrise după încărcarea template-ului (write_series) trebuie să fie până
+    la 'last_row'. Ca înainte, celulele golite care lipsesc din template sunt create goale.
+
+    Scurtăturile folosesc atribute interne openpyxl (ws._cells, ws._current_row,
+    cell._value; requirements.txt fixează openpyxl 3.1.x). Dacă o altă versiune nu le
+    mai are, se folosesc ws.delete_rows și cell.value = None, ca înainte.
+    """
+
+    def __init__(self, template_max_row):
+        self.template_max_row = template_max_row
+        self.last_row = None
+        self.clears = []    # [(coloane, primul rând, ultimul rând sau None)]
+
+    def truncate(self, last_row):
+        """
+        Elimină toate rândurile de după 'last_row'.
+        """
+        self.last_row = last_row
+
+    def clear(self, columns, first_row, last_row=None):
+        """
+        Golește valorile (păstrând stilul) din coloanele date, pe intervalul de rânduri;
+        last_row=None: până la ultimul rând al foii trunchiate.
+        """
+        indexes = [column_index_from_string(c) if isinstance(c, str) else c for c in columns]
+        self.clears.append((indexes, first_row, last_row))
+
+    def apply(self, ws):
+        if not (hasattr(ws, "_cells") and hasattr(ws, "_current_row") and "_value" in Cell.__slots__):
+            self._apply_public(ws)
+            return
+
+        end_row = self.template_max_row
+        if self.last_row is not None:
+            if self.last_row < end_row:
+                last_row = self.last_row
+                ws._cells = {key: c for key, c in ws._cells.items() if key[0] <= last_row}
+                ws._current_row = last_row
+            # Datele sunt scrise până la 'last_row', chiar dacă template-ul este mai scurt
+            end_row = self.last_row
+
+        cells = ws._cells
+        cell = ws.cell
+        for columns, first_row, last_row in self.clears:
+            for row in range(first_row, (end_row if last_row is None else last_row) + 1):
+                for column in columns:
+                    existing = cells.get((row, column))
+                    if existing is None:
+                        cell(row=row, column=column)
+                    else:
+                        # Ce face cell.value = None, fără deducerea tipului valorii
+                        existing._value = None
+                        existing.data_type = "n"
+
+    def _apply_public(self, ws):
+        """
+        Aceiași pași, doar prin API-ul public openpyxl (mai lent).
+        """
+        end_row = ws.max_row
+        if self.last_row is not None:
+            if self.last_row < end_row:
+                ws.delete_rows(self.last_row + 1, end_row - self.last_row)
+            end_row = self.last_row
+
+        for columns, first_row, last_row in self.clears:
+            for row in range(first_row, (end_row if last_row is None else last_row) + 1):
+                for column in columns:
+                    ws.cell(row=row, column=column).value = None
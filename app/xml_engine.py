@@ -0,0 +1,557 @@
+"""
+Motor alternativ pentru generarea fișierelor XLSX, direct la nivel de XML.
+
+openpyxl încarcă fiecare celulă din template în obiecte Python și le
+serializează pe toate înapoi la wb.save, deși noi modificăm doar câteva
+coloane, eliminăm rânduri și golim câteva formule. Acest motor:
+ - citește XML-ul foii din arhiva template-ului în bucăți (streaming),
+   rând cu rând, și rescrie doar rândurile/celulele afectate;
+ - copiază restul fișierelor din arhivă octet cu octet, cu datele deja
+   comprimate (stiluri, temă, sharedStrings etc.), fără decompresie/recompresie;
+ - redenumește foaia în workbook.xml și elimină calcChain.xml, iar
+   Excel recalculează formulele la deschidere (fullCalcOnLoad).
+
+Ca și openpyxl la salvare, formulele sunt scrise fără valori în cache.
+
+Cu stream_series în loc de write_series (motorul "stream"), coloanele sunt citite
+din CSV în bucăți chiar în timpul scrierii foii, așa că memoria rămâne constantă
+și pentru istoricele foarte lungi (vezi csv_reader.ChunkedTvCsv).
+
+Utilizare (echivalentul pașilor openpyxl din scripturi):
+    patch = SheetPatch(title=base_name)
+    patch.write_series(dates, values, date_column=1, value_column=2)
+    patch.truncate(num_rows + 1)
+    patch.clear(["J", "K"], num_rows + 1, num_rows + 1)
+    patch.save(template_path, output_file)
+"""
+import codecs
+import datetime
+import math
+import os
+import re
+import struct
+import uuid
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+import numpy as np
+from openpyxl.cell.cell import ERROR_CODES
+from openpyxl.formula.translate import Translator
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.datetime import to_excel
+from openpyxl.workbook.child import INVALID_TITLE_REGEX
+
+from app.xlsx_utils import tv_time_to_datetime
+
+CHUNK_SIZE = 1024 * 1024
+
+_ROW_RE = re.compile(r"<row\b[^>]*?(?:/>|>.*?</row>)", re.S)
+_CELL_RE = re.compile(r"<c\b[^>]*?(?:/>|>.*?</c>)", re.S)
+_CELL_REF_RE = re.compile(r'\br="([A-Z]+)(\d+)"')
+_ROW_NUM_RE = re.compile(r'\br="(\d+)"')
+_SPANS_RE = re.compile(r'\sspans="[^"]*"')
+_STYLE_RE = re.compile(r'\bs="(\d+)"')
+_TYPE_RE = re.compile(r'\st="[^"]*"')
+_VALUE_RE = re.compile(r"<v>.*?</v>|<v/>", re.S)
+_FORMULA_RE = re.compile(r"<f\b([^>]*?)(?:/>|>(.*?)</f>)", re.S)
+_SI_RE = re.compile(r'\bsi="(\d+)"')
+_REF_RE = re.compile(r'\bref="([A-Z]+)(\d+):([A-Z]+)(\d+)"')
+_DIMENSION_RE = re.compile(r'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"\s*/>')
+
+CALC_CHAIN_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain"
+
+
+def _format_number(number):
+    if float(number).is_integer() and abs(number) < 1e15:
+        return str(int(number))
+    return repr(float(number))
+
+
+def _serialize(value):
+    """
+    Valoare Python -> (tip celulă, text XML); None = celulă fără valoare.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return ("b", "1" if value else "0")
+    if isinstance(value, (int, np.integer)):
+        return ("n", str(int(value)))
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value) or math.isinf(value):
+            return None
+        return ("n", _format_number(value))
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return ("n", _format_number(to_excel(value)))
+    if value in ERROR_CODES:
+        # Ca openpyxl: textul unui cod de eroare (ex: "#DIV/0!") devine celulă cu eroare
+        return ("e", value)
+    return ("inlineStr", escape(str(value)))
+
+
+def _cell_xml(ref, style, value):
+    style_attr = f' s="{style}"' if style is not None else ""
+    if value is None:
+        return f'<c r="{ref}"{style_attr}/>'
+    kind, text = value
+    if kind == "n":
+        return f'<c r="{ref}"{style_attr}><v>{text}</v></c>'
+    if kind in ("b", "e"):
+        return f'<c r="{ref}"{style_attr} t="{kind}"><v>{text}</v></c>'
+    return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class _StreamedSeries:
+    """
+    Coloanele dată/valoare ale unei surse citite în bucăți (ex: ChunkedTvCsv),
+    serializate câte o bucată; rândurile trebuie cerute în ordine crescătoare.
+    """
+
+    def __init__(self, source, limit=None):
+        self.rows = len(source) if limit is None else min(len(source), limit)
+        self._chunks = iter(source)
+        self._start = 0                # indexul primei valori din bucata curentă
+        self._columns = ([], [])
+
+    def get(self, part, index):
+        while index >= self._start + len(self._columns[0]):
+            self._start += len(self._columns[0])
+            try:
+                dates, values = next(self._chunks)
+            except StopIteration:
+                raise ValueError("Fișierul CSV s-a schimbat în timpul procesării.") from None
+            self._columns = ([_serialize(v) for v in tv_time_to_datetime(dates).tolist()],
+                             [_serialize(v) for v in np.asarray(values).tolist()])
+        if index < self._start:
+            raise IndexError(f"rândul {index} a fost deja scris")
+        return self._columns[part][index - self._start]
+
+
+class _StreamedColumn:
+    """
+    O coloană dintr-un _StreamedSeries, cu interfața listei de valori din SheetPatch.columns.
+    """
+
+    def __init__(self, series, part):
+        self.series = series
+        self.part = part
+
+    def __len__(self):
+        return self.series.rows
+
+    def __getitem__(self, index):
+        return self.series.get(self.part, index)
+
+
+class SheetPatch:
+    """
+    Lista modificărilor aplicate foii active din template.
+    """
+
+    def __init__(self, title=None):
+        self.title = title
+        self.columns = {}   # {index coloană: (primul rând, [valori serializate])}
+        self.date_columns = set()
+        self.last_row = None
+        self.clears = []    # [(set de coloane, primul rând, ultimul rând sau None)]
+
+    def write_column(self, column, values, start_row=2):
+        self.columns[column] = (start_row, [_serialize(v) for v in values])
+
+    def write_series(self, dates, values, date_column, value_column, start_row=2, limit=None):
+        """
+        Echivalentul xlsx_utils.write_series: coloana dată (convertită din formatul
+        TradingView) și coloana valoare, începând cu 'start_row'.
+        """
+        if limit is not None:
+            dates = dates[:limit]
+            values = values[:limit]
+        self.date_columns.add(date_column)
+        self.write_column(date_column, tv_time_to_datetime(dates).tolist(), start_row)
+        self.write_column(value_column, np.asarray(values).tolist(), start_row)
+        return len(dates)
+
+    def stream_series(self, source, date_column, value_column, start_row=2, limit=None):
+        """
+        Ca write_series, dar valorile sunt citite din 'source' (ex: ChunkedTvCsv) abia
+        la save, bucată cu bucată. Returnează numărul de rânduri scrise.
+        """
+        series = _StreamedSeries(source, limit)
+        self.date_columns.add(date_column)
+        self.columns[date_column] = (start_row, _StreamedColumn(series, 0))
+        self.columns[value_column] = (start_row, _StreamedColumn(series, 1))
+        return series.rows
+
+    def truncate(self, last_row):
+        """
+        Elimină toate rândurile de după 'last_row' (ca ws.delete_rows până la final).
+        """
+        self.last_row = last_row
+
+    def clear(self, columns, first_row, last_row=None):
+        """
+        Golește valorile (păstrând stilul) din coloanele date, pe intervalul de rânduri.
+        """
+        indexes = {column_index_from_string(c) if isinstance(c, str) else c for c in columns}
+        self.clears.append((indexes, first_row, last_row))
+
+    def data_end_row(self):
+        return max((start + len(values) - 1 for start, values in self.columns.values()), default=0)
+
+    def is_cleared(self, row, column):
+        for columns, first_row, last_row in self.clears:
+            if column in columns and row >= first_row and (last_row is None or row <= last_row):
+                return True
+        return False
+
+    def value(self, row, column):
+        """
+        (True, valoare) dacă patch-ul scrie în celula dată, altfel (False, None).
+        """
+        data = self.columns.get(column)
+        if data is None:
+            return False, None
+        start_row, values = data
+        index = row - start_row
+        if 0 <= index < len(values):
+            return True, values[index]
+        return False, None
+
+    def save(self, template_path, output_file):
+        apply_patch(template_path, self, output_file)
+
+
+class _SheetRewriter:
+    """
+    Rescrie XML-ul foii rând cu rând, conform unui SheetPatch.
+    """
+
+    def __init__(self, patch):
+        self.patch = patch
+        self.last_row = patch.last_row if patch.last_row is not None else math.inf
+        self.column_styles = {}    # stilul celulelor din template, pentru datele din celulele noi
+        self.shared_masters = {}   # {si: (formula, celula de origine)}
+        self.cleared_masters = set()
+        self.next_row = 1          # primul rând încă neemis
+        self.end_row = None        # ultimul rând al foii rezultate
+
+    def head(self, xml):
+        """
+        Partea de dinainte de <sheetData>: actualizează <dimension>.
+        """
+        match = _DIMENSION_RE.search(xml)
+        template_end_row = int(match.group(4) or match.group(2)) if match else 0
+        self.end_row = min(self.last_row, max(template_end_row, self.patch.data_end_row()))
+        if match:
+            last_column = column_index_from_string(match.group(3) or match.group(1))
+            last_column = max([last_column] + list(self.patch.columns))
+            dimension = f'<dimension ref="A1:{get_column_letter(last_column)}{max(self.end_row, 1)}"/>'
+            xml = xml[:match.start()] + dimension + xml[match.end():]
+        return xml
+
+    def _new_cell_style(self, column):
+        """
+        Stilul unei celule care nu există în template. Ca la openpyxl, celula nouă
+        este „General” (fără s=); excepție: datele calendaristice păstrează formatul
+        de dată al coloanei (openpyxl adaugă în styles.xml formatul
+        "yyyy-mm-dd h:mm:ss", iar acest motor nu modifică styles.xml).
+        """
+        return self.column_styles.get(column) if column in self.patch.date_columns else None
+
+    def _generated_rows(self, until_row):
+        """
+        Rânduri care nu există în template, dar primesc date (ex: CSV mai lung),
+        produse unul câte unul.
+        """
+        for row in range(self.next_row, min(until_row, self.end_row + 1)):
+            cells = []
+            for column in sorted(self.patch.columns):
+                written, value = self.patch.value(row, column)
+                if written and not self.patch.is_cleared(row, column):
+                    ref = f"{get_column_letter(column)}{row}"
+                    cells.append(_cell_xml(ref, self._new_cell_style(column), value))
+            if cells:
+                yield f'<row r="{row}">{"".join(cells)}</row>'
+
+    def _formula_cell(self, cell, row, column):
+        """
+        Celulă cu formulă păstrată: fără valoarea din cache; formulele partajate
+        rămân valide după eliminarea/golirea rândurilor.
+        """
+        open_end = cell.index(">")
+        open_tag = _TYPE_RE.sub("", cell[:open_end])
+        body = _VALUE_RE.sub("", cell[open_end:])
+        formula = _FORMULA_RE.search(body)
+        attrs = formula.group(1)
+        if 't="shared"' in attrs:
+            si = _SI_RE.search(attrs).group(1)
+            ref = _REF_RE.search(attrs)
+            if ref:
+                # Formula „master”: limităm intervalul la rândurile rămase
+                end_row = min(int(ref.group(4)), self.end_row)
+                new_attrs = attrs[:ref.start()] + f'ref="{ref.group(1)}{ref.group(2)}:{ref.group(3)}{end_row}"' + attrs[ref.end():]
+                body = body[:formula.start(1)] + new_attrs + body[formula.end(1):]
+            elif si in self.cleared_masters and si in self.shared_masters:
+                # Master-ul a fost golit: scriem formula explicit, translatată pentru această celulă
+                text, origin = self.shared_masters[si]
+                translated = Translator("=" + unescape(text), origin=origin).translate_formula(
+                    f"{get_column_letter(column)}{row}")
+                body = body[:formula.start()] + f"<f>{escape(translated[1:])}</f>" + body[formula.end():]
+        return open_tag + body
+
+    def row(self, xml):
+        """
+        Rescrie un rând din template; returnează "" dacă rândul este eliminat.
+        """
+        open_end = xml.index(">")
+        match = _ROW_NUM_RE.search(xml, 0, open_end)
+        row = int(match.group(1)) if match else self.next_row
+        if row > self.end_row:
+            return ""
+
+        parts = list(self._generated_rows(row))
+        open_tag = _SPANS_RE.sub("", xml[:open_end + 1])
+        if open_tag.endswith("/>"):
+            open_tag = open_tag[:-2] + ">"
+
+        cells = {}
+        position = 0
+        for cell_match in _CELL_RE.finditer(xml, open_end):
+            cell = cell_match.group(0)
+            ref = _CELL_REF_RE.search(cell)
+            position = column_index_from_string(ref.group(1)) if ref else position + 1
+            cells[position] = cell
+
+        new_cells = {}
+        for column, cell in cells.items():
+            ref = f"{get_column_letter(column)}{row}"
+            style = _STYLE_RE.search(cell[:cell.index(">")])
+            style = style.group(1) if style else None
+            if column in self.patch.columns and row >= self.patch.columns[column][0]:
+                self.column_styles.setdefault(column, style)
+
+            if "<f" in cell and 'ref="' in cell:
+                formula = _FORMULA_RE.search(cell)
+                if formula and 't="shared"' in formula.group(1):
+                    si = _SI_RE.search(formula.group(1)).group(1)
+                    self.shared_masters[si] = (formula.group(2) or "", ref)
+                    if self.patch.is_cleared(row, column):
+                        self.cleared_masters.add(si)
+
+            if self.patch.is_cleared(row, column):
+                new_cells[column] = _cell_xml(ref, style, None)
+                continue
+            written, value = self.patch.value(row, column)
+            if written:
+                new_cells[column] = _cell_xml(ref, style, value)
+            elif "<f" in cell:
+                new_cells[column] = self._formula_cell(cell, row, column)
+            else:
+                new_cells[column] = cell
+
+        for column in self.patch.columns:
+            if column not in new_cells and not self.patch.is_cleared(row, column):
+                written, value = self.patch.value(row, column)
+                if written:
+                    ref = f"{get_column_letter(column)}{row}"
+                    new_cells[column] = _cell_xml(ref, self._new_cell_style(column), value)
+
+        parts.append(open_tag + "".join(new_cells[c] for c in sorted(new_cells)) + "</row>")
+        self.next_row = row + 1
+        return "".join(parts)
+
+    def tail(self):
+        """
+        Rândurile generate după ultimul rând din template (generator: pot fi
+        foarte multe pentru un CSV lung).
+        """
+        return self._generated_rows(self.end_row + 1)
+
+
+def _rewrite_sheet(source, target, patch):
+    """
+    Copiază XML-ul foii din 'source' în 'target' (ambele fișiere din arhive),
+    în bucăți de CHUNK_SIZE, aplicând patch-ul pe fiecare rând.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    rewriter = _SheetRewriter(patch)
+    buffer = ""
+    state = "head"
+
+    def write(text):
+        if text:
+            target.write(text.encode("utf-8"))
+
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        buffer += decoder.decode(chunk, final=not chunk)
+
+        if state == "head":
+            start = buffer.find("<sheetData")
+            if start == -1:
+                if not chunk:
+                    raise ValueError("Foaia din template nu conține <sheetData>.")
+                continue
+            open_end = buffer.index(">", start)
+            write(rewriter.head(buffer[:start]) + "<sheetData>")
+            if buffer[open_end - 1] == "/":
+                # <sheetData/> gol
+                buffer = "</sheetData>" + buffer[open_end + 1:]
+            else:
+                buffer = buffer[open_end + 1:]
+            state = "rows"
+
+        if state == "rows":
+            end = buffer.find("</sheetData>")
+            limit = end if end != -1 else len(buffer)
+            consumed = 0
+            for match in _ROW_RE.finditer(buffer, 0, limit):
+                write(rewriter.row(match.group(0)))
+                consumed = match.end()
+            if end != -1:
+                for text in rewriter.tail():
+                    write(text)
+                buffer = buffer[end:]
+                state = "tail"
+            else:
+                buffer = buffer[consumed:]
+
+        if state == "tail":
+            write(buffer)
+            buffer = ""
+
+        if not chunk:
+            break
+
+
+def _active_sheet_part(zin):
+    """
+    Calea (în arhivă) a foii active și numele ei actual.
+    """
+    workbook = zin.read("xl/workbook.xml").decode("utf-8")
+    rels = zin.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+    sheets = re.findall(r"<sheet\b[^>]*/>", workbook)
+    active = re.search(r'\bactiveTab="(\d+)"', workbook)
+    sheet = sheets[int(active.group(1)) if active else 0]
+    rel_id = re.search(r'\br:id="([^"]+)"', sheet).group(1)
+    name = re.search(r'\bname="([^"]*)"', sheet).group(1)
+    relationship = re.search(rf'<Relationship\b[^>]*\bId="{re.escape(rel_id)}"[^>]*/>', rels).group(0)
+    target = re.search(r'\bTarget="([^"]+)"', relationship).group(1)
+    part = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    return part, name
+
+
+def _patch_workbook(xml, old_name, new_name):
+    if new_name is not None:
+        # Doar în elementul <sheet> al foii: name="..." apare și în alte elemente (ex: definedName)
+        new_attribute = f'name="{escape(new_name, {chr(34): "&quot;"})}"'
+        xml = re.sub(rf'<sheet\b[^>]*\bname="{re.escape(old_name)}"[^>]*/>',
+                     lambda match: match.group(0).replace(f'name="{old_name}"', new_attribute, 1),
+                     xml, count=1)
+    if re.search(r"<calcPr\b", xml):
+        if "fullCalcOnLoad" not in xml:
+            xml = re.sub(r"<calcPr\b", '<calcPr fullCalcOnLoad="1"', xml, count=1)
+    else:
+        anchor = "</definedNames>" if "</definedNames>" in xml else "</sheets>"
+        xml = xml.replace(anchor, anchor + '<calcPr fullCalcOnLoad="1"/>', 1)
+    return xml
+
+
+def _check_title(title):
+    if not title:
+        raise ValueError("Title must have at least one character")
+    match = INVALID_TITLE_REGEX.search(title)
+    if match:
+        raise ValueError(f"Invalid character {match.group(0)} found in sheet title")
+
+
+def copy_member(source, zin, info, zout):
+    """
+    Copiază membrul 'info' din arhiva 'zin' (fișierul 'source') în 'zout' cu datele
+    comprimate așa cum sunt, fără decompresie și recompresie. zipfile nu are un API
+    public pentru asta: antetul local este citit și scris direct, iar membrul este
+    înregistrat în directorul central al lui 'zout', ca la ZipFile.writestr.
+    Membrii criptați sunt recomprimați normal.
+    """
+    if info.flag_bits & 0x1:
+        zout.writestr(info, zin.read(info))
+        return
+    with open(source, "rb") as f:
+        f.seek(info.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, f.read(zipfile.sizeFileHeader))
+        f.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+
+        out_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        out_info.compress_type = info.compress_type
+        out_info.external_attr = info.external_attr
+        out_info.CRC = info.CRC
+        out_info.compress_size = info.compress_size
+        out_info.file_size = info.file_size
+        zip64 = max(info.file_size, info.compress_size) > zipfile.ZIP64_LIMIT
+        out_info.header_offset = zout.fp.tell()
+        zout.fp.write(out_info.FileHeader(zip64))
+        remaining = info.compress_size
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Membrul {info.filename} este trunchiat.")
+            zout.fp.write(chunk)
+            remaining -= len(chunk)
+    zout.filelist.append(out_info)
+    zout.NameToInfo[out_info.filename] = out_info
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+
+# Părțile template-ului modificate la scriere (restul sunt copiate cu copy_member)
+_PATCHED_PARTS = {"xl/workbook.xml", "xl/_rels/workbook.xml.rels", "[Content_Types].xml", "docProps/app.xml"}
+
+
+def apply_patch(template_path, patch, output_file):
+    """
+    Scrie în 'output_file' template-ul modificat conform 'patch'.
+    """
+    if patch.title is not None:
+        _check_title(patch.title)
+
+    # Scriem într-un fișier temporar: o eroare în timpul scrierii (ex: un CSV citit în bucăți,
+    # motorul "stream") nu trebuie să lase în output o arhivă trunchiată
+    temp = f"{output_file}.{uuid.uuid4().hex}.tmp"
+    try:
+        with zipfile.ZipFile(template_path) as zin, \
+                zipfile.ZipFile(temp, "w", zipfile.ZIP_DEFLATED) as zout:
+            sheet_part, old_name = _active_sheet_part(zin)
+            for info in zin.infolist():
+                name = info.filename
+                if name == "xl/calcChain.xml":
+                    continue
+                out_info = zipfile.ZipInfo(name, date_time=info.date_time)
+                out_info.compress_type = zipfile.ZIP_DEFLATED
+
+                if name == sheet_part:
+                    with zin.open(info) as source, zout.open(out_info, "w", force_zip64=True) as target:
+                        _rewrite_sheet(source, target, patch)
+                    continue
+                if name not in _PATCHED_PARTS:
+                    copy_member(template_path, zin, info, zout)
+                    continue
+
+                data = zin.read(info)
+                if name == "xl/workbook.xml":
+                    data = _patch_workbook(data.decode("utf-8"), old_name, patch.title).encode("utf-8")
+                elif name == "xl/_rels/workbook.xml.rels":
+                    data = re.sub(
+                        rf'<Relationship\b[^>]*Type="{re.escape(CALC_CHAIN_TYPE)}"[^>]*/>', "",
+                        data.decode("utf-8")).encode("utf-8")
+                elif name == "[Content_Types].xml":
+                    data = re.sub(r'<Override\b[^>]*PartName="/xl/calcChain.xml"[^>]*/>', "",
+                                  data.decode("utf-8")).encode("utf-8")
+                elif name == "docProps/app.xml" and patch.title is not None:
+                    data = data.decode("utf-8").replace(
+                        f"<vt:lpstr>{old_name}</vt:lpstr>", f"<vt:lpstr>{escape(patch.title)}</vt:lpstr>", 1
+                    ).encode("utf-8")
+                zout.writestr(out_info, data)
+        os.replace(temp, output_file)
+    finally:
+        if os.path.exists(temp):
+            os.unlink(temp)
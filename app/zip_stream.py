@@ -0,0 +1,105 @@
+"""
+Arhivă ZIP construită și trimisă în flux (streaming) pentru /download_all/.
+
+Fișierele XLSX sunt deja comprimate (deflate), așa că sunt puse în arhivă
+fără recomprimare (ZIP_STORED). Arhiva este produsă bucată cu bucată, deci
+primii octeți pleacă spre client imediat, fără fișier intermediar.
+
+În paralel, octeții sunt scriși și într-o copie pe disc; dacă setul de
+fișiere nu se schimbă (aceleași nume și același conținut), descărcările
+următoare trimit direct copia salvată.
+"""
+import hashlib
+import os
+import uuid
+import zipfile
+
+from app.result_cache import RESULT_CACHE
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _StreamBuffer:
+    """
+    Destinație fără seek pentru zipfile: reține octeții scriși până sunt preluați.
+    """
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def archive_key(files):
+    """
+    Cheia arhivei: hash peste numele și conținutul (SHA-256) fișierelor.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(files, key=os.path.basename):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(RESULT_CACHE.file_hash(path).encode("ascii"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _zip_chunks(files):
+    """
+    Produce arhiva ZIP (membri ZIP_STORED) în bucăți de cel mult ~CHUNK_SIZE.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for path in sorted(files, key=os.path.basename):
+            info = zipfile.ZipInfo.from_file(path, os.path.basename(path))
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, "rb") as source, archive.open(info, "w") as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    target.write(chunk)
+                    yield buffer.take()
+    # Directorul central, scris la închiderea arhivei
+    yield buffer.take()
+
+
+def _file_chunks(path):
+    with open(path, "rb") as f:
+        yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+
+def stream_zip(files, cache_path=None):
+    """
+    Generator cu octeții arhivei ZIP pentru 'files'.
+    - cache_path : dacă există, arhiva este trimisă de acolo; altfel este
+                   construită acum și salvată acolo pentru data viitoare.
+    """
+    if cache_path and os.path.exists(cache_path):
+        yield from _file_chunks(cache_path)
+        return
+    if not cache_path:
+        yield from (chunk for chunk in _zip_chunks(files) if chunk)
+        return
+
+    # Copia se scrie sub un nume temporar; devine validă doar dacă arhiva a
+    # fost trimisă complet (clientul poate închide conexiunea oricând)
+    temp = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    complete = False
+    try:
+        with open(temp, "wb") as copy:
+            for chunk in _zip_chunks(files):
+                if chunk:
+                    copy.write(chunk)
+                    yield chunk
+        os.replace(temp, cache_path)
+        complete = True
+    finally:
+        if not complete and os.path.exists(temp):
+            os.unlink(temp)
@@ -0,0 +1,102 @@
+"""
+Generator de exporturi CSV TradingView sintetice, pentru benchmark.
+
+Produce, pentru fiecare tip de fișier, aceleași nume și același format ca
+exporturile reale:
+ - PPI / PMIPCNOMINAL : perechi '<SIMBOL>, 1M.csv' + '<SIMBOL>, 3M.csv'
+ - MOMYOY             : perechi '<SIMBOL>MM, 1M.csv' + '<SIMBOL>YY, 1M.csv'
+ - GDPPCY / REALGDPQY : fișiere simple '<SIMBOL>, 3M.csv'
+
+Datele sunt lunare (ca exporturile reale) sau, cu --freq, zilnice / orare / la minut,
+pentru istorii lungi (sute de mii de rânduri) care nu ar încăpea în anii 1–9999
+cu pas lunar. Sufixele fișierelor rămân aceleași (pasul exportului „3M” este de
+trei ori pasul celui „1M”).
+
+Exemplu:
+    python -m bench.generate --type PPI --symbols 5 --rows 600 --output /tmp/csv
+    python -m bench.generate --type GDPPCY --symbols 1 --rows 500000 --freq minute --output /tmp/csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Tipul fișierului -> (sufixe fișiere, pas pentru fiecare fișier, în unități de --freq)
+LAYOUTS = {
+    "PPI": ((", 1M.csv", 1), (", 3M.csv", 3)),
+    "PMIPCNOMINAL": ((", 1M.csv", 1), (", 3M.csv", 3)),
+    "MOMYOY": (("MM, 1M.csv", 1), ("YY, 1M.csv", 1)),
+    "GDPPCY": ((", 3M.csv", 3),),
+    "REALGDPQY": ((", 3M.csv", 3),),
+}
+
+START_DATE = "1975-01-01"
+
+# --freq -> unitatea pasului pentru pandas.date_range
+FREQUENCIES = {"month": "MS", "day": "D", "hour": "h", "minute": "min"}
+
+
+def _series(rng, rows, step, time_format, extra_columns, freq="month"):
+    """
+    Un export: coloana time (din 'step' în 'step' unități de 'freq'), valoarea
+    (random walk) și opțional coloane de indicatori, ca în exporturile TradingView.
+    """
+    dates = pd.date_range(START_DATE, periods=rows, freq=f"{step}{FREQUENCIES[freq]}")
+    if time_format == "iso":
+        times = dates.strftime("%Y-%m-%dT%H:%M:%SZ")
+    else:
+        times = (dates - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)
+    data = {
+        "time": times,
+        "close": np.round(100 + np.cumsum(rng.normal(0, 0.5, rows)), 3),
+    }
+    for index in range(extra_columns):
+        data[f"Plot {index + 1}"] = np.round(rng.normal(0, 1, rows), 4)
+    return pd.DataFrame(data)
+
+
+def generate(file_type, output_folder, symbols=3, rows=600, time_format="unix",
+             extra_columns=0, seed=0, freq="month"):
+    """
+    Scrie în 'output_folder' un set de CSV-uri pentru tipul dat.
+    'rows' este numărul de rânduri al exportului „1M”; exporturile „3M”
+    au de trei ori mai puține rânduri (aceeași perioadă).
+    Returnează lista fișierelor scrise.
+    """
+    if file_type not in LAYOUTS:
+        raise ValueError(f"Tip de fișier necunoscut: {file_type}")
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Frecvență necunoscută: {freq}")
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_folder, exist_ok=True)
+
+    written = []
+    for index in range(symbols):
+        symbol = f"BENCH_{file_type}{index + 1:03d}"
+        for suffix, step in LAYOUTS[file_type]:
+            path = os.path.join(output_folder, f"{symbol}{suffix}")
+            count = max(rows // step, 1)
+            _series(rng, count, step, time_format, extra_columns, freq).to_csv(path, index=False)
+            written.append(path)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generează CSV-uri TradingView sintetice.")
+    parser.add_argument("--type", choices=sorted(LAYOUTS), required=True, help="Tipul fișierului.")
+    parser.add_argument("--output", required=True, help="Folderul în care se scriu CSV-urile.")
+    parser.add_argument("--symbols", type=int, default=3, help="Numărul de simboluri.")
+    parser.add_argument("--rows", type=int, default=600, help="Rânduri în exportul „1M”.")
+    parser.add_argument("--freq", choices=list(FREQUENCIES), default="month",
+                        help="Pasul datelor din exportul „1M” (implicit lunar).")
+    parser.add_argument("--time-format", choices=["unix", "iso"], default="unix",
+                        help="Formatul coloanei time.")
+    parser.add_argument("--extra-columns", type=int, default=0,
+                        help="Coloane de indicatori suplimentare (ignorate la procesare).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed pentru valori reproductibile.")
+    args = parser.parse_args()
+
+    files = generate(args.type, args.output, args.symbols, args.rows, args.time_format,
+                     args.extra_columns, args.seed, args.freq)
+    print(f"{len(files)} fișiere scrise în {args.output}")
@@ -0,0 +1,108 @@
+"""
+Benchmark pentru middleware-ul HTTP din app/main.py (block_bots_and_add_session).
+
+Middleware-ul este apelat direct, cu un call_next care răspunde imediat, deci
+se măsoară doar costul lui per cerere (fără rutare, endpoint sau rețea), pentru:
+ - static     : /static/* (doar verificarea de boți)
+ - session    : cerere cu cookie de sesiune valid
+ - new        : cerere fără cookie (sesiune nouă + Set-Cookie)
+ - expired    : cookie care nu mai corespunde unei sesiuni
+ - bot        : user-agent blocat (403)
+Rezultatul (microsecunde per cerere) este afișat în JSON.
+
+Exemplu:
+    python -m bench.middleware --requests 20000
+    SESSION_BACKEND=sqlite SESSION_DB=/tmp/sessions.db python -m bench.middleware
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.main import SESSIONS, app, block_bots_and_add_session
+from app.session_store import SESSION_BACKEND
+
+BROWSER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+BOT_UA = "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
+
+
+def _request(path, user_agent=BROWSER_UA, cookie=None, client="10.0.0.1"):
+    headers = [(b"user-agent", user_agent.encode())]
+    if cookie:
+        headers.append((b"cookie", f"session_id={cookie}".encode()))
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "scheme": "http",
+        "server": ("bench", 80),
+        "client": (client, 50000),
+        "headers": headers,
+        "app": app,
+    })
+
+
+async def _call_next(request):
+    return Response()
+
+
+def _cases():
+    SESSIONS.create("bench-session")
+    return {
+        "static": lambda i: _request("/static/main.html"),
+        "session": lambda i: _request("/jobs/x", cookie="bench-session"),
+        "new": lambda i: _request("/main", client=f"10.1.{i // 250 % 250}.{i % 250}"),
+        "expired": lambda i: _request("/main", cookie=f"expired-{i}", client=f"10.2.{i // 250 % 250}.{i % 250}"),
+        "bot": lambda i: _request("/main", user_agent=BOT_UA),
+    }
+
+
+async def _measure(make_request, requests):
+    """
+    Microsecunde per cerere (media), cu cererile construite înainte de măsurare.
+    """
+    batch = [make_request(i) for i in range(requests)]
+    start = time.perf_counter()
+    for request in batch:
+        await block_bots_and_add_session(request, _call_next)
+    return round((time.perf_counter() - start) / requests * 1e6, 2)
+
+
+async def run(requests, repeat):
+    results = {}
+    for name, make_request in _cases().items():
+        await _measure(make_request, min(requests, 1000))  # încălzire
+        results[name] = min([await _measure(make_request, requests) for _ in range(repeat)])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pentru middleware-ul HTTP.")
+    parser.add_argument("--requests", type=int, default=20000, help="Cereri per caz.")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetări per caz (se raportează minimul).")
+    args = parser.parse_args()
+
+    report = {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "session_backend": SESSION_BACKEND,
+            "cpu_count": os.cpu_count(),
+        },
+        "requests": args.requests,
+        "microseconds_per_request": asyncio.run(run(args.requests, args.repeat)),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
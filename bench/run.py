@@ -0,0 +1,175 @@
+"""
+Benchmark pentru cele cinci pipeline-uri CSV -> XLSX.
+
+Pentru fiecare tip de fișier și motor (openpyxl / xml / stream) generează un set de
+CSV-uri sintetice (bench/generate.py), rulează process_csv_to_xlsx cu
+template-ul real din template/ și raportează, în JSON:
+ - timpul total al fiecărei rulări (prima rulare include parsarea template-ului,
+   următoarele îl iau din cache),
+ - timpii pe etape (read_csv, load_template, write, trim, save),
+ - memoria maximă (peak RSS) a procesului,
+ - câte fișiere XLSX a generat fiecare rulare și erorile din log-ul de procesare.
+
+Un caz cu erori sau cu mai puține fișiere decât simboluri este marcat "ok": false,
+iar comanda se termină cu cod de ieșire 1 (după ce scrie raportul).
+
+Fiecare caz rulează într-un proces nou, ca memoria și cache-urile să nu se
+influențeze între cazuri. Cache-ul de rezultate este dezactivat.
+
+Exemplu:
+    python -m bench.run --pipelines PPI GDPPCY --engines openpyxl xml --output bench.json
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.pipelines import PIPELINES
+from app.process_log import read_log
+from bench.generate import FREQUENCIES, generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _peak_rss_mb():
+    """
+    Memoria maximă a procesului curent, în MB (ru_maxrss e în KB pe Linux, bytes pe macOS).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_case(file_type, engine, csv_folder, repeat, symbols):
+    """
+    Rulează un caz în procesul curent (proces nou, pornit de run_case).
+    Fiecare rulare scrie într-un folder nou, ca fișierele numărate să fie ale ei.
+    """
+    import contextlib
+    import importlib
+
+    from app.result_cache import RESULT_CACHE
+    from app.stage_timer import reset_stage_times, stage_times
+
+    RESULT_CACHE.max_bytes = 0
+    pipeline = PIPELINES[file_type]
+    module = importlib.import_module(f"app.{pipeline['module']}")
+    # Memoria după importuri, înainte de procesare
+    rss_before = _peak_rss_mb()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as output_root:
+        for index in range(repeat):
+            output_folder = os.path.join(output_root, f"run{index + 1}")
+            os.makedirs(output_folder)
+            log_file = os.path.join(output_folder, "process_log.txt")
+            reset_stage_times()
+            start = time.perf_counter()
+            # Mesajele scripturilor (print) nu trebuie să ajungă în raportul JSON
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                module.process_csv_to_xlsx(
+                    csv_folder=csv_folder,
+                    template_path=os.path.join(ROOT, pipeline["template"]),
+                    output_folder=output_folder,
+                    log_file=log_file,
+                    engine=engine,
+                )
+            wall_seconds = round(time.perf_counter() - start, 4)
+            entries, _, _ = read_log(log_file)
+            runs.append({
+                "wall_seconds": wall_seconds,
+                "stages": stage_times(),
+                "written": len(glob.glob(os.path.join(output_folder, "*.xlsx"))),
+                "errors": [entry["message"] for entry in entries if entry.get("level") == "error"],
+            })
+    ok = all(not run["errors"] and run["written"] == symbols for run in runs)
+    return {"ok": ok, "runs": runs, "peak_rss_mb": _peak_rss_mb(), "baseline_rss_mb": rss_before}
+
+
+def run_case(file_type, engine, csv_folder, repeat, symbols):
+    """
+    Rulează un caz într-un proces nou și returnează rezultatul.
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(_run_case, file_type, engine, csv_folder, repeat, symbols).result()
+
+
+def run_benchmark(pipelines, engines, symbols, rows, repeat, time_format="unix",
+                  extra_columns=0, seed=0, freq="month"):
+    """
+    Rulează toate combinațiile (pipeline, motor) și returnează raportul.
+    """
+    report = {
+        "config": {
+            "symbols": symbols,
+            "rows": rows,
+            "freq": freq,
+            "repeat": repeat,
+            "time_format": time_format,
+            "extra_columns": extra_columns,
+            "seed": seed,
+        },
+        "environment": _environment(),
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as csv_root:
+        for file_type in pipelines:
+            csv_folder = os.path.join(csv_root, file_type)
+            generate(file_type, csv_folder, symbols, rows, time_format, extra_columns, seed, freq)
+            for engine in engines:
+                result = run_case(file_type, engine, csv_folder, repeat, symbols)
+                report["results"].append({"pipeline": file_type, "engine": engine, **result})
+    return report
+
+
+def _environment():
+    import openpyxl
+    import pandas
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pandas.__version__,
+        "openpyxl": openpyxl.__version__,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pentru pipeline-urile CSV -> XLSX.")
+    parser.add_argument("--pipelines", nargs="+", choices=sorted(PIPELINES), default=sorted(PIPELINES),
+                        help="Tipurile de fișier testate (implicit: toate).")
+    parser.add_argument("--engines", nargs="+", choices=["openpyxl", "xml", "stream"], default=["openpyxl", "xml"],
+                        help="Motoarele de generare testate.")
+    parser.add_argument("--symbols", type=int, default=3, help="Simboluri per set de CSV-uri.")
+    parser.add_argument("--rows", type=int, default=600, help="Rânduri în exporturile „1M”.")
+    parser.add_argument("--freq", choices=list(FREQUENCIES), default="month",
+                        help="Pasul datelor generate (ex: minute pentru istorii intraday lungi).")
+    parser.add_argument("--repeat", type=int, default=2, help="Rulări per caz, în același proces.")
+    parser.add_argument("--time-format", choices=["unix", "iso"], default="unix",
+                        help="Formatul coloanei time.")
+    parser.add_argument("--extra-columns", type=int, default=0,
+                        help="Coloane de indicatori suplimentare în CSV-uri.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed pentru datele generate.")
+    parser.add_argument("--output", default=None, help="Fișierul JSON (implicit: stdout).")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    report = run_benchmark(args.pipelines, args.engines, args.symbols, args.rows, args.repeat,
+                           args.time_format, args.extra_columns, args.seed, args.freq)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    failed = [f"{result['pipeline']}/{result['engine']}" for result in report["results"] if not result["ok"]]
+    if failed:
+        sys.exit(f"Cazuri cu erori: {', '.join(failed)}")